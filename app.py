@@ -1,18 +1,25 @@
 # app.py (version simplifiée/multi-drones, mêmes noms de fonctions)
-import os, json, threading
+import os, json, time, threading
 from collections import OrderedDict
 from typing import Dict, Tuple, Optional
-from flask import Flask, jsonify, request, Response
+from flask import Flask, jsonify, request, Response, stream_with_context
 from pymavlink import mavutil
 
-from telemetry import telemetry_reader, TelemetryCache
-from get_flight_info import build_flight_info
+from telemetry import TelemetryCache, get_io_lock, HISTORY_FIELDS, DEFAULT_TELEMETRY_TYPES
+from dispatcher import MavlinkDispatcher
+from async_link import AsyncLinkEngine
+from get_flight_info import build_flight_info_json, build_fleet_flight_info_json
+from telemetry_stream import telemetry_events
 from init_log import logger
 from mission_tool import (
-    create_mission, send_mission, modify_mission, download_mission,
-    list_missions, MISSIONS_DIR
+    create_mission, send_mission, sync_mission, modify_mission, edit_mission, onboard_mission,
+    watch_onboard_mission, cached_onboard_mission, list_missions_page, search_missions, MISSIONS_DIR
 )
-from start_mission import start
+from mission import Mission
+from mission_geometry import analyze_mission
+from start_mission import FLEET_READY_TIMEOUT, FleetStart, start
+import jobs
+from jobs import JobQueueFull, TargetsBusy, get_job, list_jobs, submit_job
 
 # ─────────────────────────────────────────────
 # Config & registre
@@ -24,27 +31,114 @@ DRONES: Dict[int, Dict[str, object]] = {}
 
 app = Flask(__name__)
 
-for d in CONFIG.get("drones", []):
-    did = int(d["id"])
-    url = str(d["conn"])
-    baud = int(d.get("baud", 57600))
+# Moteur de liens : "thread" (un dispatcher par drone) ou "asyncio" (une boucle pour toute la flotte)
+LINK_ENGINE = str(CONFIG.get("link_engine", "thread")).lower()
+ENGINE: Optional[AsyncLinkEngine] = AsyncLinkEngine().start() if LINK_ENGINE == "asyncio" else None
+
+# Connexion : délai max d'attente du heartbeat, pause entre tentatives,
+# et âge du dernier heartbeat au-delà duquel un drone connecté est "lost"
+HEARTBEAT_TIMEOUT = float(CONFIG.get("heartbeat_timeout", 5.0))
+RECONNECT_DELAY = float(CONFIG.get("reconnect_delay", 2.0))
+LOST_AFTER = float(CONFIG.get("lost_after", 5.0))
+
+# Nombre de points d'historique conservés par drone (0 = désactivé)
+HISTORY_SIZE = int(CONFIG.get("history_size", 3600))
+
+# Types MAVLink conservés dans le cache (dernier message par type) ; ["*"] = tous
+TELEMETRY_TYPES = CONFIG.get("telemetry_types", list(DEFAULT_TELEMETRY_TYPES))
+
+# Flux SSE : fréquence max d'envoi par client (les clients demandent ?rate=)
+STREAM_MAX_RATE_HZ = float(CONFIG.get("stream_max_rate_hz", 10.0))
+
+# Analyse des missions : vitesse par défaut et limites vérifiées avant chaque upload
+MISSION_SPEED_M_S = float(CONFIG.get("mission_speed_m_s", 10.0))
+GEOFENCE = CONFIG.get("geofence")
+
+# Jobs en arrière-plan (envoi, download, start) : taille du pool, tâches en attente max,
+# et attente max d'une requête "wait" avant de répondre 202 malgré tout
+jobs.configure(int(CONFIG.get("job_workers", 8)), int(CONFIG.get("job_queue_max", 64)))
+JOB_WAIT_TIMEOUT = float(CONFIG.get("job_wait_timeout", 120.0))
+
+def _connect_drone(did: int, url: str, baud: int) -> None:
+    """
+    Établit le lien d'un drone (thread dédié, non bloquant pour l'API).
+    Réessaie tant que le heartbeat n'arrive pas ; le drone passe en "lost"
+    après chaque attente infructueuse.
+    """
+    entry = DRONES[did]
+    while True:
+        master = None
+        try:
+            master = mavutil.mavlink_connection(url, baud=baud)
+            hb = master.wait_heartbeat(timeout=HEARTBEAT_TIMEOUT)
+        except Exception as e:
+            logger.warning(f"[drone {did}] Connexion impossible via {url}: {e}")
+            hb = None
+        if hb is not None:
+            break
+        if master is not None:
+            try:
+                master.close()
+            except Exception:
+                pass
+        entry["state"] = "lost"
+        logger.warning(f"[drone {did}] Aucun heartbeat après {HEARTBEAT_TIMEOUT}s via {url}, nouvelle tentative")
+        time.sleep(RECONNECT_DELAY)
 
-    master = mavutil.mavlink_connection(url, baud=baud)
-    master.wait_heartbeat()
     logger.info(f"[drone {did}] Heartbeat via {url}")
+    cache = entry["cache"]
+    cache.update_from_msg(hb)
+
+    # Lecteur unique du lien : alimente le cache et les abonnés (missions, ACK)
+    lock = entry["lock"]
+    if ENGINE is not None:
+        link = ENGINE.add_link(did, master, io_lock=lock, sinks=[cache.update_from_msg])
+    else:
+        link = MavlinkDispatcher(master, io_lock=lock, name=f"drone-{did}")
+        link.add_sink(cache.update_from_msg)
+        link.start()
+    watch_onboard_mission(link)
+    logger.info(f"[drone {did}] Lecture télémétrie démarrée ({LINK_ENGINE})")
 
-    cache = TelemetryCache()
-    stop_evt = threading.Event()
-    t = threading.Thread(target=telemetry_reader, args=(master, cache, stop_evt), daemon=True)
-    t.start()
-    logger.info(f"[drone {did}] Thread télémétrie démarré")
+    entry.update(master=master, link=link, state="connected")
 
-    DRONES[did] = {"master": master, "cache": cache, "stop": stop_evt}
+def _drone_state(entry: Dict[str, object]) -> str:
+    """connecting | connected | lost (heartbeat trop ancien, ou lecture du lien abandonnée)."""
+    state = entry["state"]
+    if state == "connected":
+        if time.time() - entry["cache"].snapshot().hb_ts > LOST_AFTER:
+            return "lost"
+        if not entry["link"].is_alive():
+            return "lost"
+    return state
+
+# Toutes les connexions sont lancées en parallèle : l'API répond immédiatement
+# et chaque drone apparaît dans /drones dès que son heartbeat arrive.
+for d in CONFIG.get("drones", []):
+    did = int(d["id"])
+    DRONES[did] = {
+        "id": did,
+        "conn": str(d["conn"]),
+        "state": "connecting",
+        "master": None,
+        "link": None,
+        "cache": TelemetryCache(history_size=HISTORY_SIZE, types=TELEMETRY_TYPES),
+        # Verrou I/O propre à ce lien : les autres drones ne sont jamais bloqués
+        "lock": get_io_lock(did),
+    }
+    threading.Thread(
+        target=_connect_drone,
+        args=(did, str(d["conn"]), int(d.get("baud", 57600))),
+        name=f"connect-{did}",
+        daemon=True,
+    ).start()
 
 def _get_drone_or_404(drone_id: int) -> Tuple[Optional[Dict[str, object]], Optional[Tuple[Response, int]]]:
     entry = DRONES.get(drone_id)
     if not entry:
         return None, (jsonify(error=f"Drone {drone_id} introuvable"), 404)
+    if entry["master"] is None:
+        return None, (jsonify(error=f"Drone {drone_id} non connecté", state=entry["state"]), 503)
     return entry, None
 
 # ─────────────────────────────────────────────
@@ -62,40 +156,239 @@ def api_list_missions():
     except ValueError:
         limit = None
 
-    files = list_missions(
-        base_dir=MISSIONS_DIR,
-        exts=exts,
-        recursive=recursive,
-        sort=sort,
-        order=order,
-        limit=limit,
-    )
+    try:
+        files, next_cursor = list_missions_page(
+            base_dir=MISSIONS_DIR,
+            exts=exts,
+            recursive=recursive,
+            sort=sort,
+            order=order,
+            limit=limit,
+            cursor=request.args.get("cursor"),
+        )
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+    return jsonify({"count": len(files), "files": files, "next_cursor": next_cursor}), 200
+
+
+@app.get("/missions/search")
+def api_search_missions():
+    def _floats(param: str, n: int):
+        raw = request.args.get(param)
+        if raw is None:
+            return None
+        values = [float(v) for v in raw.split(",")]
+        if len(values) != n:
+            raise ValueError
+        return values
+
+    try:
+        bbox = _floats("bbox", 4)
+        near = _floats("near", 3)
+        limit = int(request.args.get("limit")) if request.args.get("limit") else None
+    except ValueError:
+        return jsonify(error="Paramètres invalides : bbox=min_lat,min_lon,max_lat,max_lon ou near=lat,lon,rayon_m"), 400
+    if bbox is None and near is None:
+        return jsonify(error="Paramètre 'bbox' ou 'near' requis"), 400
+    if near is not None and near[2] < 0:
+        return jsonify(error="Rayon négatif"), 400
+
+    files = search_missions(base_dir=MISSIONS_DIR, bbox=bbox, near=near, limit=limit)
     return jsonify({"count": len(files), "files": files}), 200
 
 
+@app.get("/missions/<path:name>/analysis")
+def api_mission_analysis(name: str):
+    filepath = os.path.abspath(os.path.join(MISSIONS_DIR, name))
+    if not filepath.startswith(MISSIONS_DIR + os.sep):
+        return jsonify(error="Nom de mission invalide"), 400
+    if not os.path.isfile(filepath):
+        return jsonify(error=f"Mission introuvable: {name}"), 404
+    try:
+        speed = float(request.args.get("speed", MISSION_SPEED_M_S))
+        if speed <= 0:
+            raise ValueError
+    except ValueError:
+        return jsonify(error="Paramètre 'speed' invalide"), 400
+    legs = request.args.get("legs", "").lower() in ("1", "true")
+
+    try:
+        mission = Mission.load(filepath)
+    except RuntimeError as e:
+        return jsonify(error=str(e)), 400
+    result = analyze_mission(mission, speed_m_s=speed, geofence=GEOFENCE, include_legs=legs)
+    return jsonify({"name": name, **result}), 200
+
+
 @app.get("/")
 def root():
     response = OrderedDict(
         status="ok",
-        drones=[{"id": d["id"], "conn": d["conn"], "connected": (int(d["id"]) in DRONES)}
-                for d in CONFIG.get("drones", [])]
+        drones=[{"id": e["id"], "conn": e["conn"], "connected": _drone_state(e) == "connected"}
+                for e in DRONES.values()]
     )
     logger.info("GET /")
     return Response(json.dumps(response), mimetype="application/json")
 
 @app.get("/drones")
 def list_drones():
-    return jsonify([{"id": did, "connected": True} for did in sorted(DRONES.keys())])
+    out = []
+    for did in sorted(DRONES.keys()):
+        state = _drone_state(DRONES[did])
+        out.append({"id": did, "state": state, "connected": state == "connected"})
+    return jsonify(out)
+
+@app.get("/drones/flight_info")
+def api_fleet_flight_info():
+    """flight_info de tous les drones (ou de ?ids=1,2,3) en une seule réponse, ?fields= pour projeter."""
+    ids_param = request.args.get("ids")
+    if ids_param:
+        try:
+            ids = [int(x) for x in ids_param.split(",") if x.strip()]
+        except ValueError:
+            return jsonify(error="Paramètre 'ids' invalide"), 400
+    else:
+        ids = sorted(DRONES.keys())
+    fields_param = request.args.get("fields")
+    fields = [f.strip() for f in fields_param.split(",") if f.strip()] if fields_param else None
+    strict = request.args.get('strict') in ('1', 'true', 'True')
+
+    caches = []
+    for did in ids:
+        entry = DRONES.get(did)
+        if not entry:
+            caches.append((did, f"Drone {did} introuvable"))
+        elif entry["master"] is None:
+            caches.append((did, f"Drone {did} non connecté"))
+        else:
+            caches.append((did, entry["cache"]))
+    body = build_fleet_flight_info_json(caches, fields=fields, allow_stale=not strict)
+    return Response(body, status=200, mimetype="application/json")
+
+def _stream_response(ids):
+    try:
+        rate = float(request.args.get("rate", 2.0))
+    except ValueError:
+        return jsonify(error="Paramètre 'rate' invalide"), 400
+    rate = min(max(rate, 0.1), STREAM_MAX_RATE_HZ)
+    fields_param = request.args.get("fields")
+    types_param = request.args.get("types")
+    caches = {did: DRONES[did]["cache"] for did in ids}
+    gen = telemetry_events(
+        caches,
+        rate_hz=rate,
+        fields=[f.strip() for f in fields_param.split(",") if f.strip()] if fields_param else None,
+        types=[t.strip() for t in types_param.split(",") if t.strip()] if types_param else None,
+    )
+    return Response(
+        stream_with_context(gen),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get("/drones/stream")
+def api_fleet_stream():
+    """Flux SSE des deltas flight_info (et ?types= de messages bruts) de la flotte ou de ?ids=."""
+    ids_param = request.args.get("ids")
+    if ids_param:
+        try:
+            ids = [int(x) for x in ids_param.split(",") if x.strip()]
+        except ValueError:
+            return jsonify(error="Paramètre 'ids' invalide"), 400
+        unknown = [i for i in ids if i not in DRONES]
+        if unknown:
+            return jsonify(error=f"Drones introuvables: {unknown}"), 404
+    else:
+        ids = sorted(DRONES.keys())
+    return _stream_response(ids)
+
+@app.get("/drones/<int:drone_id>/stream")
+def api_drone_stream(drone_id: int):
+    if drone_id not in DRONES:
+        return jsonify(error=f"Drone {drone_id} introuvable"), 404
+    return _stream_response([drone_id])
 
 @app.get("/drones/<int:drone_id>/flight_info")
 def api_flight_info(drone_id: int):
     entry, err = _get_drone_or_404(drone_id)
     if err: return err
     strict = request.args.get('strict') in ('1', 'true', 'True')
-    data = build_flight_info(drone_id, entry["cache"], allow_stale=not strict)  
-    if data.get("stale"):
-        logger.warning(f"[{drone_id}] Télémétrie stale: {data.get('age_sec')}")
-    return jsonify(data), 200
+    # Document pré-encodé par le cache : lecture + calcul des âges uniquement
+    body, stale = build_flight_info_json(drone_id, entry["cache"], allow_stale=not strict)
+    if stale:
+        logger.warning(f"[{drone_id}] Télémétrie stale")
+    return Response(body, status=200, mimetype="application/json")
+
+@app.get("/drones/<int:drone_id>/telemetry/history")
+def api_telemetry_history(drone_id: int):
+    entry, err = _get_drone_or_404(drone_id)
+    if err: return err
+    history = entry["cache"].history
+    if history is None:
+        return jsonify(error="Historique désactivé (history_size=0)"), 404
+
+    # since/until : timestamps epoch (s) ; une valeur négative est relative à maintenant (ex: since=-60)
+    now = time.time()
+    bounds = {}
+    for name in ("since", "until"):
+        raw = request.args.get(name)
+        if raw is None or raw == "":
+            bounds[name] = None
+            continue
+        try:
+            v = float(raw)
+        except ValueError:
+            return jsonify(error=f"Paramètre '{name}' invalide"), 400
+        bounds[name] = now + v if v < 0 else v
+
+    fields_param = request.args.get("fields")
+    fields = ["time"]
+    if fields_param:
+        wanted = [f.strip() for f in fields_param.split(",") if f.strip()]
+        unknown = [f for f in wanted if f not in HISTORY_FIELDS]
+        if unknown:
+            return jsonify(error=f"Champs inconnus: {unknown}", allowed=list(HISTORY_FIELDS)), 400
+        fields += [f for f in wanted if f != "time"]
+    else:
+        fields = list(HISTORY_FIELDS)
+    try:
+        limit = int(request.args.get("limit")) if request.args.get("limit") else None
+    except ValueError:
+        limit = None
+
+    cols = history.query(bounds["since"], bounds["until"], fields, limit)
+    return jsonify({
+        "drone_id": str(drone_id),
+        "count": len(cols["time"]),
+        "fields": fields,
+        "columns": cols,
+    }), 200
+
+@app.get("/drones/<int:drone_id>/telemetry")
+def api_telemetry_types(drone_id: int):
+    entry, err = _get_drone_or_404(drone_id)
+    if err: return err
+    now = time.time()
+    types = entry["cache"].types()
+    return jsonify({
+        "drone_id": str(drone_id),
+        "types": {t: {"ts": ts, "age_sec": round(now - ts, 3)} for t, ts in sorted(types.items())},
+    }), 200
+
+@app.get("/drones/<int:drone_id>/telemetry/<msg_type>")
+def api_telemetry_msg(drone_id: int, msg_type: str):
+    entry, err = _get_drone_or_404(drone_id)
+    if err: return err
+    rec = entry["cache"].latest(msg_type)
+    if rec is None:
+        return jsonify(error=f"Aucun message {msg_type.upper()} en cache"), 404
+    return jsonify({
+        "drone_id": str(drone_id),
+        "type": rec["type"],
+        "ts": rec["ts"],
+        "age_sec": round(time.time() - rec["ts"], 3),
+        "fields": rec["fields"],
+    }), 200
 
 @app.post("/drones/<int:drone_id>/command")
 def send_command(drone_id: int):
@@ -108,7 +401,8 @@ def send_command(drone_id: int):
         return jsonify(error="Champ 'mode' requis"), 400
     if mode not in master.mode_mapping():
         return jsonify(error=f"Mode '{mode}' non supporté"), 400
-    master.set_mode(master.mode_mapping()[mode])
+    with entry["lock"]:
+        master.set_mode(master.mode_mapping()[mode])
     logger.info(f"[{drone_id}] Mode -> {mode}")
     return jsonify(message=f"Mode changé vers {mode}"), 200
 
@@ -116,9 +410,15 @@ def send_command(drone_id: int):
 def start_mission_route(drone_id: int):
     entry, err = _get_drone_or_404(drone_id)
     if err: return err
-    start(entry["master"])
-    logger.info(f"[{drone_id}] start_mission lancé")
-    return jsonify(message=f"Mission démarrée (drone {drone_id})"), 200
+
+    def _run(report):
+        result = start(entry["master"], dispatcher=entry["link"], io_lock=entry["lock"],
+                       cache=entry["cache"], progress=report)
+        logger.info(f"[{drone_id}] start_mission lancé en {result['elapsed_s']}s")
+        return {"message": f"Mission démarrée (drone {drone_id})", **result}
+
+    return _job_response("start", drone_id, _run, _wants_wait(),
+                         lambda result: (jsonify(result), 200))
 
 @app.post("/drones/<int:drone_id>/mission/create")
 def api_create_mission(drone_id: int):
@@ -133,18 +433,24 @@ def api_create_mission(drone_id: int):
     startlon = data.get("startlon")
     startalt = data.get("startalt")
 
-    create_mission(
-        entry["master"], filename, altitude_takeoff, waypoints, mode,
-        startlat=startlat, startlon=startlon, startalt=startalt,
-        drone_id=drone_id
-    )
-    return jsonify(message=f"Mission créée dans {filename}", filename=filename), 201
+    survey = data.get("survey")
+
+    try:
+        created = create_mission(
+            entry["master"], filename, altitude_takeoff, waypoints, mode,
+            startlat=startlat, startlon=startlon, startalt=startalt,
+            drone_id=drone_id, io_lock=entry["lock"], cache=entry["cache"],
+            survey=survey, simplify_tolerance_m=data.get("simplify_tolerance_m"),
+        )
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+    return jsonify(message=f"Mission créée dans {filename}", filename=filename,
+                   **{k: v for k, v in created.items() if k != "path"}), 201
 
 @app.post("/drones/<int:drone_id>/mission/send")
 def api_send_mission(drone_id: int):
     entry, err = _get_drone_or_404(drone_id)
     if err: return err
-    master = entry["master"]
 
     if "file" in request.files:
         file = request.files["file"]
@@ -152,9 +458,10 @@ def api_send_mission(drone_id: int):
             return jsonify(error="Le fichier doit être .waypoints"), 400
         filepath = os.path.join("/tmp", file.filename)
         file.save(filepath)
-        send_mission(filepath, master)
-        logger.info(f"[{drone_id}] Mission envoyée depuis upload: {file.filename}")
-        return jsonify(message=f"Mission envoyée depuis {file.filename}"), 200
+        refused = _preflight(drone_id, filepath, request.form.get("force", "").lower() in ("1", "true"))
+        if refused: return refused
+        tolerance = request.form.get("simplify_tolerance_m", type=float)
+        return _send_job(drone_id, entry, filepath, file.filename, tolerance, _wants_wait())
 
     data = request.get_json(silent=True) or {}
     filename = data.get("filename")
@@ -166,35 +473,334 @@ def api_send_mission(drone_id: int):
     filepath = filename if os.path.isabs(filename) else os.path.join("missions", filename)
     if not os.path.exists(filepath):
         return jsonify(error=f"Fichier introuvable: {filepath}"), 404
+    refused = _preflight(drone_id, filepath, bool(data.get("force")))
+    if refused: return refused
 
-    send_mission(filepath, master)
-    logger.info(f"[{drone_id}] Mission envoyée: {filepath}")
-    return jsonify(message=f"Mission envoyée depuis {filepath}"), 200
+    return _send_job(drone_id, entry, filepath, filepath, data.get("simplify_tolerance_m"),
+                     _wants_wait(data))
 
-@app.post("/drones/<int:drone_id>/mission/modify")
-def api_modify_mission(drone_id: int):
-    data = request.get_json(force=True)
-    filename = data["filename"]
-    seq = int(data["seq"])
-    updates = data["updates"]
+def _send_job(drone_id: int, entry, filepath: str, label: str, tolerance, wait: bool):
+    """Envoi en arrière-plan (un job par envoi, sérialisé par drone) ; 202 + job, ou réponse finale si 'wait'."""
+    def _run(report):
+        stats = send_mission(filepath, entry["master"], dispatcher=entry["link"],
+                             simplify_tolerance_m=tolerance, progress=report)
+        logger.info(f"[{drone_id}] Mission envoyée: {label}")
+        return dict(stats, filename=filepath)
+
+    return _job_response("mission_send", drone_id, _run, wait,
+                         lambda stats: _sent_response(f"Mission envoyée depuis {label}", stats))
+
+def _sent_response(message: str, stats):
+    """Réponse d'envoi : la réduction est rapportée si la mission a été simplifiée."""
+    if stats.get("simplified"):
+        return jsonify(message=message, simplified=stats["simplified"]), 200
+    return jsonify(message=message), 200
+
+def _preflight(drone_id: int, filepath: str, force: bool = False):
+    """Contrôle avant upload (coordonnées, geofence) : réponse 422 si la mission est refusée, sinon None."""
+    if force:
+        return None
+    try:
+        result = _check_mission_file(filepath)
+    except RuntimeError as e:
+        return jsonify(error=str(e)), 400
+    if result["violations_count"]:
+        logger.warning(f"[{drone_id}] Mission refusée ({result['violations_count']} violations): {filepath}")
+        return jsonify(error="Mission hors limites", violations_count=result["violations_count"],
+                       violations=result["violations"]), 422
+    return None
+
+def _check_mission_file(filepath: str):
+    return analyze_mission(Mission.load(filepath), speed_m_s=MISSION_SPEED_M_S, geofence=GEOFENCE)
 
+def _mission_path(filename: str) -> str:
+    """Chemin d'un fichier mission : absolu, ou relatif au dossier missions/."""
     filepath = filename
     if not os.path.isabs(filepath):
         if not filepath.startswith("missions" + os.sep) and not filepath.startswith("missions/"):
             filepath = os.path.join("missions", filepath)
+    return filepath
+
+def _sync_job(drone_id: int, entry, filepath: str, message: str, wait: bool, edit=None):
+    """Synchro en arrière-plan (sérialisée avec les autres jobs du drone) ; 202 + job, ou réponse finale si 'wait'."""
+    def _run(report):
+        stats = sync_mission(filepath, entry["master"], dispatcher=entry["link"], progress=report)
+        logger.info(f"[{drone_id}] Mission synchronisée ({stats['mode']}, {stats['sent']} items): {filepath}")
+        return dict(stats, filename=filepath)
+
+    def _done(stats):
+        if edit is not None:
+            return jsonify(message=message, sync=stats, edit=edit), 200
+        return jsonify(message=message, sync=stats), 200
+
+    return _job_response("mission_sync", drone_id, _run, wait, _done)
+
+@app.post("/drones/<int:drone_id>/mission/modify")
+def api_modify_mission(drone_id: int):
+    data = request.get_json(force=True)
+    filename = data["filename"]
+    updates = data.get("updates", [])
+    # Lot : "updates" en liste et/ou "insert" / "delete" / "order" ; sinon un seul "seq"
+    batch = isinstance(updates, list) or any(k in data for k in ("insert", "delete", "order"))
+
+    entry = None
+    if data.get("sync"):
+        entry, err = _get_drone_or_404(drone_id)
+        if err: return err
+
+    filepath = _mission_path(filename)
     if not os.path.exists(filepath):
         return jsonify(error=f"Fichier introuvable: {filepath}"), 404
 
-    modify_mission(filepath, seq, updates)
-    logger.info(f"[{drone_id}] Mission modifiée: {filepath} seq={seq}")
+    edit = None
+    if batch:
+        try:
+            edit = edit_mission(
+                filepath,
+                updates=updates if isinstance(updates, list) else [],
+                delete=data.get("delete", []),
+                insert=data.get("insert", []),
+                order=data.get("order"),
+            )
+        except (IndexError, ValueError, KeyError, TypeError, AttributeError) as e:
+            return jsonify(error=f"Lot de modifications invalide: {e}"), 400
+        except RuntimeError as e:
+            return jsonify(error=str(e)), 400
+        logger.info(f"[{drone_id}] Mission modifiée par lot: {filepath} ({edit['count']} items)")
+    else:
+        try:
+            seq = int(data["seq"])
+            modify_mission(filepath, seq, updates)
+        except IndexError:
+            return jsonify(error=f"Aucun waypoint avec seq={data['seq']}"), 404
+        except (KeyError, ValueError, TypeError, AttributeError) as e:
+            return jsonify(error=f"Modification invalide: {e}"), 400
+        except RuntimeError as e:
+            return jsonify(error=str(e)), 400
+        logger.info(f"[{drone_id}] Mission modifiée: {filepath} seq={seq}")
+    if entry is not None:
+        refused = _preflight(drone_id, filepath, bool(data.get("force")))
+        if refused: return refused
+        return _sync_job(drone_id, entry, filepath, "Mission modifiée et synchronisée", _wants_wait(data), edit)
+    if edit is not None:
+        return jsonify(message="Mission modifiée", edit=edit), 200
     return jsonify(message="Mission modifiée"), 200
 
+@app.post("/drones/<int:drone_id>/mission/sync")
+def api_sync_mission(drone_id: int):
+    entry, err = _get_drone_or_404(drone_id)
+    if err: return err
+    data = request.get_json(silent=True) or {}
+    filename = data.get("filename")
+    if not filename:
+        return jsonify(error="Champ 'filename' requis"), 400
+    if not filename.endswith(".waypoints"):
+        return jsonify(error="Le fichier doit être .waypoints"), 400
+
+    filepath = _mission_path(filename)
+    if not os.path.exists(filepath):
+        return jsonify(error=f"Fichier introuvable: {filepath}"), 404
+    refused = _preflight(drone_id, filepath, bool(data.get("force")))
+    if refused: return refused
+    return _sync_job(drone_id, entry, filepath, f"Mission synchronisée depuis {filepath}", _wants_wait(data))
+
 @app.get("/drones/<int:drone_id>/mission/current")
 def api_mission_current(drone_id: int):
     entry, err = _get_drone_or_404(drone_id)
     if err: return err
-    items = download_mission(entry["master"])
-    return jsonify({"count": len(items), "items": items}), 200
+    refresh = request.args.get("refresh", "").lower() in ("1", "true", "yes")
+    cached = None if refresh else cached_onboard_mission(entry["link"])
+    if cached is not None:
+        return _mission_current_response(cached[0], cached[1])
+
+    # Download nécessaire : en arrière-plan
+    def _run(report):
+        mission, mission_id, _ = onboard_mission(entry["master"], dispatcher=entry["link"], refresh=True,
+                                                 progress=report)
+        return {"count": len(mission), "items": mission.to_dicts(), "mission_id": mission_id, "cached": False}
+
+    def _done(result):
+        resp = jsonify(result)
+        resp.headers["ETag"] = f'"{result["mission_id"]}"'
+        return resp, 200
+
+    return _job_response("mission_download", drone_id, _run, _wants_wait(), _done)
+
+def _mission_current_response(mission, mission_id: str):
+    """Réponse depuis le cache du lien (304 si le client a déjà cette version)."""
+    etag = f'"{mission_id}"'
+    if request.headers.get("If-None-Match") == etag:
+        return Response(status=304, headers={"ETag": etag})
+    resp = jsonify({"count": len(mission), "items": mission.to_dicts(), "mission_id": mission_id, "cached": True})
+    resp.headers["ETag"] = etag
+    return resp, 200
+
+# ─────────────────────────────────────────────
+# Jobs : opérations MAVLink longues hors du thread HTTP
+# ─────────────────────────────────────────────
+def _wants_wait(data=None) -> bool:
+    """?wait=1 (ou "wait": true dans le JSON) : attendre la fin du job et répondre comme avant."""
+    if data and data.get("wait"):
+        return True
+    return request.args.get("wait", "").lower() in ("1", "true", "yes")
+
+def _submit(kind: str, work, exclusive: bool = False):
+    try:
+        return submit_job(kind, work, exclusive), None
+    except TargetsBusy as e:
+        return None, (jsonify(error="Drones occupés par d'autres opérations", drones=e.targets), 409)
+    except JobQueueFull as e:
+        logger.warning(f"[jobs] {kind} refusé : {e}")
+        return None, (jsonify(error="Trop d'opérations en cours, réessayer plus tard", detail=str(e)), 503)
+
+def _accepted(job):
+    return jsonify(job_id=job.id, status_url=f"/jobs/{job.id}", job=job.to_dict()), 202
+
+def _job_response(kind: str, drone_id: int, run, wait: bool, on_done):
+    """
+    Soumet 'run' pour le drone (sérialisé avec ses autres jobs) et répond 202 + job.
+    Avec 'wait', attend la fin (au plus JOB_WAIT_TIMEOUT) : on_done(résultat) si
+    le job réussit, 504 s'il échoue, 202 s'il n'est pas fini à temps.
+    """
+    job, err = _submit(kind, {drone_id: run})
+    if err: return err
+    if not wait or not job.wait(JOB_WAIT_TIMEOUT):
+        return _accepted(job)
+    task = job.tasks[str(drone_id)]
+    if task["state"] != "done":
+        logger.error(f"[{drone_id}] {kind} échoué: {task['error']}")
+        return jsonify(error=task["error"], job_id=job.id), 504
+    return on_done(task["result"])
+
+# ─────────────────────────────────────────────
+# Flotte : opérations parallèles, suivies par job
+# ─────────────────────────────────────────────
+@app.post("/fleet/mission/send")
+def api_fleet_send_mission():
+    data = request.get_json(silent=True) or {}
+    missions = data.get("missions")
+    if not isinstance(missions, dict) or not missions:
+        return jsonify(error="'missions' requis : {\"<drone_id>\": \"<fichier>.waypoints\", ...}"), 400
+    force = bool(data.get("force"))
+    tolerance = data.get("simplify_tolerance_m")
+
+    # Tout est vérifié avant de lancer quoi que ce soit
+    errors, work = {}, {}
+    for key, filename in missions.items():
+        try:
+            drone_id = int(key)
+        except ValueError:
+            errors[key] = "Identifiant de drone invalide"
+            continue
+        entry, err = _get_drone_or_404(drone_id)
+        if err:
+            errors[key] = err[0].get_json()["error"]
+            continue
+        filepath = _mission_path(str(filename))
+        if not filepath.endswith(".waypoints") or not os.path.exists(filepath):
+            errors[key] = f"Fichier introuvable: {filepath}"
+            continue
+        if not force:
+            try:
+                check = _check_mission_file(filepath)
+            except RuntimeError as e:
+                errors[key] = str(e)
+                continue
+            if check["violations_count"]:
+                errors[key] = {"error": "Mission hors limites", "violations_count": check["violations_count"],
+                               "violations": check["violations"]}
+                continue
+        work[drone_id] = _fleet_send_task(drone_id, entry, filepath, tolerance)
+    if errors:
+        return jsonify(error="Envoi flotte refusé", drones=errors), 422
+
+    job, err = _submit("fleet_mission_send", work)
+    if err: return err
+    logger.info(f"[fleet] Envoi de mission lancé (job {job.id}) vers {sorted(work)}")
+    return _accepted(job)
+
+def _fleet_send_task(drone_id: int, entry, filepath: str, tolerance):
+    def _run(report):
+        stats = send_mission(filepath, entry["master"], dispatcher=entry["link"],
+                             simplify_tolerance_m=tolerance, progress=report)
+        logger.info(f"[{drone_id}] Mission envoyée (flotte): {filepath}")
+        return dict(stats, filename=filepath)
+    return _run
+
+@app.post("/fleet/start")
+def api_fleet_start():
+    data = request.get_json(silent=True) or {}
+    drones = data.get("drones")
+    if not isinstance(drones, list) or not drones:
+        return jsonify(error="'drones' requis : [<drone_id>, ...]"), 400
+    try:
+        ready_timeout = float(data.get("ready_timeout", FLEET_READY_TIMEOUT))
+    except (TypeError, ValueError):
+        return jsonify(error="'ready_timeout' doit être un nombre (secondes)"), 400
+
+    errors, entries = {}, {}
+    for key in drones:
+        try:
+            drone_id = int(key)
+        except (TypeError, ValueError):
+            errors[str(key)] = "Identifiant de drone invalide"
+            continue
+        entry, err = _get_drone_or_404(drone_id)
+        if err:
+            errors[str(key)] = err[0].get_json()["error"]
+            continue
+        entries[drone_id] = entry
+    if errors:
+        return jsonify(error="Démarrage flotte refusé", drones=errors), 422
+    # Tous les drones s'attendent : chacun doit avoir son worker dès maintenant
+    # (409 si un drone a déjà un job, 503 s'il n'y a pas assez de workers libres)
+    fleet = FleetStart(entries, ready_timeout=ready_timeout)
+    job, err = _submit("fleet_start", {did: _fleet_start_task(fleet, did, entry) for did, entry in entries.items()},
+                       exclusive=True)
+    if err: return err
+    logger.info(f"[fleet] Démarrage synchronisé lancé (job {job.id}) pour {sorted(entries)}")
+    if not _wants_wait(data) or not job.wait(JOB_WAIT_TIMEOUT):
+        return _accepted(job)
+    body, summary = job.to_dict(), fleet.summary()
+    if body["state"] != "done":
+        error = "Démarrage flotte partiel" if summary["partial"] else "Démarrage flotte échoué"
+        return jsonify(error=error, fleet=summary, job=body), 504
+    skews = [t["result"]["skew_ms"] for t in body["tasks"].values()]
+    return jsonify(message=f"Missions démarrées ({len(skews)} drones)", window_ms=max(skews),
+                   fleet=summary, job=body), 200
+
+def _fleet_start_task(fleet: FleetStart, drone_id: int, entry):
+    def _run(report):
+        result = fleet.run(drone_id, entry["master"], dispatcher=entry["link"], io_lock=entry["lock"],
+                           cache=entry["cache"], progress=report)
+        logger.info(f"[{drone_id}] Mission démarrée (flotte, écart {result['skew_ms']} ms)")
+        return result
+    return _run
+
+@app.get("/jobs")
+def api_jobs():
+    try:
+        limit = int(request.args.get("limit", 50))
+    except ValueError:
+        limit = 50
+    return jsonify({"executor": jobs.EXECUTOR.stats(), "jobs": [j.to_dict() for j in list_jobs(limit)]}), 200
+
+@app.get("/jobs/<job_id>")
+def api_job(job_id: str):
+    job = get_job(job_id)
+    if job is None:
+        return jsonify(error=f"Job {job_id} introuvable"), 404
+    return jsonify(job.to_dict()), 200
+
+@app.post("/jobs/<job_id>/cancel")
+def api_cancel_job(job_id: str):
+    job = get_job(job_id)
+    if job is None:
+        return jsonify(error=f"Job {job_id} introuvable"), 404
+    if not job.cancel():
+        return jsonify(error=f"Job {job_id} déjà terminé", job=job.to_dict()), 409
+    logger.info(f"[jobs] Job {job_id} ({job.kind}) annulé")
+    return jsonify(job.to_dict()), 200
 
 if __name__ == "__main__":
     logger.info("Démarrage API Flask multi-drones (debug)")
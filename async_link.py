@@ -0,0 +1,242 @@
+import asyncio, threading
+from typing import Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+from pymavlink import mavutil
+
+from dispatcher import MessageRouter, RttEstimator, send_command_long
+from mission_tool import send_mission, download_mission
+
+# Nombre max de trames lues d'un coup sur un lien (équité entre liens)
+_MAX_FRAMES_PER_WAKEUP = 64
+# Erreurs de lecture consécutives avant d'abandonner le descripteur (lien perdu)
+_MAX_READ_ERRORS = 3
+# Attente max entre deux essais de io_lock depuis la boucle (s)
+_LOCK_RETRY_MAX = 0.02
+
+# ─────────────────────────────────────────────
+# Lien géré par la boucle asyncio
+# ─────────────────────────────────────────────
+class AsyncLink(MessageRouter):
+    """
+    Lien MAVLink lu par l'AsyncLinkEngine (aucun thread dédié).
+    Même interface que MavlinkDispatcher pour le code synchrone
+    (master, io_lock, subscribe/add_sink, command_long), plus des
+    opérations awaitables à appeler depuis la boucle de l'engine.
+    """
+    def __init__(self, engine: "AsyncLinkEngine", key: Hashable, master, io_lock: Optional[threading.RLock] = None) -> None:
+        super().__init__()
+        self.engine = engine
+        self.key = key
+        self.master = master
+        self.io_lock = io_lock or threading.RLock()
+        self.rtt = RttEstimator()
+        self.mission_int: Optional[bool] = None  # protocole mission INT supporté ? (appris au 1er download)
+        self.onboard_mission = None  # Mission à bord connue (cache, voir mission_tool)
+        self.onboard_mission_id: Optional[str] = None
+        self.mission_signature: Optional[tuple] = None
+        self.onboard_watched = False  # cache tenu à jour par watch_onboard_mission ?
+        self.frames = 0
+        self.read_errors = 0
+        self.lost_reason: Optional[str] = None  # erreur qui a fait abandonner la lecture
+        self._waiters: List[Tuple[Optional[frozenset], Optional[Callable], asyncio.Future]] = []
+
+    # ── Réception (appelé dans la boucle) ──
+    def _feed(self, msg) -> None:
+        self.frames += 1
+        self.route(msg)
+        if not self._waiters:
+            return
+        t = msg.get_type()
+        for w in list(self._waiters):
+            types, cond, fut = w
+            if fut.done() or (types is not None and t not in types):
+                continue
+            if cond is not None and not cond(msg):
+                continue
+            fut.set_result(msg)
+            self._waiters.remove(w)
+
+    # ── API awaitable ──
+    async def wait_message(
+        self,
+        types: Optional[Iterable[str]] = None,
+        condition: Optional[Callable] = None,
+        timeout: Optional[float] = None,
+    ):
+        """Attend le prochain message du/des type(s) (et vérifiant 'condition'). None au timeout."""
+        fut = asyncio.get_running_loop().create_future()
+        waiter = (frozenset([types] if isinstance(types, str) else types) if types else None, condition, fut)
+        self._waiters.append(waiter)
+        try:
+            return await asyncio.wait_for(fut, timeout)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+
+    async def command(self, command: int, *params: float, timeout: float = 3.0, confirmation: int = 0):
+        """COMMAND_LONG + attente du COMMAND_ACK correspondant, sans bloquer la boucle."""
+        p = (list(params) + [0.0] * 7)[:7]
+        master = self.master
+        waiting = asyncio.ensure_future(self.wait_message(
+            "COMMAND_ACK", lambda m: int(getattr(m, "command", -1)) == int(command), timeout
+        ))
+        try:
+            await asyncio.sleep(0)  # enregistre le waiter avant l'envoi
+            await self._acquire_io()
+            try:
+                master.mav.command_long_send(
+                    master.target_system, master.target_component,
+                    command, confirmation, *p
+                )
+            finally:
+                self.io_lock.release()
+            return await waiting
+        finally:
+            # Annulation (ex. pendant l'attente du verrou) : le waiter ne doit pas survivre
+            waiting.cancel()
+
+    async def _acquire_io(self) -> None:
+        """
+        Prend io_lock sans bloquer la boucle : un upload peut le tenir longtemps
+        depuis un autre thread. L'appelant le relâche sans 'await' entre-temps
+        (l'RLock appartient au thread de la boucle, partagé par toutes les coroutines).
+        """
+        delay = 0.001
+        while not self.io_lock.acquire(blocking=False):
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, _LOCK_RETRY_MAX)
+
+    async def upload_mission(self, filename: str, **kwargs) -> None:
+        """send_mission sur ce lien, exécuté hors de la boucle (les réponses arrivent par abonnement)."""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, lambda: send_mission(filename, self.master, dispatcher=self, **kwargs))
+
+    async def fetch_mission(self, **kwargs):
+        """download_mission sur ce lien (retourne une Mission), exécuté hors de la boucle."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, lambda: download_mission(self.master, dispatcher=self, **kwargs))
+
+    # ── API synchrone (threads Flask, missions) ──
+    def command_long(self, command: int, *params: float, timeout: float = 3.0, confirmation: int = 0):
+        return send_command_long(self, command, *params, timeout=timeout, confirmation=confirmation)
+
+    def is_alive(self) -> bool:
+        """False une fois la lecture abandonnée (descripteur en erreur)."""
+        return self.lost_reason is None
+
+    def stop(self) -> None:
+        self.engine.remove_link(self.key)
+
+# ─────────────────────────────────────────────
+# Engine : une boucle asyncio pour tous les liens
+# ─────────────────────────────────────────────
+class AsyncLinkEngine:
+    """
+    Lit tous les liens MAVLink (UDP/série/TCP) depuis une seule boucle asyncio :
+    chaque descripteur non bloquant est surveillé par loop.add_reader, et les
+    trames sont décodées par le parseur mavutil du lien puis routées.
+    Aucun réveil périodique : un lien inactif ne coûte rien.
+    """
+    def __init__(self) -> None:
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._links: Dict[Hashable, AsyncLink] = {}
+
+    def start(self) -> "AsyncLinkEngine":
+        ready = threading.Event()
+
+        def _run() -> None:
+            self.loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self.loop)
+            ready.set()
+            self.loop.run_forever()
+
+        self._thread = threading.Thread(target=_run, name="mav-async-engine", daemon=True)
+        self._thread.start()
+        ready.wait()
+        return self
+
+    def stop(self) -> None:
+        for key in list(self._links):
+            self.remove_link(key)
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+
+    def add_link(
+        self,
+        key: Hashable,
+        master,
+        io_lock: Optional[threading.RLock] = None,
+        sinks: Iterable[Callable] = (),
+        request_stream: bool = True,
+    ) -> AsyncLink:
+        """Enregistre un lien (thread-safe). Les sinks sont branchés avant la première trame."""
+        if getattr(master, "fd", None) is None:
+            raise ValueError(f"Lien {key}: pas de descripteur pollable (fd)")
+        link = AsyncLink(self, key, master, io_lock)
+        for fn in sinks:
+            link.add_sink(fn)
+        self._links[key] = link
+        self._call(self._attach, link, request_stream)
+        return link
+
+    def remove_link(self, key: Hashable) -> None:
+        link = self._links.pop(key, None)
+        if link is not None:
+            self._call(self.loop.remove_reader, link.master.fd)
+
+    def link(self, key: Hashable) -> Optional[AsyncLink]:
+        return self._links.get(key)
+
+    def run(self, coro, timeout: Optional[float] = None):
+        """Exécute une coroutine sur la boucle de l'engine depuis un autre thread et retourne son résultat."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(timeout)
+
+    def _call(self, fn, *args) -> None:
+        if threading.current_thread() is self._thread:
+            fn(*args)
+        else:
+            self.loop.call_soon_threadsafe(fn, *args)
+
+    def _attach(self, link: AsyncLink, request_stream: bool) -> None:
+        self.loop.add_reader(link.master.fd, self._on_readable, link)
+        if request_stream:
+            # io_lock est bloquant : jamais pris sur le thread de la boucle
+            self.loop.run_in_executor(None, self._request_stream, link)
+
+    @staticmethod
+    def _request_stream(link: AsyncLink) -> None:
+        master = link.master
+        try:
+            with link.io_lock:
+                master.mav.request_data_stream_send(
+                    master.target_system, master.target_component,
+                    mavutil.mavlink.MAV_DATA_STREAM_ALL, 2, 1
+                )
+        except Exception:
+            pass
+
+    def _on_readable(self, link: AsyncLink) -> None:
+        master = link.master
+        for _ in range(_MAX_FRAMES_PER_WAKEUP):
+            try:
+                msg = master.recv_msg()
+            except Exception as e:
+                link.read_errors += 1
+                if link.read_errors >= _MAX_READ_ERRORS:
+                    # Descripteur cassé : il resterait "lisible" et ferait tourner la boucle à vide
+                    self.loop.remove_reader(master.fd)
+                    link.lost_reason = f"{type(e).__name__}: {e}"
+                return
+            link.read_errors = 0
+            if msg is None:
+                return
+            if msg.get_type() != "BAD_DATA":
+                link._feed(msg)
+        # Plafond atteint : des trames complètes peuvent rester dans le tampon du
+        # parseur sans que le descripteur redevienne lisible (lien ensuite muet)
+        if self._links.get(link.key) is link:
+            self.loop.call_soon(self._on_readable, link)
@@ -0,0 +1,287 @@
+import time, queue, threading
+from typing import Callable, Dict, Iterable, Optional, Tuple, Union
+from pymavlink import mavutil
+
+# ─────────────────────────────────────────────
+# Abonnement : file bornée de messages filtrés par type
+# ─────────────────────────────────────────────
+class Subscription:
+    """
+    File bornée alimentée par le lecteur du lien.
+    Si l'abonné ne consomme pas assez vite, le plus ancien message est jeté
+    (le lecteur ne bloque jamais).
+    API de lecture calquée sur master.recv_match().
+    """
+    def __init__(self, router: "MessageRouter", types: Optional[Iterable[str]], maxsize: int = 256) -> None:
+        self._router = router
+        self.types = frozenset(types) if types else None
+        self._q: "queue.Queue" = queue.Queue(maxsize)
+        self.dropped = 0
+
+    def put(self, msg) -> None:
+        try:
+            self._q.put_nowait(msg)
+        except queue.Full:
+            try:
+                self._q.get_nowait()
+            except queue.Empty:
+                pass
+            self.dropped += 1
+            try:
+                self._q.put_nowait(msg)
+            except queue.Full:
+                pass
+
+    def recv_match(
+        self,
+        type: Union[None, str, Iterable[str]] = None,
+        blocking: bool = True,
+        timeout: Optional[float] = None,
+    ):
+        """Retourne le prochain message du/des type(s) demandé(s), ou None au timeout."""
+        wanted = {type} if isinstance(type, str) else (set(type) if type else None)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            try:
+                if not blocking:
+                    msg = self._q.get_nowait()
+                elif deadline is None:
+                    msg = self._q.get()
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return None
+                    msg = self._q.get(timeout=remaining)
+            except queue.Empty:
+                return None
+            if wanted is None or msg.get_type() in wanted:
+                return msg
+
+    def drain(self) -> None:
+        while True:
+            try:
+                self._q.get_nowait()
+            except queue.Empty:
+                return
+
+    def close(self) -> None:
+        self._router.unsubscribe(self)
+
+    def __enter__(self) -> "Subscription":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class DirectSubscription:
+    """
+    Abonnement "legacy" sans lecteur dédié : lit directement sur le master.
+    À n'utiliser que si aucun dispatcher ne tourne sur ce lien.
+    """
+    def __init__(self, master, types: Optional[Iterable[str]] = None) -> None:
+        self.master = master
+        self.types = list(types) if types else None
+        self.dropped = 0
+
+    def recv_match(self, type=None, blocking: bool = True, timeout: Optional[float] = None):
+        return self.master.recv_match(type=type or self.types, blocking=blocking, timeout=timeout)
+
+    def drain(self, duration: float = 0.2) -> None:
+        t0 = time.time()
+        while time.time() - t0 < duration:
+            if self.master.recv_match(blocking=False, timeout=0) is None:
+                break
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self) -> "DirectSubscription":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+# ─────────────────────────────────────────────
+# Estimation du RTT du lien (RFC 6298)
+# ─────────────────────────────────────────────
+class RttEstimator:
+    """
+    SRTT / RTTVAR lissés sur les échanges requête→réponse du lien ;
+    rto() donne le délai de retransmission adaptatif (borné).
+    """
+    def __init__(self, initial_rto: float = 1.0, min_rto: float = 0.05, max_rto: float = 5.0) -> None:
+        self.srtt: Optional[float] = None
+        self.rttvar = 0.0
+        self.min_rto = min_rto
+        self.max_rto = max_rto
+        self._rto = initial_rto
+
+    def sample(self, rtt: float) -> None:
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2.0
+        else:
+            self.rttvar = 0.75 * self.rttvar + 0.25 * abs(self.srtt - rtt)
+            self.srtt = 0.875 * self.srtt + 0.125 * rtt
+        self._rto = self.srtt + 4.0 * self.rttvar
+
+    def backoff(self) -> None:
+        """Après un timeout : on double le RTO (jusqu'à max_rto)."""
+        self._rto = min(self._rto * 2.0, self.max_rto)
+
+    def rto(self) -> float:
+        return min(max(self._rto, self.min_rto), self.max_rto)
+
+# ─────────────────────────────────────────────
+# Routage : sinks (callbacks) + abonnements par type
+# ─────────────────────────────────────────────
+class MessageRouter:
+    """
+    Distribue chaque message décodé :
+      - aux sinks (callbacks appelés dans le thread lecteur, ex: TelemetryCache.update_from_msg)
+      - aux abonnements dont le filtre de type correspond
+    Les tables sont en copy-on-write : route() ne prend aucun verrou.
+    """
+    def __init__(self) -> None:
+        self._guard = threading.Lock()
+        self._sinks: Tuple[Callable, ...] = ()
+        self._by_type: Dict[str, Tuple[Subscription, ...]] = {}
+        self._wildcard: Tuple[Subscription, ...] = ()
+
+    def add_sink(self, fn: Callable) -> None:
+        with self._guard:
+            self._sinks = self._sinks + (fn,)
+
+    def remove_sink(self, fn: Callable) -> None:
+        with self._guard:
+            self._sinks = tuple(s for s in self._sinks if s is not fn)
+
+    def subscribe(self, types: Optional[Iterable[str]] = None, maxsize: int = 256) -> Subscription:
+        sub = Subscription(self, types, maxsize)
+        with self._guard:
+            if sub.types is None:
+                self._wildcard = self._wildcard + (sub,)
+            else:
+                by_type = dict(self._by_type)
+                for t in sub.types:
+                    by_type[t] = by_type.get(t, ()) + (sub,)
+                self._by_type = by_type
+        return sub
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        with self._guard:
+            if sub.types is None:
+                self._wildcard = tuple(s for s in self._wildcard if s is not sub)
+                return
+            by_type = dict(self._by_type)
+            for t in sub.types:
+                rest = tuple(s for s in by_type.get(t, ()) if s is not sub)
+                if rest:
+                    by_type[t] = rest
+                else:
+                    by_type.pop(t, None)
+            self._by_type = by_type
+
+    def route(self, msg) -> None:
+        for fn in self._sinks:
+            try:
+                fn(msg)
+            except Exception:
+                pass
+        for sub in self._by_type.get(msg.get_type(), ()):
+            sub.put(msg)
+        for sub in self._wildcard:
+            sub.put(msg)
+
+# ─────────────────────────────────────────────
+# Dispatcher : un thread lecteur unique par lien
+# ─────────────────────────────────────────────
+class MavlinkDispatcher(MessageRouter):
+    """
+    Seul lecteur du lien MAVLink : décode chaque trame une fois et la route.
+    Le verrou io_lock ne protège plus que les écritures / sessions (missions,
+    commandes) ; la boucle de lecture ne le prend jamais.
+    """
+    def __init__(self, master, io_lock: Optional[threading.RLock] = None, name: Optional[str] = None) -> None:
+        super().__init__()
+        self.master = master
+        self.io_lock = io_lock or threading.RLock()
+        self.name = name or f"mav-dispatch-{id(master):x}"
+        self.rtt = RttEstimator()
+        self.mission_int: Optional[bool] = None  # protocole mission INT supporté ? (appris au 1er download)
+        self.onboard_mission = None  # Mission à bord connue (cache, voir mission_tool)
+        self.onboard_mission_id: Optional[str] = None
+        self.mission_signature: Optional[tuple] = None
+        self.onboard_watched = False  # cache tenu à jour par watch_onboard_mission ?
+        self.stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self, request_stream: bool = True) -> "MavlinkDispatcher":
+        if request_stream:
+            try:
+                with self.io_lock:
+                    self.master.mav.request_data_stream_send(
+                        self.master.target_system, self.master.target_component,
+                        mavutil.mavlink.MAV_DATA_STREAM_ALL, 2, 1
+                    )
+            except Exception:
+                pass
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout: float = 2.0) -> None:
+        self.stop_event.set()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=timeout)
+
+    def is_alive(self) -> bool:
+        return bool(self._thread and self._thread.is_alive())
+
+    def _run(self) -> None:
+        master = self.master
+        while not self.stop_event.is_set():
+            try:
+                msg = master.recv_match(blocking=True, timeout=0.5)
+            except Exception:
+                continue
+            if msg is None or msg.get_type() == "BAD_DATA":
+                continue
+            self.route(msg)
+
+    def command_long(self, command: int, *params: float, timeout: float = 3.0, confirmation: int = 0):
+        return send_command_long(self, command, *params, timeout=timeout, confirmation=confirmation)
+
+
+# ─────────────────────────────────────────────
+# Commandes avec attente d'ACK
+# ─────────────────────────────────────────────
+def send_command_long(link, command: int, *params: float, timeout: float = 3.0, confirmation: int = 0):
+    """
+    Envoie un COMMAND_LONG sur 'link' (dispatcher ou lien asyncio) et attend
+    le COMMAND_ACK correspondant. Retourne le message COMMAND_ACK, ou None au timeout.
+    """
+    p = (list(params) + [0.0] * 7)[:7]
+    master = link.master
+    with link.subscribe(["COMMAND_ACK"], maxsize=32) as sub:
+        with link.io_lock:
+            master.mav.command_long_send(
+                master.target_system, master.target_component,
+                command, confirmation, *p
+            )
+        return wait_command_ack(sub, command, timeout)
+
+
+def wait_command_ack(sub, command: int, timeout: float = 3.0):
+    """Attend sur 'sub' le COMMAND_ACK de 'command' (ignore les ACK d'autres commandes)."""
+    deadline = time.monotonic() + timeout
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return None
+        ack = sub.recv_match(type="COMMAND_ACK", blocking=True, timeout=remaining)
+        if ack is None:
+            return None
+        if int(getattr(ack, "command", -1)) == int(command):
+            return ack
@@ -1,8 +1,8 @@
 import math, time
-from typing import Dict, Any
+from typing import Dict, Any, Iterable, Optional, Tuple, Union
 import json
 from pymavlink import mavutil
-from telemetry import TelemetryCache, MAVLINK_IO_LOCK 
+from telemetry import TelemetryCache, MAVLINK_IO_LOCK, flight_doc
 
 def build_flight_info(
     drone_id: str,
@@ -11,52 +11,110 @@ def build_flight_info(
     allow_stale: bool = True,
 ) -> Dict[str, Any]:
     snap = cache.snapshot()
-    hb = snap.get("heartbeat")
-    gp = snap.get("global_position")
-    ts = snap.get("ts", {})
+    doc = snap.flight_doc
     now = time.time()
 
-    if gp is None or hb is None:
+    if doc is None:
         raise RuntimeError("Aucune donnée de position ou heartbeat reçue.")
 
-    age_pos = now - ts.get("GLOBAL_POSITION_INT", 0)
-    age_hb  = now - ts.get("HEARTBEAT", 0)
+    age_pos = now - snap.gp_ts
+    age_hb  = now - snap.hb_ts
     is_stale = (age_pos > stale_after) or (age_hb > stale_after)
 
     if is_stale and not allow_stale:
         raise RuntimeError("Télémétrie trop ancienne ou absente.")
 
-    vx, vy, vz = gp.vx/100.0, gp.vy/100.0, gp.vz/100.0
-
-    return {
-        "drone_id": str(drone_id),
-        "is_armed": (hb.base_mode & mavutil.mavlink.MAV_MODE_FLAG_SAFETY_ARMED) != 0,
-        "flight_mode": mavutil.mode_string_v10(hb),
-        "latitude": gp.lat / 1e7,
-        "longitude": gp.lon / 1e7,
-        "altitude_m": gp.relative_alt / 1000.0,
-        "horizontal_speed_m_s": round((vx*vx + vy*vy)**0.5, 2),
-        "vertical_speed_m_s": round(vz, 2),
-        "heading_deg": (gp.hdg / 100.0) if getattr(gp, "hdg", None) is not None else 0.0,
-        "movement_track_deg": (gp.hdg / 100.0) if getattr(gp, "hdg", None) is not None else None,
-        "battery_remaining_percent": getattr(snap.get("battery"), "battery_remaining", None)
-            if snap.get("battery") else None,
-        "stale": is_stale,
-        "age_sec": {"position": round(age_pos, 3), "heartbeat": round(age_hb, 3)},
-    }
+    out = {"drone_id": str(drone_id)}
+    out.update(doc)
+    out["stale"] = is_stale
+    out["age_sec"] = {"position": round(age_pos, 3), "heartbeat": round(age_hb, 3)}
+    return out
+
+
+def build_flight_info_json(
+    drone_id: str,
+    cache: TelemetryCache,
+    stale_after: float = 2.0,
+    allow_stale: bool = True,
+) -> Tuple[bytes, bool]:
+    """
+    Même document que build_flight_info, directement en JSON : le corps est
+    pré-encodé par le cache à la réception des messages, seuls drone_id et
+    les âges sont ajoutés ici. Retourne (json, stale).
+    """
+    snap = cache.snapshot()
+    body = snap.flight_json
+    now = time.time()
+
+    if body is None:
+        raise RuntimeError("Aucune donnée de position ou heartbeat reçue.")
+
+    age_pos = now - snap.gp_ts
+    age_hb  = now - snap.hb_ts
+    is_stale = (age_pos > stale_after) or (age_hb > stale_after)
+
+    if is_stale and not allow_stale:
+        raise RuntimeError("Télémétrie trop ancienne ou absente.")
+
+    return b'{"drone_id": %s, %s, "stale": %s, "age_sec": {"position": %.3f, "heartbeat": %.3f}}' % (
+        _json_str(drone_id), body, b"true" if is_stale else b"false", age_pos, age_hb
+    ), is_stale
+
+
+def build_fleet_flight_info_json(
+    caches: Iterable[Tuple[Any, Union[TelemetryCache, str]]],
+    fields: Optional[Iterable[str]] = None,
+    stale_after: float = 2.0,
+    allow_stale: bool = True,
+) -> bytes:
+    """
+    flight_info de plusieurs drones en un seul document JSON :
+    {"count": n, "drones": [...]} dans l'ordre de 'caches' (drone_id, cache).
+    Sans projection, les corps pré-encodés sont concaténés tels quels ;
+    avec 'fields', seuls ces champs (et drone_id) sont gardés.
+    À la place du cache, un message d'erreur (drone inconnu, non connecté…)
+    donne {"drone_id", "error"}, comme un drone sans données.
+    """
+    keep = None if not fields else set(fields) | {"drone_id"}
+    parts = []
+    for drone_id, cache in caches:
+        try:
+            if isinstance(cache, str):
+                raise RuntimeError(cache)
+            if keep is None:
+                parts.append(build_flight_info_json(drone_id, cache, stale_after, allow_stale)[0])
+                continue
+            doc = build_flight_info(drone_id, cache, stale_after, allow_stale)
+            parts.append(json.dumps({k: v for k, v in doc.items() if k in keep}).encode())
+        except RuntimeError as e:
+            parts.append(json.dumps({"drone_id": str(drone_id), "error": str(e)}).encode())
+    return b'{"count": %d, "drones": [%s]}' % (len(parts), b", ".join(parts))
+
+
+_JSON_IDS: Dict[str, bytes] = {}
+
+def _json_str(value) -> bytes:
+    """Chaîne JSON encodée (mémoïsée : les identifiants de drones sont peu nombreux)."""
+    key = str(value)
+    out = _JSON_IDS.get(key)
+    if out is None:
+        out = _JSON_IDS[key] = json.dumps(key).encode()
+    return out
 
 
 def flight_info(
     drone_id: str,
     master,
     timeout: float = 5.0,
-    request_stream: bool = True
+    request_stream: bool = True,
+    io_lock=None,
 ) -> Dict[str, Any]:
     """
     Lecture directe sur le lien MAVLink (sans passer par le cache).
-    Protégée par MAVLINK_IO_LOCK pour éviter les collisions avec la télémétrie/mission.
+    Protégée par le verrou du lien (io_lock, ou MAVLINK_IO_LOCK par défaut)
+    pour éviter les collisions avec la télémétrie/mission.
     """
-    with MAVLINK_IO_LOCK:
+    with (io_lock or MAVLINK_IO_LOCK):
         if request_stream:
             try:
                 master.mav.request_data_stream_send(
@@ -72,18 +130,6 @@ def flight_info(
     if not hb or not gp:
         raise RuntimeError("Aucune donnée de position ou heartbeat reçue.")
 
-    vx, vy, vz = gp.vx/100.0, gp.vy/100.0, gp.vz/100.0
-
-    return {
-        "drone_id": str(drone_id),
-        "is_armed": (hb.base_mode & mavutil.mavlink.MAV_MODE_FLAG_SAFETY_ARMED) != 0,
-        "flight_mode": mavutil.mode_string_v10(hb),
-        "latitude": gp.lat / 1e7,
-        "longitude": gp.lon / 1e7,
-        "altitude_m": gp.relative_alt / 1000.0,
-        "horizontal_speed_m_s": round((vx*vx + vy*vy)**0.5, 2),
-        "vertical_speed_m_s": round(vz, 2),
-        "heading_deg": (gp.hdg / 100.0) if getattr(gp, "hdg", None) is not None else 0.0,
-        "movement_track_deg": (gp.hdg / 100.0) if getattr(gp, "hdg", None) is not None else None,
-        "battery_remaining_percent": None, 
-    }
+    out = {"drone_id": str(drone_id)}
+    out.update(flight_doc(hb, gp))
+    return out
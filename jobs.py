@@ -0,0 +1,269 @@
+import threading, time, uuid
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+# Jobs gardés en mémoire (les plus anciens terminés sont oubliés au-delà)
+MAX_JOBS = 200
+
+# Travail d'une tâche : fn(report) ; report({...}) publie la progression
+# et lève JobCancelled si le job a été annulé
+Work = Callable[[Callable[[Dict[str, Any]], None]], Any]
+
+_FINAL_STATES = ("done", "failed", "cancelled")
+
+
+class JobCancelled(Exception):
+    """Levée dans une tâche (par report()) quand son job est annulé."""
+
+
+class JobQueueFull(RuntimeError):
+    """Trop de tâches en attente : la demande est refusée plutôt que mise en file sans fin."""
+
+
+class TargetsBusy(RuntimeError):
+    """Job 'exclusive' refusé : des cibles ont déjà un job en cours ou en attente."""
+    def __init__(self, targets: Iterable[Hashable]) -> None:
+        self.targets = sorted(str(t) for t in targets)
+        super().__init__(f"Cibles occupées : {', '.join(self.targets)}")
+
+# ─────────────────────────────────────────────
+# Job : une opération longue, une tâche par cible (drone)
+# ─────────────────────────────────────────────
+class Job:
+    """
+    Opération lancée en arrière-plan sur une ou plusieurs cibles.
+    Chaque tâche a son état ('pending' | 'running' | 'done' | 'failed' |
+    'cancelled'), sa dernière progression, son résultat ou son erreur, et sa
+    durée. État du job : 'queued' (rien n'a démarré), 'running', puis 'done'
+    (toutes réussies), 'cancelled' ou 'failed'.
+    """
+
+    def __init__(self, kind: str, targets: Iterable[Hashable]) -> None:
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.created_at = time.time()
+        self._t0 = time.monotonic()
+        self._finished_at: Optional[float] = None
+        self._lock = threading.Lock()
+        self._cancel = threading.Event()
+        self._done = threading.Event()
+        self.tasks: Dict[str, Dict[str, Any]] = {
+            str(t): {"state": "pending", "progress": None, "result": None, "error": None, "elapsed_s": None}
+            for t in targets
+        }
+        self._started: Dict[str, float] = {}
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            states = [t["state"] for t in self.tasks.values()]
+        if all(s == "pending" for s in states) and not self._cancel.is_set():
+            return "queued"
+        if any(s not in _FINAL_STATES for s in states):
+            return "running"
+        if all(s == "done" for s in states):
+            return "done"
+        return "failed" if "failed" in states else "cancelled"
+
+    @property
+    def finished(self) -> bool:
+        return self._done.is_set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Attend la fin de toutes les tâches ; False si 'timeout' expire avant."""
+        return self._done.wait(timeout)
+
+    def cancel(self) -> bool:
+        """
+        Annule le job : les tâches en attente ne démarreront pas, les tâches en
+        cours s'arrêtent à leur prochain report(). False si le job était fini.
+        """
+        if self.finished:
+            return False
+        self._cancel.set()
+        with self._lock:
+            for task in self.tasks.values():
+                if task["state"] == "pending":
+                    task["state"] = "cancelled"
+            self._check_done()
+        return True
+
+    def report(self, target: Hashable, progress: Dict[str, Any]) -> None:
+        """Dernière progression connue de la tâche 'target' ; lève JobCancelled si le job est annulé."""
+        with self._lock:
+            self.tasks[str(target)]["progress"] = dict(progress)
+        if self._cancel.is_set():
+            raise JobCancelled(f"Job {self.id} annulé")
+
+    def _start_task(self, target: Hashable) -> bool:
+        with self._lock:
+            task = self.tasks[str(target)]
+            if task["state"] != "pending":
+                return False  # annulée avant de démarrer
+            task["state"] = "running"
+            self._started[str(target)] = time.monotonic()
+            return True
+
+    def _end_task(self, target: Hashable, state: str, result: Any = None, error: Optional[str] = None) -> None:
+        with self._lock:
+            task = self.tasks[str(target)]
+            task["state"], task["result"], task["error"] = state, result, error
+            task["elapsed_s"] = round(time.monotonic() - self._started[str(target)], 3)
+            self._check_done()
+
+    def _check_done(self) -> None:
+        if all(t["state"] in _FINAL_STATES for t in self.tasks.values()) and not self._done.is_set():
+            self._finished_at = time.monotonic()
+            self._done.set()
+
+    def to_dict(self) -> Dict[str, Any]:
+        state = self.state
+        now = time.monotonic()
+        with self._lock:
+            tasks = {k: dict(v) for k, v in self.tasks.items()}
+            for k, t0 in self._started.items():
+                if tasks[k]["state"] == "running":
+                    tasks[k]["elapsed_s"] = round(now - t0, 3)
+            end = self._finished_at if self._finished_at is not None else now
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "state": state,
+            "created_at": self.created_at,
+            "elapsed_s": round(end - self._t0, 3),
+            "summary": {s: sum(1 for t in tasks.values() if t["state"] == s)
+                        for s in ("pending", "running") + _FINAL_STATES},
+            "tasks": tasks,
+        }
+
+# ─────────────────────────────────────────────
+# Exécuteur : pool borné, une tâche à la fois par drone
+# ─────────────────────────────────────────────
+def _run_task(job: Job, target: Hashable, fn: Work) -> None:
+    if not job._start_task(target):
+        return
+    try:
+        result = fn(lambda progress: job.report(target, progress))
+    except JobCancelled:
+        job._end_task(target, "cancelled", error="Annulé")
+    except Exception as e:
+        job._end_task(target, "failed", error=f"{type(e).__name__}: {e}")
+    else:
+        job._end_task(target, "done", result=result)
+
+
+class JobExecutor:
+    """
+    Pool de 'max_workers' threads pour les jobs. Les tâches d'une même cible
+    (drone) s'exécutent l'une après l'autre, dans l'ordre de soumission ; des
+    cibles différentes avancent en parallèle. Au-delà de 'max_pending' tâches
+    en attente ou en cours, submit() lève JobQueueFull.
+    """
+
+    def __init__(self, max_workers: int = 8, max_pending: int = 64) -> None:
+        self.max_workers = max(1, int(max_workers))
+        self.max_pending = max(1, int(max_pending))
+        self._pool = ThreadPoolExecutor(self.max_workers, thread_name_prefix="job")
+        self._lock = threading.Lock()
+        self._queues: Dict[Hashable, Deque[Tuple[Job, Work]]] = {}
+        self._busy: Set[Hashable] = set()
+        self._pending = 0
+
+    def submit(self, kind: str, work: Dict[Hashable, Work], exclusive: bool = False) -> Job:
+        """
+        Une tâche par cible (clé = drone) ; retourne le Job aussitôt.
+        'exclusive' : toutes les tâches doivent démarrer ensemble (elles
+        s'attendent entre elles) ; lève TargetsBusy si une cible a déjà un job,
+        JobQueueFull s'il n'y a pas assez de workers libres. Les workers sont
+        réservés sous le verrou : aucune autre soumission ne peut s'intercaler.
+        """
+        with self._lock:
+            if self._pending + len(work) > self.max_pending:
+                raise JobQueueFull(f"{self._pending} tâches en cours ou en attente (max {self.max_pending}).")
+            if exclusive:
+                busy = [t for t in work if t in self._busy]
+                if busy:
+                    raise TargetsBusy(busy)
+                free = self.max_workers - len(self._busy)
+                if len(work) > free:
+                    raise JobQueueFull(f"{len(work)} tâches simultanées demandées, {free} workers libres "
+                                       f"(max {self.max_workers}).")
+            self._pending += len(work)
+            job = Job(kind, work.keys())
+            ready = [(t, fn) for t, fn in work.items() if self._claim(t, job, fn)]
+        _register(job)
+        for target, fn in ready:
+            self._pool.submit(self._run, target, job, fn)
+        return job
+
+    def _claim(self, target: Hashable, job: Job, fn: Work) -> bool:
+        """Sous self._lock : True si la cible est libre (la tâche part), sinon mise en file derrière ses jobs."""
+        if target in self._busy:
+            self._queues.setdefault(target, deque()).append((job, fn))
+            return False
+        self._busy.add(target)
+        return True
+
+    def _run(self, target: Hashable, job: Job, fn: Work) -> None:
+        try:
+            _run_task(job, target, fn)
+        finally:
+            with self._lock:
+                self._pending -= 1
+                queue = self._queues.get(target)
+                nxt = queue.popleft() if queue else None
+                if queue is not None and not queue:
+                    del self._queues[target]
+                if nxt is None:
+                    self._busy.discard(target)
+            if nxt is not None:
+                self._pool.submit(self._run, target, *nxt)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"workers": self.max_workers, "pending": self._pending, "max_pending": self.max_pending,
+                    "busy_targets": len(self._busy)}
+
+
+EXECUTOR = JobExecutor()
+
+
+def configure(max_workers: int, max_pending: int) -> JobExecutor:
+    """Remplace l'exécuteur par défaut (à appeler au démarrage, avant toute soumission)."""
+    global EXECUTOR
+    EXECUTOR = JobExecutor(max_workers, max_pending)
+    return EXECUTOR
+
+
+def submit_job(kind: str, work: Dict[Hashable, Work], exclusive: bool = False) -> Job:
+    return EXECUTOR.submit(kind, work, exclusive)
+
+# ─────────────────────────────────────────────
+# Registre
+# ─────────────────────────────────────────────
+_JOBS: "OrderedDict[str, Job]" = OrderedDict()
+_JOBS_LOCK = threading.Lock()
+
+
+def _register(job: Job) -> None:
+    with _JOBS_LOCK:
+        _JOBS[job.id] = job
+        if len(_JOBS) > MAX_JOBS:
+            for old_id in [i for i, j in _JOBS.items() if j.finished][:len(_JOBS) - MAX_JOBS]:
+                del _JOBS[old_id]
+
+
+def get_job(job_id: str) -> Optional[Job]:
+    with _JOBS_LOCK:
+        return _JOBS.get(job_id)
+
+
+def list_jobs(limit: int = 50) -> List[Job]:
+    """Jobs les plus récents d'abord."""
+    with _JOBS_LOCK:
+        return list(reversed(_JOBS.values()))[:limit]
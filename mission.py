@@ -0,0 +1,476 @@
+import os, struct, sys, threading, hashlib
+from array import array
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+WPL_HEADER = "QGC WPL 110"
+
+# Colonnes d'une mission (noms des champs .waypoints) et leur typecode array
+_INT_COLUMNS = (("current", "B"), ("frame", "B"), ("command", "H"), ("autoContinue", "B"))
+_FLOAT_COLUMNS = ("param1", "param2", "param3", "param4", "lat", "lon", "alt")
+COLUMNS = tuple(n for n, _ in _INT_COLUMNS) + _FLOAT_COLUMNS
+_INT_DEFAULTS = {"current": 0, "frame": 0, "command": 16, "autoContinue": 1}
+_INT_MAX = {"B": 0xFF, "H": 0xFFFF}
+FIELDS = ("seq",) + COLUMNS
+
+# DO_JUMP : param1 = seq cible, à renuméroter quand les items bougent
+_MAV_CMD_DO_JUMP = 177
+
+# Une ligne .waypoints (mêmes précisions que les fichiers produits jusqu'ici)
+_LINE_FMT = "%d\t%d\t%d\t%d\t%.8f\t%.8f\t%.8f\t%.8f\t%.8f\t%.8f\t%.6f\t%d\n"
+
+# Sidecar binaire : magic, ordre des octets, nb d'items, mtime_ns et taille du .waypoints source
+_SIDECAR_MAGIC = b"WPB1"
+_SIDECAR_HEADER = struct.Struct("<4scxxxIqq")
+
+# Missions chargées, par chemin : (mtime_ns, taille, Mission)
+_LOAD_CACHE: "OrderedDict[str, tuple]" = OrderedDict()
+_LOAD_CACHE_SIZE = 32
+_LOAD_CACHE_LOCK = threading.Lock()
+
+# ─────────────────────────────────────────────
+# Item : vue sur une ligne de la mission
+# ─────────────────────────────────────────────
+class MissionItem:
+    """Vue (sans copie) sur l'item 'seq' d'une Mission ; les attributs lisent/écrivent les colonnes."""
+    __slots__ = ("_mission", "seq")
+
+    def __init__(self, mission: "Mission", seq: int) -> None:
+        self._mission = mission
+        self.seq = seq
+
+    def to_dict(self) -> Dict[str, Any]:
+        m, i = self._mission, self.seq
+        return {"seq": i, **{name: getattr(m, name)[i] for name in COLUMNS}}
+
+    def __repr__(self) -> str:
+        return f"MissionItem({self.to_dict()})"
+
+
+def _column_property(name: str) -> property:
+    def _get(self):
+        return getattr(self._mission, name)[self.seq]
+
+    def _set(self, value) -> None:
+        getattr(self._mission, name)[self.seq] = value
+        self._mission._touch()
+
+    return property(_get, _set)
+
+
+for _name in COLUMNS:
+    setattr(MissionItem, _name, _column_property(_name))
+
+# ─────────────────────────────────────────────
+# Mission : colonnes array, un seul parseur / sérialiseur
+# ─────────────────────────────────────────────
+class Mission:
+    """
+    Mission en colonnes (array) : current, frame, command, autoContinue,
+    param1..4, lat, lon, alt. Le seq d'un item est son index.
+    - parse/dumps : format QGC WPL 110 (.waypoints)
+    - load/save : fichier .waypoints + sidecar binaire, cache par mtime
+    - int_fields / encode_int : champs MISSION_ITEM_INT mis en cache par cible
+    Une Mission renvoyée par load() est partagée : copy() avant de la modifier.
+    """
+    __slots__ = COLUMNS + ("_encoded", "_digest")
+
+    def __init__(self) -> None:
+        for name, code in _INT_COLUMNS:
+            setattr(self, name, array(code))
+        for name in _FLOAT_COLUMNS:
+            setattr(self, name, array("d"))
+        self._touch()
+
+    def _touch(self) -> None:
+        """Invalide les formes dérivées (champs encodés, empreinte) après modification."""
+        self._encoded: Dict[tuple, list] = {}
+        self._digest: Optional[str] = None
+
+    # ── Construction ──
+    @classmethod
+    def from_dicts(cls, items: Iterable[Dict[str, Any]]) -> "Mission":
+        """Depuis des dicts au format .waypoints (les champs absents valent 0, autoContinue 1)."""
+        m = cls()
+        for it in items:
+            m.append(it)
+        return m
+
+    @classmethod
+    def from_messages(cls, msgs: Iterable[Any]) -> "Mission":
+        """Depuis des MISSION_ITEM_INT / MISSION_ITEM, dans l'ordre des seq."""
+        m = cls()
+        for msg in msgs:
+            scale = 1e-7 if msg.get_type() == "MISSION_ITEM_INT" else 1.0
+            m.current.append(int(msg.current))
+            m.frame.append(int(msg.frame))
+            m.command.append(int(msg.command))
+            m.autoContinue.append(int(msg.autocontinue))
+            m.param1.append(msg.param1)
+            m.param2.append(msg.param2)
+            m.param3.append(msg.param3)
+            m.param4.append(msg.param4)
+            m.lat.append(msg.x * scale)
+            m.lon.append(msg.y * scale)
+            m.alt.append(msg.z)
+        return m
+
+    @classmethod
+    def parse(cls, text: str) -> "Mission":
+        """Parse un texte .waypoints ; les lignes qui n'ont pas 12 champs sont ignorées."""
+        lines = text.splitlines()
+        if not lines or not lines[0].startswith(WPL_HEADER):
+            raise RuntimeError("Format .waypoints invalide (header manquant).")
+        body = lines[1:]
+        if all(line.count("\t") == 11 for line in body):
+            # Cas courant : un seul split sur tout le texte, colonnes par pas de 12
+            flat = "\t".join(body).split("\t")
+            cols = [flat[k::12] for k in range(12)]
+        else:
+            rows = [parts for parts in (line.strip().split("\t") for line in body) if len(parts) == 12]
+            cols = list(zip(*rows)) if rows else [()] * 12
+        m = cls()
+        try:
+            for k, (name, code) in enumerate(_INT_COLUMNS):
+                # current, frame, command (colonnes 1..3) ; autoContinue (colonne 11)
+                setattr(m, name, _column(code, cols[11 if name == "autoContinue" else k + 1], int))
+            for k, name in enumerate(_FLOAT_COLUMNS, start=4):
+                setattr(m, name, _column("d", cols[k], float))
+        except (ValueError, OverflowError) as e:
+            raise RuntimeError(f"Format .waypoints invalide ({e}).") from e
+        return m
+
+    @classmethod
+    def load(cls, path: str, sidecar: bool = True) -> "Mission":
+        """
+        Charge un .waypoints : cache mémoire si le fichier n'a pas changé
+        (mtime + taille), sinon sidecar binaire à jour, sinon parse du texte.
+        Lecture seule : le sidecar n'est écrit que par save() / write_sidecar().
+        """
+        path = os.path.abspath(path)
+        st = os.stat(path)
+        with _LOAD_CACHE_LOCK:
+            hit = _LOAD_CACHE.get(path)
+            if hit is not None and hit[0] == st.st_mtime_ns and hit[1] == st.st_size:
+                _LOAD_CACHE.move_to_end(path)
+                return hit[2]
+
+        m = cls._read_sidecar(path, st) if sidecar else None
+        if m is None:
+            with open(path, "r") as f:
+                m = cls.parse(f.read())
+        _remember(path, st, m)
+        return m
+
+    # ── Sérialisation ──
+    def dumps(self) -> str:
+        cols = [getattr(self, name) for name in COLUMNS]
+        return WPL_HEADER + "\n" + "".join(
+            _LINE_FMT % (i, cur, fr, cmd, p1, p2, p3, p4, lat, lon, alt, ac)
+            for i, (cur, fr, cmd, ac, p1, p2, p3, p4, lat, lon, alt) in enumerate(zip(*cols))
+        )
+
+    def save(self, path: str, sidecar: bool = True) -> str:
+        """
+        Écrit le .waypoints (et son sidecar) ; la mission devient l'entrée du cache pour ce chemin.
+        Écriture dans un fichier temporaire puis renommage atomique : un lecteur
+        concurrent voit l'ancien plan ou le nouveau, jamais un fichier partiel.
+        """
+        path = os.path.abspath(path)
+        with _atomic_open(path, "w") as f:
+            f.write(self.dumps())
+        st = os.stat(path)
+        if sidecar:
+            self._write_sidecar(path, st)
+        _remember(path, st, self.copy())  # l'appelant peut continuer à modifier self
+        return path
+
+    def write_sidecar(self, path: str) -> None:
+        """Sidecar binaire de 'path', dont cette mission est le contenu (fichier écrit hors de save())."""
+        self._write_sidecar(os.path.abspath(path), os.stat(path))
+
+    @staticmethod
+    def sidecar_path(path: str) -> str:
+        d, name = os.path.split(path)
+        return os.path.join(d, f".{name}.wpb")
+
+    @classmethod
+    def _read_sidecar(cls, path: str, st) -> Optional["Mission"]:
+        try:
+            with open(cls.sidecar_path(path), "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        if len(data) < _SIDECAR_HEADER.size:
+            return None
+        magic, order, n, mtime_ns, size = _SIDECAR_HEADER.unpack_from(data)
+        if (magic != _SIDECAR_MAGIC or order != sys.byteorder[0].encode()
+                or mtime_ns != st.st_mtime_ns or size != st.st_size):
+            return None
+        m = cls()
+        off = _SIDECAR_HEADER.size
+        for name in COLUMNS:
+            col = getattr(m, name)
+            nbytes = n * col.itemsize
+            if off + nbytes > len(data):
+                return None
+            col.frombytes(data[off:off + nbytes])
+            off += nbytes
+        return m
+
+    def _write_sidecar(self, path: str, st) -> None:
+        header = _SIDECAR_HEADER.pack(_SIDECAR_MAGIC, sys.byteorder[0].encode(), len(self), st.st_mtime_ns, st.st_size)
+        try:
+            with _atomic_open(self.sidecar_path(path), "wb") as f:
+                f.write(header)
+                for name in COLUMNS:
+                    getattr(self, name).tofile(f)
+        except OSError:
+            pass  # cache uniquement : dossier en lecture seule, etc.
+
+    # ── Accès ──
+    def __len__(self) -> int:
+        return len(self.command)
+
+    def __getitem__(self, seq: int) -> MissionItem:
+        if seq < 0:
+            seq += len(self)
+        if not 0 <= seq < len(self):
+            raise IndexError(seq)
+        return MissionItem(self, seq)
+
+    def __iter__(self) -> Iterator[MissionItem]:
+        return (MissionItem(self, i) for i in range(len(self)))
+
+    def to_dicts(self) -> List[Dict[str, Any]]:
+        cols = [getattr(self, name) for name in COLUMNS]
+        return [dict(zip(FIELDS, (i,) + row)) for i, row in enumerate(zip(*cols))]
+
+    def copy(self) -> "Mission":
+        m = Mission()
+        for name in COLUMNS:
+            setattr(m, name, array(getattr(self, name).typecode, getattr(self, name)))
+        return m
+
+    def take(self, seqs: Iterable[int]) -> "Mission":
+        """Nouvelle Mission composée des items 'seqs', dans cet ordre (renumérotés 0..n-1)."""
+        seqs = list(seqs)
+        m = Mission()
+        for name in COLUMNS:
+            col = getattr(self, name)
+            setattr(m, name, array(col.typecode, [col[i] for i in seqs]))
+        return m
+
+    # ── Modification ──
+    def append(self, item: Dict[str, Any]) -> None:
+        """Ajoute un item ; ValueError si un champ entier sort de sa colonne (rien n'est ajouté)."""
+        ints = [_int_value(name, code, item.get(name, _INT_DEFAULTS[name])) for name, code in _INT_COLUMNS]
+        floats = [float(item.get(name, 0.0)) for name in _FLOAT_COLUMNS]
+        for (name, _), v in zip(_INT_COLUMNS, ints):
+            getattr(self, name).append(v)
+        for name, v in zip(_FLOAT_COLUMNS, floats):
+            getattr(self, name).append(v)
+        self._touch()
+
+    def update(self, seq: int, fields: Dict[str, Any]) -> None:
+        """
+        Met à jour les champs connus de l'item 'seq' (les autres clés sont
+        ignorées). IndexError si 'seq' n'existe pas, ValueError si une valeur
+        est invalide (l'item n'est alors pas modifié).
+        """
+        if not 0 <= seq < len(self):
+            raise IndexError(seq)
+        values = {name: _int_value(name, code, fields[name]) for name, code in _INT_COLUMNS if name in fields}
+        values.update((name, float(fields[name])) for name in _FLOAT_COLUMNS if name in fields)
+        for name, v in values.items():
+            getattr(self, name)[seq] = v
+        self._touch()
+
+    def edit(
+        self,
+        updates: Iterable[Dict[str, Any]] = (),
+        delete: Iterable[int] = (),
+        insert: Iterable[Dict[str, Any]] = (),
+        order: Optional[Iterable[int]] = None,
+    ) -> "Mission":
+        """
+        Applique un lot de modifications en une passe et retourne une nouvelle
+        Mission renumérotée. Tous les seq désignent la numérotation d'origine :
+          - updates : [{"seq", "fields": {...}}, ...]
+          - delete  : [seq, ...]
+          - insert  : [{"before": seq | None (fin), "items": [{...}, ...]}, ...]
+          - order   : permutation de tous les seq (nouvel ordre des items)
+        Les cibles de DO_JUMP (param1) suivent leur item ; une cible supprimée
+        lève ValueError.
+        """
+        n = len(self)
+        base = list(range(n)) if order is None else [int(s) for s in order]
+        if order is not None and sorted(base) != list(range(n)):
+            raise ValueError("'order' doit être une permutation de tous les seq de la mission.")
+        removed = set()
+        for seq in delete:
+            if not 0 <= int(seq) < n:
+                raise IndexError(seq)
+            removed.add(int(seq))
+        before: Dict[Optional[int], List[Dict[str, Any]]] = {}
+        for block in insert:
+            anchor = block.get("before")
+            if anchor is not None and not 0 <= int(anchor) < n:
+                raise IndexError(anchor)
+            before.setdefault(None if anchor is None else int(anchor), []).extend(block.get("items", ()))
+
+        # Nouvelle séquence : ('item d'origine', seq) ou (None, dict inséré)
+        rows: List[tuple] = []
+        for seq in base:
+            rows.extend((None, it) for it in before.get(seq, ()))
+            if seq not in removed:
+                rows.append((seq, None))
+        rows.extend((None, it) for it in before.get(None, ()))
+        new_seq = {seq: i for i, (seq, _) in enumerate(rows) if seq is not None}
+
+        src = self.copy()
+        for u in updates:
+            src.update(int(u["seq"]), u.get("fields", {}))
+        out = Mission()
+        for seq, item in rows:
+            if seq is None:
+                out.append(item)
+                continue
+            for name in COLUMNS:
+                getattr(out, name).append(getattr(src, name)[seq])
+            if src.command[seq] == _MAV_CMD_DO_JUMP:
+                target = int(src.param1[seq])
+                if 0 <= target < n:
+                    if target not in new_seq:
+                        raise ValueError(f"DO_JUMP (seq {seq}) vers l'item supprimé {target}.")
+                    out.param1[-1] = float(new_seq[target])
+        out._touch()
+        return out
+
+    # ── Comparaison / encodage MAVLink ──
+    def keys(self) -> List[tuple]:
+        """Clé de comparaison de chaque item (précision du transport MAVLink, 'current' ignoré)."""
+        return [
+            (fr, cmd, ac, round(p1, 4), round(p2, 4), round(p3, 4), round(p4, 4),
+             int(round(lat * 1e7)), int(round(lon * 1e7)), round(alt, 3))
+            for fr, cmd, ac, p1, p2, p3, p4, lat, lon, alt in zip(
+                self.frame, self.command, self.autoContinue,
+                self.param1, self.param2, self.param3, self.param4,
+                self.lat, self.lon, self.alt,
+            )
+        ]
+
+    def digest(self) -> str:
+        """Empreinte du contenu (mêmes règles que keys())."""
+        if self._digest is None:
+            self._digest = hashlib.sha1(repr(self.keys()).encode()).hexdigest()[:16]
+        return self._digest
+
+    def int_fields(self, target_system: int, target_component: int) -> List[tuple]:
+        """Arguments de tous les MISSION_ITEM_INT (lat/lon en degE7), calculés une fois par cible."""
+        key = (target_system, target_component)
+        out = self._encoded.get(key)
+        if out is None:
+            out = [
+                (target_system, target_component, i, fr, cmd, cur, ac, p1, p2, p3, p4,
+                 int(round(lat * 1e7)), int(round(lon * 1e7)), alt)
+                for i, (cur, fr, cmd, ac, p1, p2, p3, p4, lat, lon, alt) in enumerate(zip(
+                    self.current, self.frame, self.command, self.autoContinue,
+                    self.param1, self.param2, self.param3, self.param4,
+                    self.lat, self.lon, self.alt,
+                ))
+            ]
+            self._encoded[key] = out
+        return out
+
+    def encode_int(self, mav, target_system: int, target_component: int, seq: int):
+        """
+        MISSION_ITEM_INT de l'item 'seq', depuis int_fields(). Message neuf à
+        chaque appel : pymavlink réécrit l'en-tête et le buffer du message à
+        l'envoi, un objet partagé entre deux liens (Mission de load() envoyée
+        à plusieurs drones 1/1) pourrait partir corrompu.
+        """
+        return mav.mission_item_int_encode(*self.int_fields(target_system, target_component)[seq])
+
+    def encode_float(self, mav, target_system: int, target_component: int, seq: int):
+        """MISSION_ITEM (float) de l'item 'seq', pour les autopilotes sans protocole INT."""
+        return mav.mission_item_encode(
+            target_system, target_component, seq,
+            self.frame[seq], self.command[seq], self.current[seq], self.autoContinue[seq],
+            self.param1[seq], self.param2[seq], self.param3[seq], self.param4[seq],
+            self.lat[seq], self.lon[seq], self.alt[seq],
+        )
+
+
+# Valeurs par défaut des colonnes non fournies à write_waypoints
+_STREAM_DEFAULTS = {"current": 0, "frame": 3, "command": 16, "autoContinue": 1,
+                    "param1": 0.0, "param2": 0.0, "param3": 0.0, "param4": 0.0}
+
+
+def write_waypoints(path: str, chunks: Iterable[Dict[str, Any]]) -> int:
+    """
+    Écrit un .waypoints bloc par bloc, sans construire la mission en mémoire.
+    Chaque bloc : "lat", "lon", "alt" (séquences de même longueur, listes ou
+    ndarray) et, en option, les autres colonnes (scalaire ou séquence ;
+    défaut : WAYPOINT relatif, params à 0). Les seq sont numérotés à la suite.
+    Retourne le nombre d'items écrits.
+    """
+    seq = 0
+    with _atomic_open(path, "w") as f:
+        f.write(WPL_HEADER + "\n")
+        for chunk in chunks:
+            n = len(chunk["lat"])
+            if n == 0:
+                continue
+            cols = []
+            for name in ("current", "frame", "command") + _FLOAT_COLUMNS + ("autoContinue",):
+                col = chunk.get(name, _STREAM_DEFAULTS.get(name))
+                if hasattr(col, "tolist"):
+                    col = col.tolist()
+                cols.append(list(col) if isinstance(col, (list, tuple)) else [col] * n)
+            f.write("".join(_LINE_FMT % row for row in zip(range(seq, seq + n), *cols)))
+            seq += n
+    return seq
+
+
+@contextmanager
+def _atomic_open(path: str, mode: str):
+    """Fichier temporaire caché du même dossier, renommé sur 'path' si l'écriture aboutit."""
+    d, name = os.path.split(os.path.abspath(path))
+    tmp = os.path.join(d, f".{name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        with open(tmp, mode) as f:
+            yield f
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def _int_value(name: str, code: str, value) -> int:
+    """Entier d'une colonne 'code' (B : 0..255, H : 0..65535) ; ValueError hors limites."""
+    v = int(value)
+    if not 0 <= v <= _INT_MAX[code]:
+        raise ValueError(f"'{name}' hors limites (0..{_INT_MAX[code]}) : {v}")
+    return v
+
+
+def _column(code: str, texts, conv) -> array:
+    """Colonne texte → array ; les colonnes très répétitives (frame, command, params…) sont converties par valeur distincte."""
+    distinct = set(texts)
+    if len(distinct) * 4 <= len(texts):
+        values = {t: conv(t) for t in distinct}
+        return array(code, map(values.__getitem__, texts))
+    return array(code, map(conv, texts))
+
+
+def _remember(path: str, st, mission: Mission) -> None:
+    with _LOAD_CACHE_LOCK:
+        _LOAD_CACHE[path] = (st.st_mtime_ns, st.st_size, mission)
+        _LOAD_CACHE.move_to_end(path)
+        while len(_LOAD_CACHE) > _LOAD_CACHE_SIZE:
+            _LOAD_CACHE.popitem(last=False)
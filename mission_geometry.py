@@ -0,0 +1,361 @@
+import numpy as np
+from typing import Any, Dict, Iterable, List, Optional
+
+from mission import Mission
+
+EARTH_RADIUS_M = 6371008.8
+
+# Commandes MAVLink utiles à la géométrie
+MAV_CMD_NAV_WAYPOINT = 16
+MAV_CMD_NAV_LOITER_TIME = 19
+MAV_CMD_NAV_LAND = 21
+MAV_CMD_NAV_TAKEOFF = 22
+MAV_CMD_DO_CHANGE_SPEED = 178
+
+# Commandes NAV porteuses d'une position (les DO_* / CONDITION_* n'en ont pas)
+NAV_POSITION_COMMANDS = (16, 17, 18, 19, 21, 22, 31, 82)
+
+# ─────────────────────────────────────────────
+# Primitives vectorisées
+# ─────────────────────────────────────────────
+def haversine_m(lat1, lon1, lat2, lon2) -> np.ndarray:
+    """Distance grand cercle (m) entre deux séries de points en degrés."""
+    lat1, lon1, lat2, lon2 = (np.radians(a) for a in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) * 0.5) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) * 0.5) ** 2
+    return 2.0 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def points_in_polygon(lat: np.ndarray, lon: np.ndarray, polygon: Iterable[Iterable[float]]) -> np.ndarray:
+    """Test pair-impair (ray casting) de chaque point contre un polygone [[lat, lon], ...]."""
+    poly = np.asarray(list(polygon), dtype=np.float64)
+    inside = np.zeros(lat.shape, dtype=bool)
+    if len(poly) < 3:
+        return inside
+    y0, x0 = poly[:, 0], poly[:, 1]
+    y1, x1 = np.roll(y0, -1), np.roll(x0, -1)
+    # Une arête à la fois : mémoire O(n) même pour des polygones détaillés
+    for ya, xa, yb, xb in zip(y0, x0, y1, x1):
+        if ya == yb:
+            continue
+        crosses = (ya > lat) != (yb > lat)
+        x_cross = xa + (lat - ya) * (xb - xa) / (yb - ya)
+        inside ^= crosses & (lon < x_cross)
+    return inside
+
+# ─────────────────────────────────────────────
+# Analyse d'une mission
+# ─────────────────────────────────────────────
+def mission_columns(mission: Mission) -> Dict[str, np.ndarray]:
+    """Vues NumPy (sans copie) sur les colonnes d'une Mission."""
+    return {
+        "command": np.frombuffer(mission.command, dtype=np.uint16),
+        "param1": np.frombuffer(mission.param1, dtype=np.float64),
+        "param2": np.frombuffer(mission.param2, dtype=np.float64),
+        "lat": np.frombuffer(mission.lat, dtype=np.float64),
+        "lon": np.frombuffer(mission.lon, dtype=np.float64),
+        "alt": np.frombuffer(mission.alt, dtype=np.float64),
+    }
+
+
+def analyze_mission(
+    mission: Mission,
+    *,
+    speed_m_s: float = 10.0,
+    vertical_speed_m_s: float = 2.5,
+    geofence: Optional[Dict[str, Any]] = None,
+    include_legs: bool = False,
+    max_violations: int = 100,
+) -> Dict[str, Any]:
+    """
+    Mesure et valide une mission en une passe vectorisée :
+      - segments entre items NAV positionnés (haversine + dénivelé)
+      - longueur totale, durée estimée : vitesse par défaut 'speed_m_s',
+        remplacée par les DO_CHANGE_SPEED rencontrés ; montée/descente à
+        'vertical_speed_m_s' en parallèle du déplacement ; temps d'attente
+        (param1 des WAYPOINT et LOITER_TIME)
+      - bornes d'altitude (altitude telle qu'écrite, donc relative en frame 3)
+      - violations : coordonnées invalides, et si 'geofence' est fourni
+        {"polygon": [[lat, lon], ...], "radius_m", "max_alt_m", "min_alt_m"}
+        (rayon mesuré depuis l'item 0 ; LAND, TAKEOFF et item 0 exclus du min)
+    """
+    c = mission_columns(mission)
+    cmd, lat, lon, alt = c["command"], c["lat"], c["lon"], c["alt"]
+    n = len(cmd)
+
+    is_nav = np.isin(cmd, NAV_POSITION_COMMANDS)
+    positioned = is_nav & ~((lat == 0.0) & (lon == 0.0))
+    seqs = np.flatnonzero(positioned)
+    plat, plon, palt = lat[seqs], lon[seqs], alt[seqs]
+
+    # Segments
+    horiz = haversine_m(plat[:-1], plon[:-1], plat[1:], plon[1:])
+    climb = np.diff(palt)
+    dist3d = np.hypot(horiz, climb)
+
+    # Vitesse en vigueur à l'arrivée de chaque segment (dernier DO_CHANGE_SPEED avant l'item d'arrivée)
+    speed_set = (cmd == MAV_CMD_DO_CHANGE_SPEED) & (c["param2"] > 0)
+    last_set = np.maximum.accumulate(np.where(speed_set, np.arange(n), -1)) if n else np.empty(0, dtype=np.int64)
+    leg_end = seqs[1:]
+    idx = last_set[leg_end] if len(leg_end) else np.empty(0, dtype=np.int64)
+    speeds = np.where(idx >= 0, c["param2"][np.maximum(idx, 0)], speed_m_s)
+    leg_time = np.maximum(horiz / speeds, np.abs(climb) / vertical_speed_m_s)
+
+    hold = (cmd == MAV_CMD_NAV_WAYPOINT) | (cmd == MAV_CMD_NAV_LOITER_TIME)
+    hold_time = float(np.clip(c["param1"][hold & positioned], 0.0, None).sum())
+
+    out: Dict[str, Any] = {
+        "count": n,
+        "positioned_count": int(len(seqs)),
+        "legs_count": int(len(horiz)),
+        "total_distance_m": round(float(horiz.sum()), 2),
+        "total_distance_3d_m": round(float(dist3d.sum()), 2),
+        "longest_leg_m": round(float(horiz.max()), 2) if len(horiz) else 0.0,
+        "estimated_time_s": round(float(leg_time.sum()) + hold_time, 1),
+        "alt_min": float(palt.min()) if len(palt) else None,
+        "alt_max": float(palt.max()) if len(palt) else None,
+        "bbox": ([float(plat.min()), float(plon.min()), float(plat.max()), float(plon.max())]
+                 if len(seqs) else None),
+    }
+
+    # Violations, par type : masque sur les items positionnés
+    checks = {"invalid_position": (np.abs(plat) > 90.0) | (np.abs(plon) > 180.0)}
+    fence = geofence or {}
+    if fence.get("polygon"):
+        checks["outside_polygon"] = ~points_in_polygon(plat, plon, fence["polygon"])
+    if fence.get("radius_m") is not None and n:
+        d_home = haversine_m(lat[0], lon[0], plat, plon)
+        checks["outside_radius"] = d_home > float(fence["radius_m"])
+    if fence.get("max_alt_m") is not None:
+        checks["above_max_alt"] = palt > float(fence["max_alt_m"])
+    if fence.get("min_alt_m") is not None:
+        pcmd = cmd[seqs]
+        exempt = (pcmd == MAV_CMD_NAV_LAND) | (pcmd == MAV_CMD_NAV_TAKEOFF) | (seqs == 0)
+        checks["below_min_alt"] = (palt < float(fence["min_alt_m"])) & ~exempt
+
+    violations: List[Dict[str, Any]] = []
+    total = 0
+    for kind, mask in checks.items():
+        bad = seqs[mask]
+        total += len(bad)
+        for seq in bad[:max(0, max_violations - len(violations))]:
+            violations.append({"seq": int(seq), "type": kind})
+    out["violations_count"] = total
+    out["violations"] = violations
+
+    if include_legs:
+        out["legs"] = {
+            "from_seq": seqs[:-1].tolist(),
+            "to_seq": seqs[1:].tolist(),
+            "distance_m": np.round(horiz, 2).tolist(),
+            "climb_m": np.round(climb, 2).tolist(),
+            "speed_m_s": speeds.tolist(),
+            "time_s": np.round(leg_time, 2).tolist(),
+        }
+    return out
+
+
+def check_mission(mission: Mission, geofence: Optional[Dict[str, Any]] = None, max_violations: int = 100) -> List[Dict[str, Any]]:
+    """Contrôle avant upload : liste des violations (vide si la mission est acceptable)."""
+    return analyze_mission(mission, geofence=geofence, max_violations=max_violations)["violations"]
+
+# ─────────────────────────────────────────────
+# Génération de grilles de relevé (boustrophédon)
+# ─────────────────────────────────────────────
+def _local_frame(polygon: np.ndarray):
+    """Projection équirectangulaire locale (m) centrée sur le polygone : (lat0, lon0, kx, ky)."""
+    lat0, lon0 = polygon.mean(axis=0)
+    ky = EARTH_RADIUS_M * np.pi / 180.0
+    return lat0, lon0, ky * np.cos(np.radians(lat0)), ky
+
+
+def _best_heading(x: np.ndarray, y: np.ndarray) -> float:
+    """Cap (°) parallèle à l'arête qui minimise la largeur transverse du polygone : le moins de lignes/virages."""
+    dx, dy = np.roll(x, -1) - x, np.roll(y, -1) - y
+    headings = np.degrees(np.arctan2(dx, dy)) % 180.0
+    h = np.radians(headings)[:, None]
+    v = x[None, :] * np.cos(h) - y[None, :] * np.sin(h)
+    return float(headings[np.argmin(v.max(axis=1) - v.min(axis=1))])
+
+
+def _grid_uv(u0, v0, u1, v1, spacing_m: float, point_spacing_m: Optional[float], flip: bool):
+    """Points (u, v) du boustrophédon dans le repère tourné (lignes à v constant)."""
+    vmin, vmax = min(v0.min(), v1.min()), max(v0.max(), v1.max())
+    lines = np.arange(vmin + spacing_m / 2.0, vmax, spacing_m)
+    if len(lines) == 0:
+        lines = np.array([(vmin + vmax) / 2.0])
+
+    # Intersections lignes × arêtes (demi-ouvertes : un sommet n'est compté qu'une fois)
+    L = lines[:, None]
+    crosses = (v0 <= L) != (v1 <= L)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        u = u0 + (L - v0) * (u1 - u0) / (v1 - v0)
+    u = np.sort(np.where(crosses, u, np.nan), axis=1)
+    n_cross = crosses.sum(axis=1)
+    u = u[:, :max(int(n_cross.max()), 2) // 2 * 2]
+
+    # Segments : paires (entrée, sortie) de chaque ligne, sens alterné une ligne sur deux
+    a, b = u[:, 0::2], u[:, 1::2]
+    odd = (np.arange(len(lines)) % 2 == 1) ^ flip
+    a, b = np.where(odd[:, None], b[:, ::-1], a), np.where(odd[:, None], a[:, ::-1], b)
+    seg_v = np.broadcast_to(L, a.shape)
+    ok = ~np.isnan(a) & ~np.isnan(b)
+    a, b, seg_v = a[ok], b[ok], seg_v[ok]
+
+    # Points le long de chaque segment (extrémités incluses)
+    if point_spacing_m:
+        steps = np.maximum(np.ceil(np.abs(b - a) / point_spacing_m).astype(np.int64), 1)
+    else:
+        steps = np.ones(len(a), dtype=np.int64)
+    counts = steps + 1
+    seg = np.repeat(np.arange(len(a)), counts)
+    k = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    frac = k / steps[seg]
+    return a[seg] + (b[seg] - a[seg]) * frac, seg_v[seg]
+
+
+def survey_grid(
+    polygon: Iterable[Iterable[float]],
+    spacing_m: float,
+    heading_deg: Optional[float] = None,
+    point_spacing_m: Optional[float] = None,
+    start: Optional[Iterable[float]] = None,
+):
+    """
+    Grille de relevé en boustrophédon sur un polygone [[lat, lon], ...] :
+      - lignes espacées de 'spacing_m', orientées au cap 'heading_deg'
+        (None : cap qui minimise le nombre de lignes)
+      - points tous les 'point_spacing_m' le long des lignes (None : extrémités seules)
+      - 'start' [lat, lon] : la grille commence par le coin le plus proche
+    Calcul entièrement vectorisé ; retourne (lat, lon, cap utilisé) en ndarray.
+    """
+    poly = np.asarray(list(polygon), dtype=np.float64)
+    if len(poly) < 3:
+        raise ValueError("Le polygone doit avoir au moins 3 sommets.")
+    if spacing_m <= 0 or (point_spacing_m is not None and point_spacing_m <= 0):
+        raise ValueError("Espacements invalides (doivent être > 0).")
+
+    lat0, lon0, kx, ky = _local_frame(poly)
+    x, y = (poly[:, 1] - lon0) * kx, (poly[:, 0] - lat0) * ky
+    if heading_deg is None:
+        heading_deg = _best_heading(x, y)
+    h = np.radians(heading_deg)
+    s, c = np.sin(h), np.cos(h)
+    u0, v0 = x * s + y * c, x * c - y * s
+    u1, v1 = np.roll(u0, -1), np.roll(v0, -1)
+
+    best = None
+    for flip in (False, True):
+        u, v = _grid_uv(u0, v0, u1, v1, spacing_m, point_spacing_m, flip)
+        if start is None:
+            best = (u, v)
+            break
+        # Départ le plus proche : début ou fin (parcours inversé) de chaque variante
+        sx = (float(list(start)[1]) - lon0) * kx
+        sy = (float(list(start)[0]) - lat0) * ky
+        su, sv = sx * s + sy * c, sx * c - sy * s
+        for uu, vv in ((u, v), (u[::-1], v[::-1])):
+            d = (uu[0] - su) ** 2 + (vv[0] - sv) ** 2
+            if best is None or d < best[2]:
+                best = (uu, vv, d)
+
+    u, v = best[0], best[1]
+    gx, gy = u * s + v * c, u * c - v * s
+    return lat0 + gy / ky, lon0 + gx / kx, float(heading_deg)
+
+# ─────────────────────────────────────────────
+# Simplification de trajectoire (Ramer–Douglas–Peucker)
+# ─────────────────────────────────────────────
+MAV_CMD_DO_JUMP = 177
+
+
+def _rdp_mask(p: np.ndarray, tolerance: float) -> np.ndarray:
+    """RDP itératif sur des points (n, 3) en mètres : masque des points gardés (extrémités incluses)."""
+    n = len(p)
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        i, j = stack.pop()
+        if j - i < 2:
+            continue
+        a, d = p[i], p[j] - p[i]
+        rel = p[i + 1:j] - a
+        l2 = float(d @ d)
+        # Distance au segment [a, b] (pas à la droite : les allers-retours sont conservés)
+        t = np.clip(rel @ d / l2, 0.0, 1.0) if l2 > 0.0 else np.zeros(len(rel))
+        dist = np.linalg.norm(rel - t[:, None] * d, axis=1)
+        k = int(np.argmax(dist))
+        if dist[k] > tolerance:
+            k += i + 1
+            keep[k] = True
+            stack.append((i, k))
+            stack.append((k, j))
+    return keep
+
+
+def simplify_mission(
+    mission: Mission,
+    tolerance_m: float,
+    alt_tolerance_m: Optional[float] = None,
+):
+    """
+    Réduit le nombre d'items d'une mission dense (Ramer–Douglas–Peucker 3D).
+    Seules les suites de WAYPOINT « simples » (params à 0, même frame) sont
+    simplifiées ; leurs extrémités, l'item 0, toute autre commande et les
+    cibles de DO_JUMP sont conservés (DO_JUMP renumérotés).
+    L'altitude compte dans l'écart : 'alt_tolerance_m' (défaut : 'tolerance_m')
+    est l'écart vertical toléré.
+    Retourne (mission simplifiée, statistiques).
+    """
+    if tolerance_m <= 0:
+        raise ValueError("simplify_tolerance_m doit être > 0.")
+    alt_tolerance_m = float(alt_tolerance_m or tolerance_m)
+    c = mission_columns(mission)
+    cmd, lat, lon, alt = c["command"], c["lat"], c["lon"], c["alt"]
+    frame = np.frombuffer(mission.frame, dtype=np.uint8)
+    n = len(cmd)
+
+    params = np.stack([c["param1"], c["param2"], np.frombuffer(mission.param3, dtype=np.float64),
+                       np.frombuffer(mission.param4, dtype=np.float64)]) if n else np.zeros((4, 0))
+    plain = (cmd == MAV_CMD_NAV_WAYPOINT) & ~(params != 0.0).any(axis=0) & ~((lat == 0.0) & (lon == 0.0))
+    if n:
+        plain[0] = False
+    jumps = np.flatnonzero(cmd == MAV_CMD_DO_JUMP)
+    targets = c["param1"][jumps].astype(np.int64)
+    plain[targets[(targets >= 0) & (targets < n)]] = False
+
+    # Suites de WAYPOINT simples de même frame, bornes [début, fin[
+    brk = np.ones(n + 1, dtype=bool)
+    if n > 1:
+        brk[1:n] = ~plain[1:] | ~plain[:-1] | (frame[1:] != frame[:-1])
+    edges = np.flatnonzero(brk)
+    keep = ~plain
+    for s, e in zip(edges[:-1], edges[1:]):
+        if not plain[s] or e - s < 3:
+            keep[s:e] = True
+            continue
+        la, lo = lat[s:e], lon[s:e]
+        ky = EARTH_RADIUS_M * np.pi / 180.0
+        kx = ky * np.cos(np.radians(la.mean()))
+        pts = np.column_stack(((lo - lo[0]) * kx, (la - la[0]) * ky,
+                               (alt[s:e] - alt[s]) * (tolerance_m / alt_tolerance_m)))
+        keep[s:e] = _rdp_mask(pts, tolerance_m)
+
+    seqs = np.flatnonzero(keep)
+    out = mission.take(seqs.tolist())
+    if len(jumps):
+        new_index = np.cumsum(keep) - 1
+        for old in jumps:
+            target = int(mission.param1[old])
+            if 0 <= target < n:
+                out.param1[int(new_index[old])] = float(new_index[target])
+        out._touch()
+
+    removed = n - len(seqs)
+    return out, {
+        "original_count": n,
+        "count": int(len(seqs)),
+        "removed": int(removed),
+        "reduction_pct": round(100.0 * removed / n, 1) if n else 0.0,
+        "tolerance_m": float(tolerance_m),
+    }
@@ -0,0 +1,440 @@
+import base64, json, os, sqlite3, threading, time
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from mission import Mission
+from mission_geometry import EARTH_RADIUS_M, NAV_POSITION_COMMANDS, mission_columns
+
+# Base SQLite de l'index, dans le dossier indexé (fichier caché : jamais listé)
+INDEX_FILENAME = ".index.sqlite"
+_SCHEMA_VERSION = 2
+
+# Un fichier modifié sur place ne change pas le mtime de son dossier :
+# tous les fichiers sont re-stat au plus une fois par intervalle
+FULL_SCAN_INTERVAL_S = 60.0
+
+# Trajet découpé en tronçons de CHUNK_LEGS segments, une boîte R-tree par tronçon
+CHUNK_LEGS = 16
+
+# Colonnes de tri exposées → colonne indexée
+_SORT_COLUMNS = {"name": "name_key", "size": "size_bytes", "mtime": "mtime_ns"}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,          -- relatif à la racine, séparateur '/'
+    dir TEXT NOT NULL,              -- dossier relatif ('' = racine)
+    name TEXT NOT NULL,
+    name_key TEXT NOT NULL,         -- nom en minuscules (tri, préfixes exclus)
+    ext TEXT NOT NULL,
+    size_bytes INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    waypoints INTEGER,              -- NULL : pas un .waypoints lisible
+    min_lat REAL, min_lon REAL, max_lat REAL, max_lon REAL
+);
+CREATE INDEX IF NOT EXISTS files_mtime ON files (mtime_ns, path);
+CREATE INDEX IF NOT EXISTS files_size ON files (size_bytes, path);
+CREATE INDEX IF NOT EXISTS files_name ON files (name_key, path);
+CREATE INDEX IF NOT EXISTS files_dir ON files (dir);
+CREATE TABLE IF NOT EXISTS dirs (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL
+);
+-- Tronçons de trajet : points (seq, lat, lon) en float64, boîte dans chunk_boxes
+CREATE TABLE IF NOT EXISTS chunks (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL,
+    points BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS chunks_path ON chunks (path);
+CREATE VIRTUAL TABLE IF NOT EXISTS chunk_boxes USING rtree (id, min_lat, max_lat, min_lon, max_lon);
+"""
+
+# ─────────────────────────────────────────────
+# Métadonnées d'un fichier mission
+# ─────────────────────────────────────────────
+def _load_track(path: str) -> Optional[Tuple[int, np.ndarray]]:
+    """(nombre d'items, points (seq, lat, lon) des items NAV positionnés) ; None si illisible."""
+    try:
+        mission = Mission.load(path)
+    except (OSError, RuntimeError, ValueError, UnicodeDecodeError):
+        return None
+    c = mission_columns(mission)
+    lat, lon = c["lat"], c["lon"]
+    seqs = np.flatnonzero(np.isin(c["command"], NAV_POSITION_COMMANDS) & ~((lat == 0.0) & (lon == 0.0)))
+    return len(mission), np.column_stack((seqs.astype(np.float64), lat[seqs], lon[seqs]))
+
+
+def _bbox(track: np.ndarray) -> Optional[List[float]]:
+    if not len(track):
+        return None
+    return [float(track[:, 1].min()), float(track[:, 2].min()), float(track[:, 1].max()), float(track[:, 2].max())]
+
+
+def mission_metadata(path: str) -> Dict[str, Any]:
+    """Nombre d'items et emprise [min_lat, min_lon, max_lat, max_lon] des items NAV positionnés."""
+    loaded = _load_track(path)
+    if loaded is None:
+        return {"waypoints": None, "bbox": None}
+    return {"waypoints": loaded[0], "bbox": _bbox(loaded[1])}
+
+# ─────────────────────────────────────────────
+# Index persistant d'un dossier de missions
+# ─────────────────────────────────────────────
+class MissionIndex:
+    """
+    Index SQLite des fichiers d'un dossier de missions (récursif) :
+    taille, mtime, nombre de waypoints et emprise, tri et pagination indexés,
+    recherche spatiale (R-tree sur des tronçons de trajet).
+    - refresh() : incrémental, seuls les dossiers dont le mtime a changé sont
+      relus (plus un re-stat complet toutes les FULL_SCAN_INTERVAL_S secondes)
+    - notify(path) : mise à jour immédiate après écriture d'un fichier
+    Les fichiers et dossiers cachés (nom commençant par '.') sont ignorés.
+    """
+
+    def __init__(self, root: str, db_path: Optional[str] = None) -> None:
+        self.root = os.path.abspath(root)
+        os.makedirs(self.root, exist_ok=True)
+        self._lock = threading.RLock()
+        self._last_full = float("-inf")
+        try:
+            self._db = self._open(db_path or os.path.join(self.root, INDEX_FILENAME))
+        except sqlite3.Error:
+            self._db = self._open(":memory:")  # dossier en lecture seule, base corrompue…
+
+    @staticmethod
+    def _open(db_path: str) -> sqlite3.Connection:
+        db = sqlite3.connect(db_path, check_same_thread=False)
+        if db.execute("PRAGMA user_version").fetchone()[0] != _SCHEMA_VERSION:
+            db.executescript("DROP TABLE IF EXISTS files; DROP TABLE IF EXISTS dirs; "
+                             "DROP TABLE IF EXISTS chunks; DROP TABLE IF EXISTS chunk_boxes;")
+            db.execute(f"PRAGMA user_version = {_SCHEMA_VERSION}")
+        if db_path != ":memory:":
+            db.execute("PRAGMA journal_mode = WAL")
+        db.executescript(_SCHEMA)
+        db.commit()
+        return db
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    # ── Mise à jour ──
+    def _rel(self, path: str) -> Optional[str]:
+        path = os.path.abspath(path)
+        if not path.startswith(self.root + os.sep):
+            return None
+        return os.path.relpath(path, self.root).replace(os.sep, "/")
+
+    def _upsert(self, rel: str, st) -> None:
+        d, name = rel.rpartition("/")[0], rel.rpartition("/")[2]
+        ext = os.path.splitext(name)[1].lower()
+        loaded = _load_track(os.path.join(self.root, rel)) if ext == ".waypoints" else None
+        count, track = loaded if loaded is not None else (None, np.empty((0, 3)))
+        bbox = _bbox(track) or [None] * 4
+        self._db.execute(
+            "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (rel, d, name, name.lower(), ext, st.st_size, st.st_mtime, st.st_mtime_ns, count, *bbox),
+        )
+        self._delete_chunks("path = ?", (rel,))
+        # Tronçons qui se chevauchent d'un point : chaque segment est dans une boîte
+        for i in range(0, max(len(track) - 1, 1 if len(track) else 0), CHUNK_LEGS):
+            part = np.ascontiguousarray(track[i:i + CHUNK_LEGS + 1])
+            cur = self._db.execute("INSERT INTO chunks (path, points) VALUES (?, ?)", (rel, part.tobytes()))
+            self._db.execute(
+                "INSERT INTO chunk_boxes VALUES (?, ?, ?, ?, ?)",
+                (cur.lastrowid, part[:, 1].min(), part[:, 1].max(), part[:, 2].min(), part[:, 2].max()),
+            )
+
+    def _delete_chunks(self, where: str, args: tuple) -> None:
+        self._db.execute(f"DELETE FROM chunk_boxes WHERE id IN (SELECT id FROM chunks WHERE {where})", args)
+        self._db.execute(f"DELETE FROM chunks WHERE {where}", args)
+
+    def _delete(self, rel: str) -> None:
+        self._db.execute("DELETE FROM files WHERE path = ?", (rel,))
+        self._delete_chunks("path = ?", (rel,))
+
+    def _delete_dir(self, rel: str) -> None:
+        like = rel + "/%"
+        self._delete_chunks("path IN (SELECT path FROM files WHERE dir = ? OR dir LIKE ?)", (rel, like))
+        self._db.execute("DELETE FROM files WHERE dir = ? OR dir LIKE ?", (rel, like))
+        self._db.execute("DELETE FROM dirs WHERE path = ? OR path LIKE ?", (rel, like))
+
+    def notify(self, path: str) -> None:
+        """Fichier créé, modifié ou supprimé : met l'index à jour sans attendre le prochain refresh()."""
+        rel = self._rel(path)
+        if rel is None or any(part.startswith(".") for part in rel.split("/")):
+            return
+        with self._lock:
+            try:
+                self._upsert(rel, os.stat(os.path.join(self.root, rel)))
+            except FileNotFoundError:
+                self._delete(rel)
+            self._db.commit()
+
+    def _scan_dir(self, rel: str, known: Dict[str, Tuple[int, int]]) -> List[str]:
+        """Relit un dossier : ajoute / met à jour / retire ses fichiers ; retourne ses sous-dossiers."""
+        base = os.path.join(self.root, rel) if rel else self.root
+        seen, subdirs = set(), []
+        with os.scandir(base) as it:
+            for entry in it:
+                if entry.name.startswith("."):
+                    continue
+                child = f"{rel}/{entry.name}" if rel else entry.name
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(child)
+                elif entry.is_file():
+                    st = entry.stat()
+                    seen.add(child)
+                    if known.get(child) != (st.st_mtime_ns, st.st_size):
+                        self._upsert(child, st)
+        for child in known.keys() - seen:
+            self._delete(child)
+        return subdirs
+
+    def refresh(self, full: bool = False) -> None:
+        """Rattrape les changements faits hors de l'API (copie, suppression, édition externe)."""
+        with self._lock:
+            now = time.monotonic()
+            full = full or now - self._last_full >= FULL_SCAN_INTERVAL_S
+            dirs = dict(self._db.execute("SELECT path, mtime_ns FROM dirs"))
+            todo, visited = [""], set()
+            while todo:
+                rel = todo.pop()
+                visited.add(rel)
+                try:
+                    mtime_ns = os.stat(os.path.join(self.root, rel) if rel else self.root).st_mtime_ns
+                except FileNotFoundError:
+                    continue
+                if full or dirs.get(rel) != mtime_ns:
+                    known = {p: (m, s) for p, m, s in self._db.execute(
+                        "SELECT path, mtime_ns, size_bytes FROM files WHERE dir = ?", (rel,))}
+                    subdirs = self._scan_dir(rel, known)
+                    self._db.execute("INSERT OR REPLACE INTO dirs VALUES (?, ?)", (rel, mtime_ns))
+                else:
+                    prefix = rel + "/" if rel else ""
+                    subdirs = [p for p in dirs if p and p.startswith(prefix) and "/" not in p[len(prefix):]]
+                todo.extend(subdirs)
+            for rel in dirs.keys() - visited:
+                self._delete_dir(rel)
+            self._db.commit()
+            if full:
+                self._last_full = now
+
+    # ── Requêtes ──
+    def query(
+        self,
+        *,
+        exts: Iterable[str] = (".waypoints",),
+        recursive: bool = False,
+        sort: str = "mtime",
+        order: str = "desc",
+        limit: Optional[int] = None,
+        exclude_prefixes: Iterable[str] = ("DEFAULT",),
+        cursor: Optional[str] = None,
+        refresh: bool = True,
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        Fichiers triés par 'sort' ('name' | 'size' | 'mtime'), au plus 'limit'.
+        Retourne (fichiers, curseur de la page suivante ou None) ; le curseur
+        se repasse tel quel avec les mêmes filtres.
+        """
+        if refresh:
+            self.refresh()
+        sort = sort.lower() if sort.lower() in _SORT_COLUMNS else "mtime"
+        col = _SORT_COLUMNS[sort]
+        desc = order.lower() == "desc"
+
+        where, args = [], []
+        exts = [e.lower() for e in exts]
+        where.append(f"ext IN ({','.join('?' * len(exts))})")
+        args += exts
+        if not recursive:
+            where.append("dir = ''")
+        for p in exclude_prefixes or ():
+            where.append("substr(name_key, 1, ?) != ?")
+            args += [len(p), p.lower()]
+        if cursor:
+            value, path = _decode_cursor(cursor)
+            where.append(f"({col}, path) {'<' if desc else '>'} (?, ?)")
+            args += [value, path]
+        sql = (f"SELECT path, name, size_bytes, mtime, {col}, waypoints, min_lat, min_lon, max_lat, max_lon "
+               f"FROM files WHERE {' AND '.join(where)} "
+               f"ORDER BY {col} {'DESC' if desc else 'ASC'}, path {'DESC' if desc else 'ASC'}")
+        if limit and limit > 0:
+            sql += f" LIMIT {int(limit) + 1}"
+        with self._lock:
+            rows = self._db.execute(sql, args).fetchall()
+
+        next_cursor = None
+        if limit and limit > 0 and len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = _encode_cursor(rows[-1][4], rows[-1][0])
+        files = [{
+            "name": name,
+            "path": path,
+            "size_bytes": size,
+            "mtime": mtime,
+            "modified_at": datetime.fromtimestamp(mtime).isoformat(timespec="seconds"),
+            "waypoints": waypoints,
+            "bbox": [a, b, c, d] if a is not None else None,
+        } for path, name, size, mtime, _, waypoints, a, b, c, d in rows]
+        return files, next_cursor
+
+    # ── Recherche spatiale ──
+    def _candidates(self, min_lat: float, min_lon: float, max_lat: float, max_lon: float, exts, recursive):
+        """Tronçons dont la boîte R-tree recoupe la zone : [(path, points (k, 3))]."""
+        where, args = ["b.min_lat <= ?", "b.max_lat >= ?", "b.min_lon <= ?", "b.max_lon >= ?"], \
+            [max_lat, min_lat, max_lon, min_lon]
+        exts = [e.lower() for e in exts]
+        where.append(f"f.ext IN ({','.join('?' * len(exts))})")
+        args += exts
+        if not recursive:
+            where.append("f.dir = ''")
+        sql = ("SELECT c.path, c.points FROM chunk_boxes b JOIN chunks c ON c.id = b.id "
+               f"JOIN files f ON f.path = c.path WHERE {' AND '.join(where)}")
+        with self._lock:
+            rows = self._db.execute(sql, args).fetchall()
+        return [(path, np.frombuffer(blob, dtype=np.float64).reshape(-1, 3)) for path, blob in rows]
+
+    def _describe(self, paths: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        paths = list(paths)
+        out = {}
+        with self._lock:
+            for i in range(0, len(paths), 500):
+                part = paths[i:i + 500]
+                for path, name, waypoints, a, b, c, d in self._db.execute(
+                        "SELECT path, name, waypoints, min_lat, min_lon, max_lat, max_lon FROM files "
+                        f"WHERE path IN ({','.join('?' * len(part))})", part):
+                    out[path] = {"name": name, "path": path, "waypoints": waypoints,
+                                 "bbox": [a, b, c, d] if a is not None else None}
+        return out
+
+    def search_bbox(
+        self,
+        bbox: Iterable[float],
+        *,
+        exts: Iterable[str] = (".waypoints",),
+        recursive: bool = True,
+        limit: Optional[int] = None,
+        refresh: bool = True,
+    ) -> List[Dict[str, Any]]:
+        """
+        Missions dont le trajet (segments entre items positionnés) entre dans
+        la zone [min_lat, min_lon, max_lat, max_lon] ; 'seq' : premier item du
+        premier segment concerné. Triées par chemin.
+        """
+        min_lat, min_lon, max_lat, max_lon = (float(v) for v in bbox)
+        if refresh:
+            self.refresh()
+        first: Dict[str, int] = {}
+        for path, pts in self._candidates(min_lat, min_lon, max_lat, max_lon, exts, recursive):
+            hit = _segments_hit_box(pts, min_lat, min_lon, max_lat, max_lon)
+            if len(hit):
+                seq = int(pts[hit[0], 0])
+                first[path] = min(seq, first.get(path, seq))
+        paths = sorted(first)[:limit] if limit and limit > 0 else sorted(first)
+        info = self._describe(paths)
+        return [dict(info[p], seq=first[p]) for p in paths if p in info]
+
+    def search_near(
+        self,
+        lat: float,
+        lon: float,
+        radius_m: float,
+        *,
+        exts: Iterable[str] = (".waypoints",),
+        recursive: bool = True,
+        limit: Optional[int] = None,
+        refresh: bool = True,
+    ) -> List[Dict[str, Any]]:
+        """
+        Missions dont le trajet passe à moins de 'radius_m' du point, triées
+        par distance ('distance_m', 'seq' : début du segment le plus proche).
+        """
+        lat, lon, radius_m = float(lat), float(lon), float(radius_m)
+        if refresh:
+            self.refresh()
+        ky = EARTH_RADIUS_M * np.pi / 180.0
+        kx = ky * max(np.cos(np.radians(lat)), 1e-6)
+        dlat, dlon = radius_m / ky, radius_m / kx
+        best: Dict[str, Tuple[float, int]] = {}
+        for path, pts in self._candidates(lat - dlat, lon - dlon, lat + dlat, lon + dlon, exts, recursive):
+            dist = _segments_distance_m(pts, lat, lon, kx, ky)
+            k = int(np.argmin(dist))
+            if dist[k] <= radius_m and (path not in best or dist[k] < best[path][0]):
+                best[path] = (float(dist[k]), int(pts[k, 0]))
+        ranked = sorted(best, key=lambda p: best[p][0])
+        if limit and limit > 0:
+            ranked = ranked[:limit]
+        info = self._describe(ranked)
+        return [dict(info[p], distance_m=round(best[p][0], 2), seq=best[p][1]) for p in ranked if p in info]
+
+
+def _segments_hit_box(pts: np.ndarray, min_lat, min_lon, max_lat, max_lon) -> np.ndarray:
+    """Index des segments (ou du point seul) qui recoupent la boîte (Liang–Barsky vectorisé)."""
+    if len(pts) == 1:
+        y, x = pts[0, 1], pts[0, 2]
+        return np.array([0]) if min_lat <= y <= max_lat and min_lon <= x <= max_lon else np.empty(0, dtype=np.int64)
+    y0, x0, y1, x1 = pts[:-1, 1], pts[:-1, 2], pts[1:, 1], pts[1:, 2]
+    dx, dy = x1 - x0, y1 - y0
+    t0, t1 = np.zeros(len(dx)), np.ones(len(dx))
+    ok = np.ones(len(dx), dtype=bool)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for p, q in ((-dx, x0 - min_lon), (dx, max_lon - x0), (-dy, y0 - min_lat), (dy, max_lat - y0)):
+            r = q / p
+            parallel = p == 0
+            ok &= ~(parallel & (q < 0))
+            t0 = np.where(~parallel & (p < 0), np.maximum(t0, r), t0)
+            t1 = np.where(~parallel & (p > 0), np.minimum(t1, r), t1)
+    return np.flatnonzero(ok & (t0 <= t1))
+
+
+def _segments_distance_m(pts: np.ndarray, lat: float, lon: float, kx: float, ky: float) -> np.ndarray:
+    """Distance (m, projection locale) du point à chaque segment du tronçon (ou au point seul)."""
+    x, y = (pts[:, 2] - lon) * kx, (pts[:, 1] - lat) * ky
+    if len(pts) == 1:
+        return np.hypot(x, y)
+    ax, ay, dx, dy = x[:-1], y[:-1], np.diff(x), np.diff(y)
+    l2 = dx * dx + dy * dy
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t = np.where(l2 > 0, np.clip(-(ax * dx + ay * dy) / l2, 0.0, 1.0), 0.0)
+    return np.hypot(ax + t * dx, ay + t * dy)
+
+
+def _encode_cursor(value: Any, path: str) -> str:
+    return base64.urlsafe_b64encode(json.dumps([value, path]).encode()).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> Tuple[Any, str]:
+    try:
+        value, path = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (ValueError, TypeError) as e:
+        raise ValueError("Curseur de pagination invalide.") from e
+    return value, str(path)
+
+# ─────────────────────────────────────────────
+# Un index par dossier racine
+# ─────────────────────────────────────────────
+_INDEXES: Dict[str, MissionIndex] = {}
+_INDEXES_GUARD = threading.Lock()
+
+
+def get_index(root: str) -> MissionIndex:
+    root = os.path.abspath(root)
+    with _INDEXES_GUARD:
+        idx = _INDEXES.get(root)
+        if idx is None:
+            idx = _INDEXES[root] = MissionIndex(root)
+        return idx
+
+
+def notify_mission_changed(path: str) -> None:
+    """Prévient les index ouverts qui contiennent 'path' (création, modification, suppression)."""
+    path = os.path.abspath(path)
+    with _INDEXES_GUARD:
+        indexes = [idx for root, idx in _INDEXES.items() if path.startswith(root + os.sep)]
+    for idx in indexes:
+        idx.notify(path)
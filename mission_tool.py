@@ -3,16 +3,25 @@ import json
 import os
 import sys
 from pymavlink import mavutil
-from get_flight_info import flight_info
+from get_flight_info import flight_info, build_flight_info
 import time
 from typing import List, Dict, Any
 import threading
-from telemetry import MAVLINK_IO_LOCK  # même verrou que la télémétrie
+import weakref
+from telemetry import MAVLINK_IO_LOCK  # verrou legacy (si aucun verrou de lien n'est fourni)
+from dispatcher import DirectSubscription, RttEstimator
+from mission import Mission, write_waypoints
+from mission_index import get_index, notify_mission_changed
 import json
-from datetime import datetime
-from typing import Iterable, Optional, List, Dict, Any
+from typing import Callable, Iterable, Optional, List, Dict, Any, Tuple
 
 MISSIONS_DIR = os.path.abspath("missions")
+
+# Messages du protocole mission routés vers les transferts en cours
+MISSION_MSG_TYPES = (
+    "MISSION_COUNT", "MISSION_REQUEST", "MISSION_REQUEST_INT",
+    "MISSION_ITEM", "MISSION_ITEM_INT", "MISSION_ACK",
+)
 os.makedirs(MISSIONS_DIR, exist_ok=True)
 def _norm_exts(exts: Iterable[str]) -> tuple[str, ...]:
     out = []
@@ -35,51 +44,57 @@ def list_missions(
     limit: Optional[int] = None,
     exclude_prefixes: Iterable[str] = ("DEFAULT",),
 ) -> List[Dict[str, Any]]:
-    root = os.path.abspath(base_dir or MISSIONS_DIR)
-    os.makedirs(root, exist_ok=True)
-
-    exts = _norm_exts(exts)
-    excl = tuple(p.upper() for p in exclude_prefixes or ())
-    files: List[Dict[str, Any]] = []
-
-    def _add(path: str) -> None:
-        # Extension
-        if not path.lower().endswith(exts):
-            return
-        # Exclusion par préfixe (insensible à la casse)
-        name = os.path.basename(path)
-        if excl and any(name.upper().startswith(p) for p in excl):
-            return
-
-        st = os.stat(path)
-        files.append({
-            "name": name,
-            "path": os.path.relpath(path, root).replace("\\", "/"),
-            "size_bytes": st.st_size,
-            "mtime": st.st_mtime,
-            "modified_at": datetime.fromtimestamp(st.st_mtime).isoformat(timespec="seconds"),
-        })
+    files, _ = list_missions_page(
+        base_dir=base_dir, exts=exts, recursive=recursive, sort=sort,
+        order=order, limit=limit, exclude_prefixes=exclude_prefixes,
+    )
+    return files
 
-    if recursive:
-        for r, _, fnames in os.walk(root):
-            for fn in fnames:
-                _add(os.path.join(r, fn))
-    else:
-        for entry in os.scandir(root):
-            if entry.is_file():
-                _add(entry.path)
-
-    key_map = {
-        "name": lambda x: x["name"].lower(),
-        "size": lambda x: x["size_bytes"],
-        "mtime": lambda x: x["mtime"],
-    }
-    files.sort(key=key_map.get(sort.lower(), key_map["mtime"]), reverse=(order.lower() == "desc"))
 
-    if limit and limit > 0:
-        files = files[:limit]
+def list_missions_page(
+    *,
+    base_dir: Optional[str] = None,
+    exts: Iterable[str] = (".waypoints",),
+    recursive: bool = False,
+    sort: str = "mtime",
+    order: str = "desc",
+    limit: Optional[int] = None,
+    exclude_prefixes: Iterable[str] = ("DEFAULT",),
+    cursor: Optional[str] = None,
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    Page de missions depuis l'index persistant du dossier (mission_index) :
+    tri / limite / curseur résolus par requête indexée, sans stat de chaque fichier.
+    Retourne (fichiers, curseur de la page suivante ou None).
+    """
+    root = os.path.abspath(base_dir or MISSIONS_DIR)
+    return get_index(root).query(
+        exts=_norm_exts(exts), recursive=recursive, sort=sort, order=order,
+        limit=limit, exclude_prefixes=exclude_prefixes, cursor=cursor,
+    )
+
 
-    return files
+def search_missions(
+    *,
+    base_dir: Optional[str] = None,
+    bbox: Optional[Iterable[float]] = None,
+    near: Optional[Iterable[float]] = None,
+    exts: Iterable[str] = (".waypoints",),
+    recursive: bool = True,
+    limit: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Recherche spatiale dans l'index des missions :
+      - bbox = [min_lat, min_lon, max_lat, max_lon] : trajets qui entrent dans la zone
+      - near = [lat, lon, rayon_m] : trajets qui passent à moins du rayon (triés par distance)
+    """
+    index = get_index(os.path.abspath(base_dir or MISSIONS_DIR))
+    if near is not None:
+        lat, lon, radius_m = near
+        return index.search_near(lat, lon, radius_m, exts=_norm_exts(exts), recursive=recursive, limit=limit)
+    if bbox is not None:
+        return index.search_bbox(bbox, exts=_norm_exts(exts), recursive=recursive, limit=limit)
+    raise ValueError("Il faut 'bbox' ou 'near'.")
 
 
 # ─────────────────────────────────────────────
@@ -91,9 +106,12 @@ def list_missions(
 #   - filename : chemin du fichier de sortie (.waypoints)
 #   - altitude_takeoff : hauteur cible du décollage
 #   - waypoints : liste de points fournis (optionnel)
-#   - mode : "auto" ou "man"
+#   - mode : "auto", "man" ou "survey"
+#   - survey : paramètres de la grille en mode 'survey' (voir _survey_chunks)
+#   - simplify_tolerance_m : simplifie la trajectoire avant écriture (optionnel)
 # Sortie :
 #   - Écrit le fichier .waypoints prêt à être envoyé
+#   - Retourne {"path", "count"} (+ "simplified" si la trajectoire a été simplifiée)
 # ─────────────────────────────────────────────
 def create_mission(
     master,
@@ -105,25 +123,38 @@ def create_mission(
     startlon=None,
     startalt=None,
     drone_id=None,
+    io_lock=None,
+    cache=None,
+    survey=None,
+    simplify_tolerance_m=None,
 ):
     mission_waypoints = []
 
+    if mode == "survey":
+        if not survey or not survey.get("polygon"):
+            raise ValueError("En mode 'survey', il faut passer survey={'polygon': [[lat, lon], ...], 'spacing_m': ...}.")
+        outpath = _mission_outpath(filename)
+        home = _home_position(master, altitude_takeoff, startlat, startlon, startalt, drone_id, io_lock, cache)
+        n = write_waypoints(outpath, _survey_chunks(home, float(altitude_takeoff), survey))
+        simplified = None
+        if simplify_tolerance_m:
+            mission, simplified = _simplify(Mission.load(outpath), simplify_tolerance_m)
+            mission.save(outpath)
+            n = len(mission)
+        else:
+            Mission.load(outpath).write_sidecar(outpath)  # écrit en flux, sans passer par save()
+        notify_mission_changed(outpath)
+        print(f"Mission .waypoints créée : {outpath} ({n} items)")
+        return _created(outpath, n, simplified)
+
     if mode == "man":
         if not waypoints:
             raise ValueError("En mode 'man', il faut passer la liste complète de waypoints.")
         mission_waypoints = waypoints
     else:
-        if startlat is not None and startlon is not None:
-            latitude  = float(startlat)
-            longitude = float(startlon)
-            altitude0 = float(startalt) if startalt is not None else float(altitude_takeoff)
-        else:
-            with MAVLINK_IO_LOCK:
-                info = flight_info(drone_id if drone_id is not None else 0, master)
-            latitude  = float(info["latitude"])
-            longitude = float(info["longitude"])
-            # compat: selon ta fonction flight_info, la clé peut être altitude_m
-            altitude0 = float(info.get("altitude_m", info.get("altitude", altitude_takeoff)))
+        latitude, longitude, altitude0 = _home_position(
+            master, altitude_takeoff, startlat, startlon, startalt, drone_id, io_lock, cache
+        )
 
         # WP 0 : point de départ (WAYPOINT)
         mission_waypoints.append({
@@ -170,182 +201,376 @@ def create_mission(
             mission_waypoints[-1]["command"] = 21
             mission_waypoints[-1]["alt"] = 0
 
+    outpath = _mission_outpath(filename)
+    mission = Mission.from_dicts(mission_waypoints)
+    simplified = None
+    if simplify_tolerance_m:
+        mission, simplified = _simplify(mission, simplify_tolerance_m)
+    mission.save(outpath)
+    notify_mission_changed(outpath)
+
+    print(f"Mission .waypoints créée : {outpath}")
+    return _created(outpath, len(mission), simplified)
+
+
+def _created(outpath: str, count: int, simplified: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    result: Dict[str, Any] = {"path": outpath, "count": count}
+    if simplified:
+        result["simplified"] = simplified
+    return result
+
+
+def _simplify(mission: Mission, tolerance_m: float) -> Tuple[Mission, Dict[str, Any]]:
+    """simplify_mission ; les statistiques sont renvoyées à l'appelant (réponse API)."""
+    from mission_geometry import simplify_mission
+
+    return simplify_mission(mission, float(tolerance_m))
+
+
+def _mission_outpath(filename: str) -> str:
     # Écriture du fichier (assure-toi que le dossier existe)
     outdir = "missions"
     os.makedirs(outdir, exist_ok=True)
-    outpath = filename if os.path.isabs(filename) else os.path.join(outdir, filename)
-
-    with open(outpath, "w") as f:
-        f.write("QGC WPL 110\n")
-        for wp in mission_waypoints:
-            line = (
-                f"{wp['seq']}\t{wp['current']}\t{wp['frame']}\t{wp['command']}\t"
-                f"{float(wp['param1']):.8f}\t{float(wp['param2']):.8f}\t{float(wp['param3']):.8f}\t{float(wp['param4']):.8f}\t"
-                f"{float(wp['lat']):.8f}\t{float(wp['lon']):.8f}\t{float(wp['alt']):.6f}\t{wp['autoContinue']}\n"
-            )
-            f.write(line)
+    return filename if os.path.isabs(filename) else os.path.join(outdir, filename)
+
+
+def _home_position(master, altitude_takeoff, startlat, startlon, startalt, drone_id, io_lock, cache) -> Tuple[float, float, float]:
+    """Point de départ (lat, lon, alt) : fourni explicitement, sinon position actuelle du drone."""
+    if startlat is not None and startlon is not None:
+        altitude0 = float(startalt) if startalt is not None else float(altitude_takeoff)
+        return float(startlat), float(startlon), altitude0
+    did = drone_id if drone_id is not None else 0
+    if cache is not None:
+        # Position issue du cache télémétrie (le dispatcher est seul lecteur du lien)
+        info = build_flight_info(did, cache)
+    else:
+        info = flight_info(did, master, io_lock=io_lock)
+    # compat: selon ta fonction flight_info, la clé peut être altitude_m
+    altitude0 = float(info.get("altitude_m", info.get("altitude", altitude_takeoff)))
+    return float(info["latitude"]), float(info["longitude"]), altitude0
 
-    print(f"Mission .waypoints créée : {outpath}")
-    return outpath
+
+# Taille des blocs écrits pour une grille de relevé (items)
+SURVEY_CHUNK_ITEMS = 8192
+
+
+def _survey_chunks(home: Tuple[float, float, float], altitude_takeoff: float, survey: Dict[str, Any]):
+    """
+    Blocs de la mission de relevé, pour write_waypoints :
+      HOME, TAKEOFF, [DO_CHANGE_SPEED], grille boustrophédon, RTL (ou LAND)
+    Clés de 'survey' : polygon, spacing_m, heading_deg (None : automatique),
+    altitude (défaut : altitude_takeoff), point_spacing_m, speed_m_s,
+    finish ("rtl" | "land").
+    """
+    from mission_geometry import survey_grid
+
+    latitude, longitude, altitude0 = home
+    altitude = float(survey.get("altitude", altitude_takeoff))
+    point_spacing = survey.get("point_spacing_m")
+    lat, lon, _ = survey_grid(
+        survey["polygon"],
+        float(survey.get("spacing_m", 20.0)),
+        heading_deg=None if survey.get("heading_deg") is None else float(survey["heading_deg"]),
+        point_spacing_m=None if point_spacing is None else float(point_spacing),
+        start=(latitude, longitude),
+    )
+
+    # WP 0 : point de départ, WP 1 : TAKEOFF (comme en mode 'auto')
+    yield {"current": [1, 0], "frame": 0, "command": [16, 22],
+           "lat": [latitude, latitude], "lon": [longitude, longitude], "alt": [altitude0, altitude_takeoff]}
+    if survey.get("speed_m_s"):
+        yield {"command": 178, "param1": 1.0, "param2": float(survey["speed_m_s"]), "param3": -1.0,
+               "lat": [0.0], "lon": [0.0], "alt": [0.0]}
+    for i in range(0, len(lat), SURVEY_CHUNK_ITEMS):
+        block = slice(i, i + SURVEY_CHUNK_ITEMS)
+        yield {"lat": lat[block], "lon": lon[block], "alt": altitude}
+    if str(survey.get("finish", "rtl")).lower() == "land":
+        yield {"command": 21, "lat": lat[-1:], "lon": lon[-1:], "alt": [0.0]}
+    else:
+        yield {"command": 20, "lat": [0.0], "lon": [0.0], "alt": [0.0]}
 
 # ─────────────────────────────────────────────
 # Fonction : send_mission
 # But : Envoyer un fichier .waypoints vers le drone via MAVLink
 # Étapes :
-#   - Parse le fichier
-#   - Envoie chaque point sur le lien MAVLink (UDP)
+#   - Parse le fichier et pré-calcule les champs de tous les MISSION_ITEM_INT
+#   - Répond immédiatement à chaque MISSION_REQUEST(_INT) depuis ce buffer
+#   - Retransmet sélectivement sur timeout (RTO adaptatif selon le RTT du lien)
 #   - Définit le point courant à 0
 # ─────────────────────────────────────────────
 
+class MissionRejected(RuntimeError):
+    """MISSION_ACK d'erreur reçu pendant un upload."""
+    def __init__(self, ack_type: int) -> None:
+        super().__init__(f"Mission refusée par l'autopilote (MISSION_ACK type={ack_type}).")
+        self.ack_type = ack_type
+
+def _serve_item_requests(
+    master,
+    chan,
+    rtt: RttEstimator,
+    mission: Mission,
+    first: int,
+    last: int,
+    announce,
+    item_timeout: float,
+    max_silence_retries: int,
+    progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+) -> int:
+    """
+    Sert les MISSION_REQUEST(_INT) des items first..last jusqu'au MISSION_ACK final.
+    'announce()' (COUNT ou WRITE_PARTIAL_LIST) a déjà été envoyé ; il est renvoyé
+    si l'autopilote ne demande rien. Retourne le nombre de retransmissions.
+    'progress({"sent", "total", "retransmits"})' est appelé à chaque nouvel item
+    demandé ; une exception levée par le callback annule le transfert.
+    """
+    n = last - first + 1
+    ts, tc = master.target_system, master.target_component
+    mission.int_fields(ts, tc)  # conversions faites avant le premier MISSION_REQUEST
+    last_tx = time.monotonic()
+    last_req: Optional[Tuple[int, bool]] = None  # (seq, INT ?) du dernier item envoyé
+    retx_pending = False                          # Karn : pas de mesure RTT après retransmission
+    requested = set()
+    silence_budget = item_timeout * (max_silence_retries + 1)
+    last_rx = time.monotonic()
+    retransmits = 0
+
+    while True:
+        msg = chan.recv_match(
+            type=['MISSION_REQUEST_INT', 'MISSION_REQUEST', 'MISSION_ACK'],
+            blocking=True,
+            timeout=rtt.rto(),
+        )
+
+        if msg is None:
+            if time.monotonic() - last_rx > silence_budget:
+                if len(requested) < n:
+                    raise RuntimeError("Pas de MISSION_REQUEST reçu (timeout).")
+                raise RuntimeError("MISSION_ACK non reçu (timeout).")
+            rtt.backoff()
+            retransmits += 1
+            retx_pending = True
+            if last_req is None:
+                # L'autopilote n'a rien demandé : annonce perdue (ou sa réponse)
+                announce()
+            else:
+                # Item perdu (ou la requête suivante) : on le renvoie tel quel
+                seq, as_int = last_req
+                encode = mission.encode_int if as_int else mission.encode_float
+                master.mav.send(encode(master.mav, ts, tc, seq))
+            last_tx = time.monotonic()
+            continue
+
+        req_type = msg.get_type()
+        if req_type == 'MISSION_ACK':
+            if msg.type != mavutil.mavlink.MAV_MISSION_ACCEPTED:
+                raise MissionRejected(msg.type)
+            if len(requested) < n:
+                continue  # ACK du CLEAR_ALL, ou ACK tardif d'un transfert précédent
+            return retransmits
+
+        req_seq = int(getattr(msg, "seq", -1))
+        if req_seq < first or req_seq > last:
+            print(f"[mission] Requête seq hors bornes ({req_seq}) ignorée.")
+            continue
+
+        last_rx = time.monotonic()
+        if last_req is not None and req_seq == last_req[0] + 1 and not retx_pending:
+            rtt.sample(last_rx - last_tx)
+        retx_pending = False
+
+        as_int = req_type == 'MISSION_REQUEST_INT'
+        encode = mission.encode_int if as_int else mission.encode_float
+        master.mav.send(encode(master.mav, ts, tc, req_seq))
+        last_tx = time.monotonic()
+        last_req = (req_seq, as_int)
+        if req_seq not in requested:
+            requested.add(req_seq)
+            if progress is not None:
+                _report(master, progress, {"sent": len(requested), "total": n, "retransmits": retransmits})
+
+def _report(master, progress, info: Dict[str, Any]) -> None:
+    """Publie l'avancement ; si le callback lève (annulation), l'autopilote est prévenu avant de propager."""
+    try:
+        progress(info)
+    except BaseException:
+        master.mav.mission_ack_send(master.target_system, master.target_component,
+                                    mavutil.mavlink.MAV_MISSION_OPERATION_CANCELLED)
+        raise
+
 def send_mission(
     filename: str,
     master,
     *,
     count_timeout: float = 2.0,
     item_timeout: float = 2.0,
-    max_silence_retries: int = 3
-) -> None:
+    max_silence_retries: int = 3,
+    io_lock=None,
+    dispatcher=None,
+    simplify_tolerance_m: Optional[float] = None,
+    progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+) -> Dict[str, Any]:
     """
-    Envoie un fichier .waypoints avec verrou exclusif MAVLink.
-    - draine les messages
-    - clear + count
-    - répond aux MISSION_REQUEST(_INT) avec l'item demandé
+    Envoie un fichier .waypoints avec verrou exclusif du lien MAVLink
+    (io_lock du drone, ou MAVLINK_IO_LOCK par défaut).
+    Si un dispatcher tourne sur le lien, les réponses arrivent par un
+    abonnement aux messages mission (la télémétrie n'est pas interrompue).
+    - clear + count, sans pause fixe
+    - répond aux MISSION_REQUEST(_INT) avec l'item demandé (champs pré-calculés)
+    - sur silence : renvoie le dernier item demandé (ou le COUNT si rien
+      n'a encore été demandé) après un RTO estimé sur le RTT du lien ;
+      abandon après item_timeout * (max_silence_retries + 1) sans réponse
     - attend un MISSION_ACK en fin de transfert
     - set current = 0
+    Avec 'simplify_tolerance_m', la trajectoire est d'abord simplifiée
+    (simplify_mission) : le fichier n'est pas modifié, seul le plan envoyé l'est.
+    'progress' : callback d'avancement (voir _serve_item_requests).
+    Retourne des statistiques de transfert (durée, retransmissions, RTT).
     """
 
     if master is None:
         raise ValueError("master est requis")
 
-    # Lire/parse le fichier .waypoints
-    with open(filename, "r") as f:
-        lines = f.readlines()
-    if not lines or not lines[0].startswith("QGC WPL 110"):
-        raise RuntimeError("Format .waypoints invalide (header manquant).")
-
-    waypoints: List[Dict[str, Any]] = []
-    for line in lines[1:]:
-        parts = line.strip().split("\t")
-        if len(parts) != 12:
-            continue
-        waypoints.append({
-            "seq": int(parts[0]),
-            "current": int(parts[1]),
-            "frame": int(parts[2]),
-            "command": int(parts[3]),
-            "param1": float(parts[4]),
-            "param2": float(parts[5]),
-            "param3": float(parts[6]),
-            "param4": float(parts[7]),
-            "lat": float(parts[8]),
-            "lon": float(parts[9]),
-            "alt": float(parts[10]),
-            "autoContinue": int(parts[11]),
-        })
-
-    n = len(waypoints)
+    mission = Mission.load(filename)
+    simplified = None
+    if simplify_tolerance_m:
+        mission, simplified = _simplify(mission, simplify_tolerance_m)
+    n = len(mission)
     if n == 0:
         raise RuntimeError("Aucun waypoint à envoyer.")
 
     print(f"[mission] Envoi de {n} waypoints depuis {filename}")
 
-    with MAVLINK_IO_LOCK:
-        # 0) Nettoyer d’éventuels messages en attente
-        _drain_mav(master, 0.2)
+    state = _link_state(master, dispatcher)
+    rtt = _link_rtt(master, dispatcher, item_timeout)
+    t_start = time.monotonic()
 
-        # 1) Clear ancien plan
+    with _link_lock(io_lock, dispatcher), _mission_channel(master, dispatcher) as chan:
+        # 1) Clear ancien plan, puis COUNT immédiatement
+        _set_onboard(state, None)
         master.waypoint_clear_all_send()
-        time.sleep(0.1)
-
-        # 2) Envoyer le COUNT
         master.waypoint_count_send(n)
 
-        # 3) Boucle jusqu’à ce que tous les items soient demandés
-        sent = set()
-        silence_retries = 0
-
-        while len(sent) < n:
-            msg = master.recv_match(
-                type=['MISSION_REQUEST_INT', 'MISSION_REQUEST'],
-                blocking=True,
-                timeout=item_timeout
-            )
-
-            if msg is None:
-                # L’autopilote n’a rien demandé — on renvoie COUNT pour relancer
-                silence_retries += 1
-                if silence_retries > max_silence_retries:
-                    raise RuntimeError("Pas de MISSION_REQUEST reçu (timeout).")
-                print("[mission] Silence → renvoi du COUNT")
-                master.waypoint_count_send(n)
-                continue
-
-            # Dès qu’on reçoit quelque chose, on reset le compteur de silence
-            silence_retries = 0
-
-            req_type = msg.get_type()
-            req_seq = int(getattr(msg, "seq", -1))
-            if req_seq < 0 or req_seq >= n:
-                print(f"[mission] Requête seq hors bornes ({req_seq}) ignorée.")
-                continue
+        # 2) Répondre aux requêtes jusqu'à l'ACK final
+        retransmits = _serve_item_requests(
+            master, chan, rtt, mission, 0, n - 1,
+            lambda: master.waypoint_count_send(n),
+            item_timeout, max_silence_retries, progress,
+        )
+        _set_onboard(state, mission)
 
-            wp = waypoints[req_seq]
-
-            if req_type == 'MISSION_REQUEST_INT':
-                master.mav.mission_item_int_send(
-                    master.target_system,
-                    master.target_component,
-                    req_seq,
-                    wp["frame"],
-                    wp["command"],
-                    wp["current"],
-                    wp["autoContinue"],
-                    float(wp["param1"]),
-                    float(wp["param2"]),
-                    float(wp["param3"]),
-                    float(wp["param4"]),
-                    int(wp["lat"] * 1e7),
-                    int(wp["lon"] * 1e7),
-                    float(wp["alt"]),
-                )
-            else:
-                # Version float classique
-                master.mav.mission_item_send(
-                    master.target_system,
-                    master.target_component,
-                    req_seq,
-                    wp["frame"],
-                    wp["command"],
-                    wp["current"],
-                    wp["autoContinue"],
-                    float(wp["param1"]),
-                    float(wp["param2"]),
-                    float(wp["param3"]),
-                    float(wp["param4"]),
-                    float(wp["lat"]),
-                    float(wp["lon"]),
-                    float(wp["alt"]),
-                )
+        # 3) Définir le waypoint courant à 0
+        master.mav.mission_set_current_send(master.target_system, master.target_component, 0)
 
-            sent.add(req_seq)
-            print(f"[mission] WP {req_seq} envoyé ({req_type})")
+    elapsed = time.monotonic() - t_start
+    stats = {
+        "mode": "full",
+        "count": n,
+        "sent": n,
+        "elapsed_s": round(elapsed, 3),
+        "retransmits": retransmits,
+        "rtt_ms": round(rtt.srtt * 1000.0, 1) if rtt.srtt is not None else None,
+    }
+    if simplified:
+        stats["simplified"] = simplified
+    print(f"[mission] {n} items envoyés en {elapsed:.2f}s "
+          f"(retransmissions: {retransmits}, RTT: {stats['rtt_ms']} ms) → waypoint courant = 0")
+    return stats
 
-        # 4) Attendre l’ACK de fin de transfert
-        ack = master.recv_match(type='MISSION_ACK', blocking=True, timeout=count_timeout)
-        if not ack:
-            raise RuntimeError("MISSION_ACK non reçu (timeout).")
-        print(f"[mission] ACK reçu: {getattr(ack, 'type', 'UNKNOWN')}")
+# ─────────────────────────────────────────────
+# Fonction : sync_mission
+# But : Pousser seulement les items modifiés d'un .waypoints déjà chargé
+# Étapes :
+#   - Compare le fichier au dernier plan connu à bord (download si inconnu)
+#   - Même nombre d'items : MISSION_WRITE_PARTIAL_LIST sur la plage modifiée
+#   - Sinon, ou si l'autopilote refuse l'écriture partielle : send_mission
+# ─────────────────────────────────────────────
 
-        # 5) Définir le waypoint courant à 0
-        master.mav.mission_set_current_send(master.target_system, master.target_component, 0)
-        print("[mission] Waypoint courant défini à 0 → Mission envoyée.")
+def sync_mission(
+    filename: str,
+    master,
+    *,
+    item_timeout: float = 2.0,
+    max_silence_retries: int = 3,
+    io_lock=None,
+    dispatcher=None,
+    progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+) -> Dict[str, Any]:
+    """
+    Synchronise la mission à bord avec un fichier .waypoints.
+    - plan à bord : celui du dernier send/sync/download si le lien est
+      surveillé (watch_onboard_mission), sinon téléchargé
+    - aucune différence : rien n'est envoyé (mode "unchanged")
+    - même nombre d'items : écriture partielle de la plage [start, end]
+      contenant toutes les différences (mode "partial")
+    - nombre d'items différent, écriture partielle refusée ou sans réponse :
+      upload complet (mode "full")
+    Retourne les statistiques de transfert (mode, plage, items envoyés).
+    'progress' comme pour send_mission.
+    """
+    if master is None:
+        raise ValueError("master est requis")
 
-    # Définit le waypoint courant à 0
-    master.mav.mission_set_current_send(master.target_system, master.target_component, 0)
-    print("Waypoint courant défini à 0")
+    mission = Mission.load(filename)
+    n = len(mission)
+    if n == 0:
+        raise RuntimeError("Aucun waypoint à envoyer.")
 
-    time.sleep(1)
-    print("Mission envoyé")
+    state = _link_state(master, dispatcher)
+    rtt = _link_rtt(master, dispatcher, item_timeout)
+    wanted = mission.keys()
+
+    with _link_lock(io_lock, dispatcher):
+        onboard_mission = _trusted_onboard(state)
+        if onboard_mission is None:
+            onboard_mission = download_mission(master, io_lock=io_lock, dispatcher=dispatcher)
+        onboard = onboard_mission.keys()
+
+        if len(onboard) != n:
+            print(f"[mission] {len(onboard)} items à bord, {n} dans {filename} → upload complet")
+            return send_mission(filename, master, item_timeout=item_timeout,
+                                max_silence_retries=max_silence_retries,
+                                io_lock=io_lock, dispatcher=dispatcher, progress=progress)
+
+        changed = [i for i in range(n) if onboard[i] != wanted[i]]
+        if not changed:
+            print(f"[mission] Mission à bord identique à {filename}")
+            return {"mode": "unchanged", "count": n, "sent": 0, "elapsed_s": 0.0, "retransmits": 0}
+
+        start, end = changed[0], changed[-1]
+        ts, tc = master.target_system, master.target_component
+        print(f"[mission] Écriture partielle des items {start}..{end} ({len(changed)} modifiés)")
+        t_start = time.monotonic()
+
+        def _announce() -> None:
+            master.mav.mission_write_partial_list_send(ts, tc, start, end)
+
+        try:
+            with _mission_channel(master, dispatcher) as chan:
+                _set_onboard(state, None)
+                _announce()
+                retransmits = _serve_item_requests(
+                    master, chan, rtt, mission, start, end, _announce,
+                    item_timeout, max_silence_retries, progress,
+                )
+        except RuntimeError as e:
+            # Écriture partielle non supportée (ACK d'erreur ou silence) : plan complet
+            print(f"[mission] Écriture partielle impossible ({e}) → upload complet")
+            return send_mission(filename, master, item_timeout=item_timeout,
+                                max_silence_retries=max_silence_retries,
+                                io_lock=io_lock, dispatcher=dispatcher, progress=progress)
+        _set_onboard(state, mission)
+
+    elapsed = time.monotonic() - t_start
+    print(f"[mission] {end - start + 1} items synchronisés en {elapsed:.2f}s (retransmissions: {retransmits})")
+    return {
+        "mode": "partial",
+        "count": n,
+        "sent": end - start + 1,
+        "range": [start, end],
+        "elapsed_s": round(elapsed, 3),
+        "retransmits": retransmits,
+    }
 
 def modify_mission(filename, seq_to_modify, updated_fields):
     """
@@ -354,66 +579,60 @@ def modify_mission(filename, seq_to_modify, updated_fields):
     :param filename: Chemin du fichier .waypoints
     :param seq_to_modify: Numéro de séquence (int) du waypoint à modifier
     :param updated_fields: Dictionnaire des champs à mettre à jour (ex: {"lat": 48.85, "lon": 2.29})
+    :raises RuntimeError: fichier au format invalide
+    :raises IndexError: aucun waypoint avec ce seq
+    :raises ValueError: valeur de champ invalide
     """
-    with open(filename, "r") as f:
-        lines = f.readlines()
-
-    if not lines or not lines[0].startswith("QGC WPL 110"):
-        print("Format de fichier invalide.")
-        return
-
-    header = lines[0]
-    waypoints = lines[1:]
-    modified = False
-    new_lines = [header]
-
-    for line in waypoints:
-        parts = line.strip().split("\t")
-        if len(parts) != 12:
-            new_lines.append(line)
-            continue
+    with _edit_lock(filename):
+        mission = Mission.load(filename).copy()
+        mission.update(int(seq_to_modify), updated_fields)
+        print(f"Waypoint {seq_to_modify} modifié.")
+        mission.save(filename)
+    notify_mission_changed(filename)
+    print(f"Fichier mis à jour : {filename}")
 
-        seq = int(parts[0])
-        if seq == seq_to_modify:
-            # Modifier les champs
-            if "lat" in updated_fields:
-                parts[8] = f"{float(updated_fields['lat']):.8f}"
-            if "lon" in updated_fields:
-                parts[9] = f"{float(updated_fields['lon']):.8f}"
-            if "alt" in updated_fields:
-                parts[10] = f"{float(updated_fields['alt']):.6f}"
-            if "command" in updated_fields:
-                parts[3] = str(int(updated_fields['command']))
-            if "frame" in updated_fields:
-                parts[2] = str(int(updated_fields['frame']))
-            if "param1" in updated_fields:
-                parts[4] = f"{float(updated_fields['param1']):.8f}"
-            if "param2" in updated_fields:
-                parts[5] = f"{float(updated_fields['param2']):.8f}"
-            if "param3" in updated_fields:
-                parts[6] = f"{float(updated_fields['param3']):.8f}"
-            if "param4" in updated_fields:
-                parts[7] = f"{float(updated_fields['param4']):.8f}"
-            if "autoContinue" in updated_fields:
-                parts[11] = str(int(updated_fields['autoContinue']))
-            if "current" in updated_fields:
-                parts[1] = str(int(updated_fields['current']))
-
-            modified_line = "\t".join(parts) + "\n"
-            new_lines.append(modified_line)
-            modified = True
-            print(f"Waypoint {seq} modifié.")
-        else:
-            new_lines.append(line)
+# Un verrou par fichier : deux lots concurrents sur le même plan ne se perdent pas
+_EDIT_LOCKS: Dict[str, threading.Lock] = {}
+_EDIT_LOCKS_GUARD = threading.Lock()
 
-    if not modified:
-        print(f"Aucun waypoint avec seq={seq_to_modify} trouvé.")
-        return
 
-    with open(filename, "w") as f:
-        f.writelines(new_lines)
+def _edit_lock(path: str) -> threading.Lock:
+    with _EDIT_LOCKS_GUARD:
+        return _EDIT_LOCKS.setdefault(os.path.abspath(path), threading.Lock())
+
+
+def edit_mission(
+    filename: str,
+    *,
+    updates: Iterable[Dict[str, Any]] = (),
+    delete: Iterable[int] = (),
+    insert: Iterable[Dict[str, Any]] = (),
+    order: Optional[Iterable[int]] = None,
+) -> Dict[str, Any]:
+    """
+    Modifie un fichier .waypoints par lot (voir Mission.edit) : une lecture,
+    une passe, une écriture atomique (fichier temporaire + renommage).
+    Les seq sont ceux du fichier avant modification ; le plan est renuméroté.
+    Lève IndexError / ValueError si le lot est invalide (fichier inchangé).
+    """
+    updates, delete, insert = list(updates), list(delete), list(insert)
+    with _edit_lock(filename):
+        mission = Mission.load(filename)
+        edited = mission.edit(updates=updates, delete=delete, insert=insert, order=order)
+        edited.save(filename)
+    notify_mission_changed(filename)
+    stats = {
+        "count": len(edited),
+        "original_count": len(mission),
+        "updated": len(updates),
+        "deleted": len(set(int(s) for s in delete)),
+        "inserted": sum(len(block.get("items", ())) for block in insert),
+        "reordered": order is not None,
+    }
+    print(f"[mission] {filename} : {stats['updated']} modifiés, {stats['inserted']} insérés, "
+          f"{stats['deleted']} supprimés → {stats['count']} items")
+    return stats
 
-    print(f"Fichier mis à jour : {filename}")
 
 def _drain_mav(master, duration=0.2):
     t0 = time.time()
@@ -422,90 +641,263 @@ def _drain_mav(master, duration=0.2):
         if msg is None:
             break
 
-def download_mission(master, timeout: float = 2.0, retries: int = 3) -> List[Dict[str, Any]]:
+def _link_lock(io_lock=None, dispatcher=None):
+    """Verrou de session du lien : io_lock explicite, sinon celui du dispatcher, sinon le global."""
+    if io_lock is not None:
+        return io_lock
+    if dispatcher is not None:
+        return dispatcher.io_lock
+    return MAVLINK_IO_LOCK
+
+# État des liens sans dispatcher (mode legacy), conservé entre deux transferts
+_DIRECT_LINKS: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+class _DirectLinkState:
+    __slots__ = ("rtt", "mission_int", "onboard_mission", "onboard_mission_id", "mission_signature", "__weakref__")
+
+    def __init__(self, initial_rto: float = 1.0) -> None:
+        self.rtt = RttEstimator(initial_rto=initial_rto)
+        self.mission_int: Optional[bool] = None
+        self.onboard_mission: Optional[Mission] = None
+        self.onboard_mission_id: Optional[str] = None
+        self.mission_signature: Optional[tuple] = None
+
+def _link_state(master, dispatcher=None, initial_rto: float = 1.0):
+    """
+    État mission du lien (rtt, mission_int, onboard_mission…) : le dispatcher
+    lui-même s'il y en a un, sinon un état attaché au master.
+    """
+    if dispatcher is not None:
+        return dispatcher
+    try:
+        state = _DIRECT_LINKS.get(master)
+        if state is None:
+            state = _DIRECT_LINKS[master] = _DirectLinkState(initial_rto)
+        return state
+    except TypeError:
+        return _DirectLinkState(initial_rto)
+
+def _link_rtt(master, dispatcher=None, initial_rto: float = 1.0) -> RttEstimator:
+    """Estimateur de RTT du lien (dispatcher, ou état attaché au master)."""
+    return _link_state(master, dispatcher, initial_rto).rtt
+
+# ─────────────────────────────────────────────
+# Cache de la mission à bord
+# ─────────────────────────────────────────────
+def _set_onboard(state, mission: Optional[Mission]) -> None:
+    """Mémorise (ou invalide, mission=None) le plan à bord connu du lien."""
+    state.onboard_mission_id = mission.digest() if mission is not None else None
+    state.onboard_mission = mission
+    if mission is not None:
+        # La prochaine signature MISSION_CURRENT reçue devient la référence du nouveau plan
+        state.mission_signature = None
+
+def watch_onboard_mission(link) -> None:
+    """
+    Invalide le cache de mission à bord d'un lien (dispatcher ou AsyncLink)
+    quand le plan change hors de nos transferts :
+      - MISSION_ACK d'un upload (le nôtre est suivi d'une mise à jour du cache)
+      - MISSION_CURRENT dont l'identifiant de mission (mission_id, dialectes
+        récents) ou le nombre total d'items change
+    """
+    def _sink(msg) -> None:
+        t = msg.get_type()
+        if t == "MISSION_ACK":
+            if getattr(msg, "mission_type", 0) == mavutil.mavlink.MAV_MISSION_TYPE_MISSION:
+                _set_onboard(link, None)
+        elif t == "MISSION_CURRENT":
+            sig = (getattr(msg, "mission_id", 0), getattr(msg, "total", 0))
+            prev = link.mission_signature
+            link.mission_signature = sig
+            if prev is not None and sig != prev and link.onboard_mission is not None:
+                _set_onboard(link, None)
+
+    link.add_sink(_sink)
+    link.onboard_watched = True
+
+def _trusted_onboard(state) -> Optional[Mission]:
+    """
+    Plan à bord mémorisé, seulement sur un lien surveillé : ailleurs (liens
+    directs legacy, dispatcher sans watch_onboard_mission) un autre GCS ou un
+    reboot a pu le changer sans que le cache soit invalidé.
+    """
+    if not getattr(state, "onboard_watched", False):
+        return None
+    return state.onboard_mission
+
+def onboard_mission(
+    master,
+    *,
+    dispatcher=None,
+    io_lock=None,
+    refresh: bool = False,
+    progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+) -> Tuple[Mission, str, bool]:
+    """
+    Mission à bord : depuis le cache du lien s'il est valide (aucun échange
+    MAVLink, aucun verrou), sinon par download_mission.
+    Le cache n'est utilisé que sur un lien surveillé (watch_onboard_mission).
+    Retourne (mission, empreinte, servie depuis le cache ?). La mission est
+    partagée avec le cache : copy() avant de la modifier.
     """
-    Télécharge de façon robuste la mission chargée:
-      - verrou exclusif MAVLink
-      - drain du pipe
-      - requêtes avec retries
-      - vérification du seq
+    if not refresh:
+        cached = cached_onboard_mission(dispatcher)
+        if cached is not None:
+            return cached[0], cached[1], True
+    mission = download_mission(master, io_lock=io_lock, dispatcher=dispatcher, progress=progress)
+    return mission, mission.digest(), False
+
+def cached_onboard_mission(dispatcher) -> Optional[Tuple[Mission, str]]:
+    """(mission, empreinte) du cache du lien si elle est valide, sans aucun échange MAVLink ; sinon None."""
+    if dispatcher is None:
+        return None
+    mission, mid = _trusted_onboard(dispatcher), dispatcher.onboard_mission_id
+    if mission is None or mid is None:
+        return None
+    return mission, mid
+
+def _mission_channel(master, dispatcher=None):
+    """
+    Canal de réception des messages mission :
+      - abonnement borné sur le dispatcher du lien (aucune trame télémétrie perdue)
+      - sinon lecture directe sur le master, après drain du pipe (legacy)
+    """
+    if dispatcher is not None:
+        return dispatcher.subscribe(MISSION_MSG_TYPES, maxsize=512)
+    _drain_mav(master, 0.2)
+    return DirectSubscription(master, MISSION_MSG_TYPES)
+
+def download_mission(
+    master,
+    timeout: float = 2.0,
+    retries: int = 3,
+    io_lock=None,
+    dispatcher=None,
+    window: int = 8,
+    progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+) -> Mission:
+    """
+    Télécharge la mission chargée:
+      - verrou exclusif du lien MAVLink (io_lock, ou MAVLINK_IO_LOCK par défaut)
+      - abonnement mission sur le dispatcher du lien (ou drain du pipe en legacy)
+      - jusqu'à 'window' MISSION_REQUEST(_INT) en vol ; les items reçus hors
+        ordre sont gardés, seuls les seq manquants sont redemandés
+      - timeouts sur le RTO du lien ('timeout' = RTO initial), abandon après
+        timeout * retries sans aucune réponse
+      - INT ou float appris une fois par lien (repli float si les requêtes
+        INT restent sans réponse)
+      - un autopilote qui refuse les requêtes hors séquence (MISSION_ACK
+        d'erreur) repasse en mode séquentiel (window = 1)
       - MISSION_ACK en fin de transfert
+    'progress({"received", "total"})' est appelé à chaque item reçu ; une
+    exception levée par le callback annule le transfert (ACK OPERATION_CANCELLED).
+    Retourne une Mission (les items reçus sont décodés en une fois).
     """
-    with MAVLINK_IO_LOCK:
-        # Nettoyer d'éventuels vieux messages
-        _drain_mav(master, 0.2)
+    ts, tc = master.target_system, master.target_component
+    state = _link_state(master, dispatcher, timeout)
+    rtt = state.rtt
+    silence_budget = timeout * retries
 
+    with _link_lock(io_lock, dispatcher), _mission_channel(master, dispatcher) as chan:
         # 1) Demander la liste
-        for attempt in range(retries):
-            master.mav.mission_request_list_send(master.target_system, master.target_component)
-            count_msg = master.recv_match(type='MISSION_COUNT', blocking=True, timeout=timeout)
-            if count_msg:
+        master.mav.mission_request_list_send(ts, tc)
+        sent_at = last_rx = time.monotonic()
+        retx = False
+        while True:
+            count_msg = chan.recv_match(type='MISSION_COUNT', blocking=True, timeout=rtt.rto())
+            if count_msg is not None:
                 break
-        if not count_msg:
-            raise RuntimeError("MISSION_COUNT non reçu (timeout).")
+            if time.monotonic() - last_rx > silence_budget:
+                raise RuntimeError("MISSION_COUNT non reçu (timeout).")
+            rtt.backoff()
+            master.mav.mission_request_list_send(ts, tc)
+            sent_at, retx = time.monotonic(), True
+        if not retx:
+            rtt.sample(time.monotonic() - sent_at)
 
         count = int(count_msg.count)
-        items: List[Dict[str, Any]] = [None] * count  # type: ignore
-
-        # 2) Demander chaque item avec retries et vérif du seq
-        for i in range(count):
-            got = False
-            for attempt in range(retries):
-                # Demande INT d'abord
-                master.mav.mission_request_int_send(master.target_system, master.target_component, i)
-                msg = master.recv_match(type=['MISSION_ITEM_INT', 'MISSION_ITEM'], blocking=True, timeout=timeout)
-
-                if msg is None:
-                    # Fallback: demande non-INT
-                    master.mav.mission_request_send(master.target_system, master.target_component, i)
-                    msg = master.recv_match(type=['MISSION_ITEM', 'MISSION_ITEM_INT'], blocking=True, timeout=timeout)
-
-                if msg is None:
-                    continue  # retry
-
-                seq = int(getattr(msg, "seq", i))
-                if seq != i:
-                    # message hors ordre -> on réessaye (ou on range à l'index reçu si tu préfères)
-                    continue
+        msgs: List[Any] = [None] * count
+        missing = set(range(count))
+        queue = list(range(count - 1, -1, -1))     # pile : seq croissants
+        pending: Dict[int, Tuple[float, bool]] = {}  # seq -> (envoi, retransmis ?)
+        known_int = state.mission_int
+        as_int = known_int is not False
+        window = max(1, int(window))
+        last_rx = time.monotonic()
+
+        def _request(seq: int, again: bool) -> None:
+            if as_int:
+                master.mav.mission_request_int_send(ts, tc, seq)
+            else:
+                master.mav.mission_request_send(ts, tc, seq)
+            pending[seq] = (time.monotonic(), again)
+
+        # 2) Fenêtre de requêtes jusqu'à ce que tous les items soient reçus
+        while missing:
+            while len(pending) < window and queue:
+                seq = queue.pop()
+                if seq in missing and seq not in pending:
+                    _request(seq, False)
+
+            now = time.monotonic()
+            rto = rtt.rto()
+            wait = min(t for t, _ in pending.values()) + rto - now
+            msg = chan.recv_match(
+                type=['MISSION_ITEM_INT', 'MISSION_ITEM', 'MISSION_ACK'],
+                blocking=True,
+                timeout=max(wait, 0.001),
+            )
 
-                if msg.get_type() == 'MISSION_ITEM_INT':
-                    lat = float(msg.x) / 1e7
-                    lon = float(msg.y) / 1e7
-                    alt = float(msg.z)
+            if msg is None:
+                now = time.monotonic()
+                if now - last_rx > silence_budget:
+                    seq = min(missing)
+                    raise RuntimeError(f"Item {seq}: pas de réponse MISSION_ITEM(_INT).")
+                expired = [s for s, (t, _) in pending.items() if now - t >= rto]
+                if not expired:
+                    continue
+                if as_int and known_int is None and len(missing) == count:
+                    # Aucune réponse aux requêtes INT : autopilote float uniquement ?
+                    as_int = False
                 else:
-                    lat = float(msg.x)
-                    lon = float(msg.y)
-                    alt = float(msg.z)
-
-                items[i] = {
-                    "seq": seq,
-                    "current": int(getattr(msg, "current", 0)),
-                    "frame": int(getattr(msg, "frame", 0)),
-                    "command": int(getattr(msg, "command", 16)),
-                    "param1": float(getattr(msg, "param1", 0.0)),
-                    "param2": float(getattr(msg, "param2", 0.0)),
-                    "param3": float(getattr(msg, "param3", 0.0)),
-                    "param4": float(getattr(msg, "param4", 0.0)),
-                    "lat": lat,
-                    "lon": lon,
-                    "alt": alt,
-                    "autoContinue": int(getattr(msg, "autocontinue", 1)),
-                }
-                got = True
-                break
+                    rtt.backoff()
+                for seq in sorted(expired):
+                    _request(seq, True)
+                continue
 
-            if not got:
-                raise RuntimeError(f"Item {i}: pas de réponse MISSION_ITEM(_INT).")
+            if msg.get_type() == 'MISSION_ACK':
+                if msg.type == mavutil.mavlink.MAV_MISSION_ACCEPTED:
+                    continue
+                if window == 1:
+                    raise RuntimeError(f"Download refusé par l'autopilote (MISSION_ACK type={msg.type}).")
+                # Requêtes hors séquence refusées : on repart en séquentiel
+                window = 1
+                queue.extend(sorted(pending, reverse=True))
+                pending.clear()
+                queue = sorted(set(queue) & missing, reverse=True)
+                continue
+
+            seq = int(getattr(msg, "seq", -1))
+            if seq not in missing:
+                continue  # doublon (réponse à une retransmission) ou hors bornes
+            last_rx = time.monotonic()
+            if known_int is None:
+                known_int = state.mission_int = msg.get_type() == 'MISSION_ITEM_INT'
+                as_int = known_int
+            sent = pending.pop(seq, None)
+            if sent is not None and not sent[1]:
+                rtt.sample(last_rx - sent[0])
+            msgs[seq] = msg
+            missing.discard(seq)
+            if progress is not None:
+                _report(master, progress, {"received": count - len(missing), "total": count})
 
         # 3) ACK en fin de transfert (important pour finir la session mission)
-        master.mav.mission_ack_send(
-            master.target_system,
-            master.target_component,
-            mavutil.mavlink.MAV_MISSION_ACCEPTED,
-            0
-        )
+        master.mav.mission_ack_send(ts, tc, mavutil.mavlink.MAV_MISSION_ACCEPTED, 0)
 
-        return [it for it in items if it is not None]
+        mission = Mission.from_messages(msgs)
+        _set_onboard(state, mission)
+        return mission
 
 # --- Point d'entrée ---
 if __name__ == "__main__":
@@ -544,7 +936,14 @@ if __name__ == "__main__":
                 except ValueError:
                     updated_fields[key] = val
 
-        modify_mission(fichier, seq, updated_fields)
+        try:
+            modify_mission(fichier, seq, updated_fields)
+        except RuntimeError:
+            print("Format de fichier invalide.")
+        except IndexError:
+            print(f"Aucun waypoint avec seq={seq} trouvé.")
+        except (ValueError, TypeError) as e:
+            print(f"Valeur invalide : {e}")
     elif action == "download":
         # Nécessite que tu aies ajouté download_mission() plus haut
         from mission_tool import download_mission  # si la fonction est dans ce même fichier tu peux enlever cet import
@@ -558,17 +957,7 @@ if __name__ == "__main__":
             if not os.path.isabs(outpath):
                 if not outpath.startswith("missions" + os.sep) and not outpath.startswith("missions/"):
                     outpath = os.path.join("missions", outpath)
-            with open(outpath, "w") as f:
-                f.write("QGC WPL 110\n")
-                for i, wp in enumerate(items):
-                    line = (
-                        f"{wp.get('seq', i)}\t{wp.get('current', 0)}\t{wp.get('frame', 0)}\t{wp.get('command', 16)}\t"
-                        f"{float(wp.get('param1', 0.0)):.8f}\t{float(wp.get('param2', 0.0)):.8f}\t"
-                        f"{float(wp.get('param3', 0.0)):.8f}\t{float(wp.get('param4', 0.0)):.8f}\t"
-                        f"{float(wp.get('lat', 0.0)):.8f}\t{float(wp.get('lon', 0.0)):.8f}\t"
-                        f"{float(wp.get('alt', 0.0)):.6f}\t{int(wp.get('autoContinue', 1))}\n"
-                    )
-                    f.write(line)
+            items.save(outpath)
             print(f"Mission téléchargée → {outpath}")
 
 
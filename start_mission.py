@@ -1,69 +1,431 @@
 from pymavlink import mavutil
-import time
+import threading, time
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional
 
-def start(master):
-    # Connexion MAVLink
+from dispatcher import DirectSubscription
+from telemetry import MAVLINK_IO_LOCK
+
+mavlink = mavutil.mavlink
+
+# Délais max par étape (s) : on passe à la suivante dès la confirmation
+MODE_TIMEOUT = 3.0
+ARM_TIMEOUT = 10.0          # l'ACK d'armement n'arrive qu'après les pre-arm checks
+MISSION_START_TIMEOUT = 3.0
+# Renvoi du COMMAND_LONG (confirmation + 1) tant que rien ne répond
+RESEND_INTERVAL = 1.0
+# Au-delà, le HEARTBEAT du cache est jugé trop ancien pour décrire l'état du drone
+HEARTBEAT_MAX_AGE = 2.0
+# Attente d'un HEARTBEAT armé + AUTO après prepare() (le drone l'émet à ~1 Hz)
+READY_TIMEOUT = 3.0
+# Démarrage flotte : attente max des autres drones une fois prêt
+FLEET_READY_TIMEOUT = 20.0
+
+START_MSG_TYPES = ["COMMAND_ACK", "HEARTBEAT"]
+
+
+class StartError(RuntimeError):
+    """
+    Échec d'une étape du démarrage : 'step' (mode_loiter, arm, mode_auto,
+    mission_start), 'result' (nom MAV_RESULT si l'autopilote a refusé, None
+    s'il n'a pas répondu) et 'elapsed_s' (durée de l'étape).
+    """
+
+    def __init__(self, step: str, message: str, result: Optional[str] = None, elapsed_s: float = 0.0) -> None:
+        super().__init__(message)
+        self.step = step
+        self.result = result
+        self.elapsed_s = elapsed_s
+
+# ─────────────────────────────────────────────
+# État observé (HEARTBEAT)
+# ─────────────────────────────────────────────
+def is_armed(hb) -> bool:
+    return (hb.base_mode & mavlink.MAV_MODE_FLAG_SAFETY_ARMED) != 0
+
+def observed_heartbeat(cache, max_age: float = HEARTBEAT_MAX_AGE):
+    """Dernier HEARTBEAT du cache télémétrie s'il est assez récent, sinon None (état inconnu)."""
+    if cache is None:
+        return None
+    snap = cache.snapshot()
+    if snap.heartbeat is None or time.time() - snap.hb_ts > max_age:
+        return None
+    return snap.heartbeat
+
+def _mode_id(master, mode_name: str, step: str) -> int:
+    mode_id = master.mode_mapping().get(mode_name.upper())
+    if mode_id is None:
+        raise StartError(step, f"Mode {mode_name} inconnu pour cet autopilote.")
+    return mode_id
+
+def _from_autopilot(master, msg) -> bool:
+    return (msg.get_srcSystem() == master.target_system
+            and getattr(msg, "type", None) != mavlink.MAV_TYPE_GCS)
+
+def _is_ready(master, hb) -> bool:
+    return is_armed(hb) and hb.custom_mode == master.mode_mapping().get("AUTO")
+
+def _result_name(result: int) -> str:
+    entry = mavlink.enums["MAV_RESULT"].get(int(result))
+    return entry.name if entry is not None else str(result)
+
+# ─────────────────────────────────────────────
+# Étape : COMMAND_LONG jusqu'à confirmation
+# ─────────────────────────────────────────────
+def _command_step(
+    chan,
+    master,
+    lock,
+    step: str,
+    label: str,
+    command: int,
+    params: List[float],
+    timeout: float,
+    confirmed: Optional[Callable[[Any], bool]] = None,
+) -> Dict[str, Any]:
+    """
+    Envoie 'command' et attend la première confirmation : COMMAND_ACK
+    ACCEPTED, ou HEARTBEAT de l'autopilote vérifiant 'confirmed' (utile si
+    l'ACK est perdu). Renvoie la commande toutes les RESEND_INTERVAL s tant que
+    rien ne répond ; ACK IN_PROGRESS suspend les renvois. Un ACK de refus ou
+    l'expiration de 'timeout' lèvent StartError.
+    """
+    p = (list(params) + [0.0] * 7)[:7]
+    t0 = time.monotonic()
+    deadline = t0 + timeout
+    confirmation, next_send, resend = 0, t0, True
+    while True:
+        now = time.monotonic()
+        if resend and now >= next_send:
+            with lock:
+                master.mav.command_long_send(master.target_system, master.target_component,
+                                             command, confirmation, *p)
+            confirmation = min(confirmation + 1, 255)
+            next_send = now + RESEND_INTERVAL
+        remaining = deadline - now
+        if remaining <= 0:
+            expected = "ni COMMAND_ACK ni HEARTBEAT" if confirmed is not None else "aucun COMMAND_ACK"
+            raise StartError(step, f"{label} : aucune confirmation en {timeout:g}s ({expected}).",
+                             elapsed_s=round(now - t0, 3))
+        wait = min(remaining, next_send - now) if resend else remaining
+        msg = chan.recv_match(type=START_MSG_TYPES, blocking=True, timeout=max(wait, 0.001))
+        if msg is None:
+            continue
+        if msg.get_type() == "HEARTBEAT":
+            if confirmed is not None and _from_autopilot(master, msg) and confirmed(msg):
+                return {"step": step, "via": "heartbeat", "elapsed_s": round(time.monotonic() - t0, 3)}
+            continue
+        if int(getattr(msg, "command", -1)) != int(command):
+            continue
+        if msg.result == mavlink.MAV_RESULT_ACCEPTED:
+            return {"step": step, "via": "ack", "elapsed_s": round(time.monotonic() - t0, 3)}
+        if msg.result == mavlink.MAV_RESULT_IN_PROGRESS:
+            resend = False
+            continue
+        name = _result_name(msg.result)
+        raise StartError(step, f"{label} refusé par l'autopilote ({name}).", result=name,
+                         elapsed_s=round(time.monotonic() - t0, 3))
+
+def _set_mode_step(chan, master, lock, mode_name: str, timeout: float) -> Dict[str, Any]:
+    step = f"mode_{mode_name.lower()}"
+    mode_id = _mode_id(master, mode_name, step)
+    done = _command_step(chan, master, lock, step, f"Passage en {mode_name.upper()}",
+                         mavlink.MAV_CMD_DO_SET_MODE,
+                         [mavlink.MAV_MODE_FLAG_CUSTOM_MODE_ENABLED, mode_id],
+                         timeout, confirmed=lambda hb: hb.custom_mode == mode_id)
+    print(f"Mode {mode_name.upper()} confirmé ({done['via']}, {done['elapsed_s']}s)")
+    return done
+
+def _channel(master, dispatcher=None):
+    """Abonnement COMMAND_ACK + HEARTBEAT sur le dispatcher, sinon lecture directe (legacy)."""
+    if dispatcher is not None:
+        return dispatcher.subscribe(START_MSG_TYPES, maxsize=128)
+    return DirectSubscription(master, START_MSG_TYPES)
+
+def _lock(io_lock=None, dispatcher=None):
+    if io_lock is not None:
+        return io_lock
+    if dispatcher is not None:
+        return dispatcher.io_lock
+    return MAVLINK_IO_LOCK
+
+# ─────────────────────────────────────────────
+# Séquence de démarrage
+# ─────────────────────────────────────────────
+def prepare(
+    master,
+    *,
+    dispatcher=None,
+    io_lock=None,
+    cache=None,
+    mode_timeout: float = MODE_TIMEOUT,
+    arm_timeout: float = ARM_TIMEOUT,
+    progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Amène le drone armé en AUTO : LOITER → armement → AUTO. Les étapes déjà
+    vérifiées par un HEARTBEAT récent du cache sont sautées (via "cache").
+    Retourne les étapes [{"step", "via", "elapsed_s"}] ; lève StartError.
+    progress({"step": ...}) est appelé avant chaque étape (une exception
+    l'interrompt, ex. annulation du job).
+    """
+    lock = _lock(io_lock, dispatcher)
+    loiter = _mode_id(master, "LOITER", "mode_loiter")
+    auto = _mode_id(master, "AUTO", "mode_auto")
+    hb = observed_heartbeat(cache)
+    armed = hb is not None and is_armed(hb)
+    mode = hb.custom_mode if hb is not None else None
+
+    steps: List[Dict[str, Any]] = []
+
+    def _skip(step: str) -> None:
+        steps.append({"step": step, "via": "cache", "elapsed_s": 0.0})
+
+    with _channel(master, dispatcher) as chan:
+        if not armed:
+            # ArduCopter refuse d'armer en AUTO : on arme en LOITER
+            if progress: progress({"step": "mode_loiter"})
+            if mode == loiter:
+                _skip("mode_loiter")
+            else:
+                steps.append(_set_mode_step(chan, master, lock, "LOITER", mode_timeout))
+            mode = loiter
+
+            if progress: progress({"step": "arm"})
+            done = _command_step(chan, master, lock, "arm", "Armement",
+                                 mavlink.MAV_CMD_COMPONENT_ARM_DISARM, [1], arm_timeout,
+                                 confirmed=is_armed)
+            print(f"Drone armé ({done['via']}, {done['elapsed_s']}s)")
+            steps.append(done)
+        else:
+            _skip("arm")
+
+        if progress: progress({"step": "mode_auto"})
+        if mode == auto:
+            _skip("mode_auto")
+        else:
+            steps.append(_set_mode_step(chan, master, lock, "AUTO", mode_timeout))
+    return steps
+
+def launch(
+    master,
+    *,
+    dispatcher=None,
+    io_lock=None,
+    timeout: float = MISSION_START_TIMEOUT,
+    progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+) -> Dict[str, Any]:
+    """
+    Envoie MAV_CMD_MISSION_START et attend son COMMAND_ACK ACCEPTED.
+    Retourne {"step", "via", "elapsed_s", "sent_at"} (sent_at : time.time()
+    juste avant l'envoi) ; lève StartError.
+    """
+    if progress: progress({"step": "mission_start"})
+    with _channel(master, dispatcher) as chan:
+        sent_at = time.time()
+        done = _command_step(chan, master, _lock(io_lock, dispatcher), "mission_start", "Lancement de la mission",
+                             mavlink.MAV_CMD_MISSION_START,
+                             [0, 0],   # première séquence, dernière (0 = toutes)
+                             timeout)
+    done["sent_at"] = sent_at
+    print(f"Mission lancée ({done['elapsed_s']}s)")
+    return done
+
+def start(
+    master,
+    *,
+    dispatcher=None,
+    io_lock=None,
+    cache=None,
+    mode_timeout: float = MODE_TIMEOUT,
+    arm_timeout: float = ARM_TIMEOUT,
+    start_timeout: float = MISSION_START_TIMEOUT,
+    progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+) -> Dict[str, Any]:
+    """
+    Arme le drone, passe en AUTO et lance la mission, chaque étape attendant
+    la confirmation de l'autopilote (COMMAND_ACK ou HEARTBEAT) au lieu d'un
+    délai fixe. Retourne {"steps": [...], "elapsed_s"} ; lève StartError en
+    nommant l'étape qui a échoué.
+    """
     print(f"Connecté au système ID: {master.target_system}, composant ID: {master.target_component}")
+    t0 = time.monotonic()
+    steps = prepare(master, dispatcher=dispatcher, io_lock=io_lock, cache=cache,
+                    mode_timeout=mode_timeout, arm_timeout=arm_timeout, progress=progress)
+    steps.append(launch(master, dispatcher=dispatcher, io_lock=io_lock, timeout=start_timeout, progress=progress))
+    return {"steps": steps, "elapsed_s": round(time.monotonic() - t0, 3)}
+
+def wait_ready(
+    master,
+    *,
+    dispatcher=None,
+    cache=None,
+    timeout: float = READY_TIMEOUT,
+) -> Dict[str, Any]:
+    """
+    Attend que la télémétrie montre le drone armé et en AUTO : HEARTBEAT
+    récent du cache, sinon le prochain HEARTBEAT de l'autopilote. Retourne
+    l'étape {"step": "ready", "via", "elapsed_s"} ; lève StartError au timeout.
+    """
+    t0 = time.monotonic()
+    with _channel(master, dispatcher) as chan:
+        hb = observed_heartbeat(cache)
+        if hb is not None and _is_ready(master, hb):
+            return {"step": "ready", "via": "cache", "elapsed_s": 0.0}
+        deadline = t0 + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise StartError("ready", f"Pas de HEARTBEAT armé en AUTO en {timeout:g}s.",
+                                 elapsed_s=round(time.monotonic() - t0, 3))
+            hb = chan.recv_match(type="HEARTBEAT", blocking=True, timeout=remaining)
+            if hb is not None and _from_autopilot(master, hb) and _is_ready(master, hb):
+                return {"step": "ready", "via": "heartbeat", "elapsed_s": round(time.monotonic() - t0, 3)}
+
+def disarm(master, *, dispatcher=None, io_lock=None) -> None:
+    """Demande de désarmement, sans attendre l'ACK (repli quand un lancement est abandonné)."""
+    with _lock(io_lock, dispatcher):
+        master.mav.command_long_send(master.target_system, master.target_component,
+                                     mavlink.MAV_CMD_COMPONENT_ARM_DISARM, 0, 0, 0, 0, 0, 0, 0, 0)
+
+# ─────────────────────────────────────────────
+# Démarrage synchronisé d'une flotte
+# ─────────────────────────────────────────────
+class FleetStart:
+    """
+    Lancement groupé : chaque drone (un thread par drone, via run()) est armé
+    et passé en AUTO en parallèle, confirmé par sa télémétrie, puis attend les
+    autres. Dès que le dernier est prêt, tous envoient MISSION_START en même
+    temps ; chaque résultat donne l'écart d'envoi et d'ACK par rapport au
+    premier drone (skew_ms, ack_skew_ms). Si un drone échoue ou n'est pas prêt
+    dans 'ready_timeout', aucun n'est lancé, ceux encore en préparation
+    s'arrêtent avant l'étape suivante et ceux que la séquence a armés sont
+    désarmés. Si MISSION_START échoue pour un drone alors que d'autres sont
+    déjà lancés, le lancement est partiel : summary() et chaque résultat
+    ("fleet") donnent les drones lancés et ceux en échec. Tous les run()
+    doivent tourner en même temps (jobs soumis avec exclusive=True) : un drone
+    qui ne démarre pas ferait expirer l'attente.
+    """
+
+    def __init__(self, drone_ids: Iterable[Hashable], ready_timeout: float = FLEET_READY_TIMEOUT) -> None:
+        self.drone_ids = list(drone_ids)
+        self.ready_timeout = ready_timeout
+        self._cond = threading.Condition()
+        self._ready: set = set()
+        self._aborted: Optional[str] = None
+        self._launches: Dict[Hashable, Dict[str, Any]] = {}
+        self._launch_errors: Dict[Hashable, str] = {}
+        self._finished: set = set()
+
+    def abort(self, reason: str) -> None:
+        with self._cond:
+            if self._aborted is None:
+                self._aborted = reason
+            self._cond.notify_all()
+
+    def _wait_all(self, drone_id: Hashable, progress) -> None:
+        deadline = time.monotonic() + self.ready_timeout
+        with self._cond:
+            self._ready.add(drone_id)
+            self._cond.notify_all()
+            while len(self._ready) < len(self.drone_ids) and self._aborted is None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    missing = sorted(str(d) for d in self.drone_ids if d not in self._ready)
+                    self._aborted = f"drones non prêts après {self.ready_timeout:g}s : {', '.join(missing)}"
+                    self._cond.notify_all()
+                    break
+                self._cond.wait(min(remaining, 0.2))
+                if progress and len(self._ready) < len(self.drone_ids):
+                    progress({"step": "barrier", "ready": len(self._ready), "total": len(self.drone_ids)})
+            self._check_aborted("barrier")
+
+    def _check_aborted(self, step: str) -> None:
+        reason = self._aborted
+        if reason is not None:
+            raise StartError(step, f"Lancement flotte abandonné ({reason}).")
+
+    def _launched(self, drone_id: Hashable, done: Optional[Dict[str, Any]], error: Optional[str] = None) -> None:
+        with self._cond:
+            if done is not None:
+                self._launches[drone_id] = done
+            else:
+                self._launch_errors[drone_id] = error or "MISSION_START non confirmé"
+            self._finished.add(drone_id)
+            self._cond.notify_all()
+
+    def _wait_launches(self, timeout: float) -> None:
+        """Attend la fin des MISSION_START de tous les drones (au plus 'timeout')."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while len(self._finished) < len(self.drone_ids):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        Bilan du lancement : drones lancés, drones dont MISSION_START a échoué
+        ({id: erreur}) et 'partial' (au moins un lancé et au moins un en échec).
+        """
+        with self._cond:
+            launched = sorted(self._launches, key=str)
+            failed = {str(d): e for d, e in self._launch_errors.items()}
+        return {"launched": launched, "failed": failed, "partial": bool(launched and failed)}
+
+    def _skew(self, drone_id: Hashable) -> Dict[str, float]:
+        """Écarts (ms) du drone par rapport au premier envoi / premier ACK (après _wait_launches)."""
+        with self._cond:
+            sent = {d: l["sent_at"] for d, l in self._launches.items()}
+            acked = {d: l["sent_at"] + l["elapsed_s"] for d, l in self._launches.items()}
+        return {"skew_ms": round((sent[drone_id] - min(sent.values())) * 1000, 1),
+                "ack_skew_ms": round((acked[drone_id] - min(acked.values())) * 1000, 1)}
+
+    def run(
+        self,
+        drone_id: Hashable,
+        master,
+        *,
+        dispatcher=None,
+        io_lock=None,
+        cache=None,
+        progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+    ) -> Dict[str, Any]:
+        """Séquence d'un drone ; à appeler en parallèle pour chaque drone de 'drone_ids'."""
+        t0 = time.monotonic()
+        hb = observed_heartbeat(cache)
+        was_armed = hb is not None and is_armed(hb)
+
+        def _step(info: Dict[str, Any]) -> None:
+            # Flotte abandonnée : l'étape suivante (armement…) n'est pas lancée
+            self._check_aborted("aborted")
+            if progress: progress(info)
 
-    def set_mode(mode_name):
-        mode_id = master.mode_mapping().get(mode_name.upper())
-        if mode_id is None:
-            print(f"Mode {mode_name} inconnu.")
-            return
-        master.mav.set_mode_send(
-            master.target_system,
-            mavutil.mavlink.MAV_MODE_FLAG_CUSTOM_MODE_ENABLED,
-            mode_id
-        )
-        print(f"Mode demandé: {mode_name} (id: {mode_id})")
-
-    # Passer en mode Loiter pour armer
-    set_mode("Loiter")
-    time.sleep(1)
-
-    # Armer
-    master.arducopter_arm()
-    master.motors_armed_wait()
-    print("Drone armé.")
-    time.sleep(1)
-
-    # Passer en mode AUTO
-    set_mode("AUTO")
-    time.sleep(3)
-
-    # Lancer la mission
-    master.mav.command_long_send(
-        master.target_system,
-        master.target_component,
-        mavutil.mavlink.MAV_CMD_MISSION_START,
-        0,   # Confirmation
-        0,   # Première séquence à exécuter
-        0,   # Dernière (0 = tous)
-        0, 0, 0, 0, 0
-    )
-
-    print("Mission lancée.")
-
-    # # Attente de la fin de mission (désarmement)
-    # while True:
-    #     msg = master.recv_match(type='HEARTBEAT', blocking=True)
-    #     if not msg:
-    #         continue
-
-    #     armed = (msg.base_mode & mavutil.mavlink.MAV_MODE_FLAG_SAFETY_ARMED) != 0
-    #     mode = mavutil.mode_string_v10(msg)
-
-    #     print(f"Mode: {mode} | Armé: {armed}")
-
-    #     if not armed:
-    #         print("Drone désarmé, fin de mission détectée.")
-    #         break
-
-    # Notification vers ton backend
-    # try:
-    #     print("Notification envoyée. Code HTTP:")
-    #     # import requests
-    #     # response = requests.post("http://ton-api/mission-finished", json={"status": "done"})
-    #     # print(response.status_code)
-    # except Exception as e:
-    #     print(f"Erreur lors de l’envoi de la notification : {e}")
+        try:
+            steps = prepare(master, dispatcher=dispatcher, io_lock=io_lock, cache=cache, progress=_step)
+            _step({"step": "ready"})
+            steps.append(wait_ready(master, dispatcher=dispatcher, cache=cache))
+            self._wait_all(drone_id, progress)
+        except BaseException as e:
+            self.abort(f"drone {drone_id} : {str(e).rstrip('.')}")
+            # Jamais de désarmement d'un drone qui l'était déjà (peut-être en vol)
+            if not was_armed:
+                disarm(master, dispatcher=dispatcher, io_lock=io_lock)
+            raise
+        try:
+            done = launch(master, dispatcher=dispatcher, io_lock=io_lock)
+        except BaseException as e:
+            self._launched(drone_id, None, str(e))
+            self._wait_launches(MISSION_START_TIMEOUT + 1.0)
+            launched = self.summary()["launched"]
+            if not launched or not isinstance(e, StartError):
+                raise
+            # Les autres drones sont partis : l'erreur le dit, le job aussi
+            raise StartError(e.step, f"{str(e).rstrip('.')} ; lancement partiel, drones lancés : "
+                             f"{', '.join(str(d) for d in launched)}.", result=e.result,
+                             elapsed_s=e.elapsed_s) from e
+        self._launched(drone_id, done)
+        self._wait_launches(MISSION_START_TIMEOUT + 1.0)
+        steps.append(done)
+        return {"steps": steps, "elapsed_s": round(time.monotonic() - t0, 3),
+                **self._skew(drone_id), "fleet": self.summary()}
@@ -1,136 +1,302 @@
-import time, threading
-from typing import Dict, Any, Optional, Hashable
-from pymavlink import mavutil
+import json, math, time, threading
+from array import array
+from typing import Dict, Any, Iterable, List, Optional, Hashable
 
-# Verrou I/O MAVLink partagé (évite les collisions avec d'autres threads, ex: missions)
+# Verrou I/O MAVLink global (legacy, utilisé quand aucun verrou de lien n'est fourni)
 MAVLINK_IO_LOCK = threading.RLock()
 
 # ─────────────────────────────────────────────
-# Cache de télémétrie
+# Registre de verrous I/O par lien (clé = drone_id)
 # ─────────────────────────────────────────────
-class TelemetryCache:
-    def __init__(self) -> None:
-        self._lock = threading.RLock()
-        self._last_heartbeat = None
-        self._last_global_position = None
-        self._last_battery = None
-        self._ts: Dict[str, float] = {}
+_IO_LOCKS: Dict[Hashable, threading.RLock] = {}
+_IO_LOCKS_GUARD = threading.Lock()
 
-    def update_from_msg(self, msg) -> None:
-        with self._lock:
-            now = time.time()
-            t = msg.get_type()
-            self._ts[t] = now
-            if t == "HEARTBEAT":
-                self._last_heartbeat = msg
-            elif t == "GLOBAL_POSITION_INT":
-                self._last_global_position = msg
-            elif t == "BATTERY_STATUS":
-                self._last_battery = msg
+def get_io_lock(key: Optional[Hashable] = None) -> threading.RLock:
+    """
+    Retourne le verrou I/O du lien 'key' (créé au premier appel).
+    Sans clé, retourne le verrou global legacy MAVLINK_IO_LOCK.
+    """
+    if key is None:
+        return MAVLINK_IO_LOCK
+    with _IO_LOCKS_GUARD:
+        lock = _IO_LOCKS.get(key)
+        if lock is None:
+            lock = _IO_LOCKS[key] = threading.RLock()
+        return lock
 
-    def snapshot(self) -> Dict[str, Any]:
-        with self._lock:
-            return {
-                "heartbeat": self._last_heartbeat,
-                "global_position": self._last_global_position,
-                "battery": self._last_battery,
-                "ts": dict(self._ts),
-            }
+def release_io_lock(key: Hashable) -> None:
+    """Oublie le verrou du lien 'key' (à appeler quand le lien est fermé)."""
+    with _IO_LOCKS_GUARD:
+        _IO_LOCKS.pop(key, None)
 
 # ─────────────────────────────────────────────
-# Boucle lecteur
+# Historique de télémétrie (buffer circulaire à colonnes)
 # ─────────────────────────────────────────────
-def telemetry_reader(master, cache: TelemetryCache, stop_event: threading.Event) -> None:
-    # Demande d'un flux de télémétrie
-    try:
-        with MAVLINK_IO_LOCK:
-            master.mav.request_data_stream_send(
-                master.target_system, master.target_component,
-                mavutil.mavlink.MAV_DATA_STREAM_ALL, 2, 1
-            )
-    except Exception:
-        pass
-
-    # Messages "mission" à ne pas consommer ici
-    MISSION_TYPES = {
-        "MISSION_COUNT", "MISSION_REQUEST", "MISSION_REQUEST_INT",
-        "MISSION_ITEM", "MISSION_ITEM_INT", "MISSION_ACK",
-        "MISSION_CLEAR_ALL", "MISSION_SET_CURRENT"
-    }
+HISTORY_FIELDS = ("time", "lat", "lon", "alt", "vx", "vy", "vz", "hdg", "battery")
 
-    while not stop_event.is_set():
-        try:
-            with MAVLINK_IO_LOCK:
-                msg = master.recv_match(blocking=True, timeout=0.5)
-            if msg is None:
-                continue
-            if msg.get_type() in MISSION_TYPES:
-                continue
-            cache.update_from_msg(msg)
-        except Exception:
-            continue
+class TelemetryHistory:
+    """
+    Buffer circulaire de taille fixe : une colonne array('d') préallouée par
+    champ (HISTORY_FIELDS), valeurs déjà converties (deg, m, m/s, %).
+    Les valeurs inconnues sont stockées en NaN et restituées en None.
+    Les lignes arrivent dans l'ordre du temps : les requêtes par plage
+    sont une recherche dichotomique puis une copie de tranches.
+    """
+    def __init__(self, capacity: int = 3600) -> None:
+        self.capacity = max(1, int(capacity))
+        self._cols = {f: array("d", bytes(8 * self.capacity)) for f in HISTORY_FIELDS}
+        self._start = 0   # index physique de la ligne la plus ancienne
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._size
+
+    def append(self, row: Iterable[float]) -> None:
+        """Ajoute une ligne (valeurs dans l'ordre de HISTORY_FIELDS) ; écrase la plus ancienne si plein."""
+        with self._lock:
+            if self._size < self.capacity:
+                i = (self._start + self._size) % self.capacity
+                self._size += 1
+            else:
+                i = self._start
+                self._start = (self._start + 1) % self.capacity
+            for col, v in zip(self._cols.values(), row):
+                col[i] = v
+
+    def _bisect(self, t: float, right: bool) -> int:
+        """Index logique de la première ligne de temps >= t (> t si right)."""
+        times, start, cap = self._cols["time"], self._start, self.capacity
+        lo, hi = 0, self._size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            v = times[(start + mid) % cap]
+            if v < t or (right and v == t):
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def query(
+        self,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        fields: Optional[Iterable[str]] = None,
+        limit: Optional[int] = None,
+    ) -> Dict[str, List[Optional[float]]]:
+        """
+        Colonnes des lignes telles que since <= time <= until (bornes optionnelles).
+        'limit' garde les lignes les plus récentes.
+        """
+        names = [f for f in (fields or HISTORY_FIELDS) if f in self._cols]
+        with self._lock:
+            lo = self._bisect(since, False) if since is not None else 0
+            hi = self._bisect(until, True) if until is not None else self._size
+            if limit is not None and limit >= 0 and hi - lo > limit:
+                lo = hi - limit
+            a = (self._start + lo) % self.capacity
+            n = max(0, hi - lo)
+            segments = [(a, a + n)] if a + n <= self.capacity else [(a, self.capacity), (0, a + n - self.capacity)]
+            out = {}
+            for f in names:
+                col = self._cols[f]
+                vals: List[Optional[float]] = []
+                for s, e in segments:
+                    vals.extend(col[s:e].tolist())
+                out[f] = vals
+        for f, vals in out.items():
+            if f != "time":
+                out[f] = [None if math.isnan(v) else v for v in vals]
+        return out
 
 # ─────────────────────────────────────────────
-# Multi-drones: registre de threads/caches par clé
+# Cache de télémétrie
 # ─────────────────────────────────────────────
-_CACHES: Dict[Hashable, TelemetryCache] = {}
-_STOPS: Dict[Hashable, threading.Event] = {}
-_THREADS: Dict[Hashable, threading.Thread] = {}
-
-# Rétro-compat (si on appelle sans key/cache)
-GLOBAL_CACHE = TelemetryCache()
-_LEGACY_KEY: Hashable = "__legacy__"
-
-def start_telemetry_reader(
-    master,
-    cache: Optional[TelemetryCache] = None,
-    key: Optional[Hashable] = None,
-) -> TelemetryCache:
+# Types conservés par défaut (dernier message de chaque type) ; "*" = tous
+DEFAULT_TELEMETRY_TYPES = (
+    "HEARTBEAT", "GLOBAL_POSITION_INT", "BATTERY_STATUS", "VFR_HUD", "SYS_STATUS",
+    "GPS_RAW_INT", "ATTITUDE", "STATUSTEXT", "MISSION_CURRENT", "EXTENDED_SYS_STATE",
+    "HOME_POSITION", "RC_CHANNELS", "SERVO_OUTPUT_RAW", "NAV_CONTROLLER_OUTPUT",
+)
+
+class TelemetryRecord:
+    """Dernier message d'un type et son heure de réception (immuable une fois publié)."""
+    __slots__ = ("msg", "ts")
+
+    def __init__(self, msg, ts: float) -> None:
+        self.msg = msg
+        self.ts = ts
+
+
+class TelemetrySnapshot:
     """
-    Démarre (ou réutilise) un lecteur de télémétrie pour 'key'.
-    - key: identifiant du drone (ex: drone_id). Si None, on utilise un mode legacy global.
-    - cache: si None, un TelemetryCache est créé (ou GLOBAL_CACHE en legacy).
-    Retourne le cache utilisé.
+    Vue cohérente heartbeat / position / batterie, jamais modifiée après
+    publication : le writer en construit une nouvelle et remplace la référence
+    (seuls flight_doc / flight_json y sont mémorisés, à la première lecture).
+    Accès par attributs, ou par clés ("heartbeat", "global_position",
+    "battery", "ts") pour compatibilité avec l'ancien dict.
     """
-    # Mode legacy (compat)
-    if cache is None and key is None:
-        key = _LEGACY_KEY
-        cache = GLOBAL_CACHE
+    __slots__ = ("heartbeat", "global_position", "battery", "hb_ts", "gp_ts", "batt_ts", "version",
+                 "_flight_doc", "_flight_json")
 
-    # Clé par défaut si non fournie: identifiant unique du master
-    if key is None:
-        key = id(master)
-    if cache is None:
-        cache = TelemetryCache()
-
-    thr = _THREADS.get(key)
-    if thr and thr.is_alive():
-        # déjà lancé → retourne le cache existant
-        return _CACHES[key]
-
-    stop = threading.Event()
-    t = threading.Thread(target=telemetry_reader, args=(master, cache, stop), daemon=True)
-    _CACHES[key] = cache
-    _STOPS[key] = stop
-    _THREADS[key] = t
-    t.start()
-    return cache
-
-def stop_telemetry_reader(key: Hashable) -> None:
-    """Arrête proprement le thread télémétrie pour la clé donnée."""
-    ev = _STOPS.get(key)
-    if ev:
-        ev.set()
-    thr = _THREADS.get(key)
-    if thr and thr.is_alive():
+    def __init__(self, heartbeat=None, global_position=None, battery=None,
+                 hb_ts: float = 0.0, gp_ts: float = 0.0, batt_ts: float = 0.0, version: int = 0) -> None:
+        self.heartbeat = heartbeat
+        self.global_position = global_position
+        self.battery = battery
+        self.hb_ts = hb_ts
+        self.gp_ts = gp_ts
+        self.batt_ts = batt_ts
+        self.version = version
+        # flight_info et son JSON : calculés à la première lecture, pas par le writer
+        self._flight_doc = None
+        self._flight_json = None
+
+    @property
+    def flight_doc(self) -> Optional[Dict[str, Any]]:
+        """
+        flight_info précalculé (sans drone_id ni âge), construit une seule fois
+        par snapshot, à la première lecture. Deux lecteurs simultanés peuvent
+        le calculer chacun : même résultat, l'un remplace l'autre.
+        """
+        doc = self._flight_doc
+        if doc is None and self.heartbeat is not None and self.global_position is not None:
+            doc = self._flight_doc = flight_doc(self.heartbeat, self.global_position, self.battery)
+        return doc
+
+    @property
+    def flight_json(self) -> Optional[bytes]:
+        """JSON encodé de flight_doc, sans accolades, prêt à être complété à la requête."""
+        body = self._flight_json
+        if body is None:
+            doc = self.flight_doc
+            if doc is not None:
+                body = self._flight_json = json.dumps(doc)[1:-1].encode()
+        return body
+
+    @property
+    def ts(self) -> Dict[str, float]:
+        out = {}
+        if self.heartbeat is not None:
+            out["HEARTBEAT"] = self.hb_ts
+        if self.global_position is not None:
+            out["GLOBAL_POSITION_INT"] = self.gp_ts
+        if self.battery is not None:
+            out["BATTERY_STATUS"] = self.batt_ts
+        return out
+
+    def __getitem__(self, key: str):
+        if key in ("heartbeat", "global_position", "battery", "ts"):
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def get(self, key: str, default=None):
         try:
-            thr.join(timeout=2.0)
-        except Exception:
-            pass
-    _CACHES.pop(key, None)
-    _STOPS.pop(key, None)
-    _THREADS.pop(key, None)
-
-def get_cache(key: Hashable) -> Optional[TelemetryCache]:
-    """Récupère le cache de télémétrie associé à 'key' (ou None s'il n'existe pas)."""
-    return _CACHES.get(key)
+            v = self[key]
+        except KeyError:
+            return default
+        return default if v is None else v
+
+
+_EMPTY_SNAPSHOT = TelemetrySnapshot()
+
+def flight_doc(hb, gp, battery=None) -> Dict[str, Any]:
+    """Champs flight_info (unités converties) à partir des derniers HEARTBEAT / GLOBAL_POSITION_INT / BATTERY_STATUS."""
+    vx, vy, vz = gp.vx/100.0, gp.vy/100.0, gp.vz/100.0
+    hdg = getattr(gp, "hdg", None)
+    return {
+        "is_armed": (hb.base_mode & mavutil.mavlink.MAV_MODE_FLAG_SAFETY_ARMED) != 0,
+        "flight_mode": mavutil.mode_string_v10(hb),
+        "latitude": gp.lat / 1e7,
+        "longitude": gp.lon / 1e7,
+        "altitude_m": gp.relative_alt / 1000.0,
+        "horizontal_speed_m_s": round((vx*vx + vy*vy)**0.5, 2),
+        "vertical_speed_m_s": round(vz, 2),
+        "heading_deg": (hdg / 100.0) if hdg is not None else 0.0,
+        "movement_track_deg": (hdg / 100.0) if hdg is not None else None,
+        "battery_remaining_percent": getattr(battery, "battery_remaining", None)
+            if battery is not None else None,
+    }
+
+class TelemetryCache:
+    """
+    Cache du dernier message par type, écrit par le lecteur du lien.
+    Lecture sans verrou : snapshot() et latest() ne font que récupérer une
+    référence vers un objet immuable, remplacé atomiquement par le writer.
+    Seuls les writers (normalement un seul) se sérialisent entre eux.
+    """
+    def __init__(self, history_size: int = 3600, types: Optional[Iterable[str]] = DEFAULT_TELEMETRY_TYPES) -> None:
+        self._wlock = threading.Lock()
+        self._snap: TelemetrySnapshot = _EMPTY_SNAPSHOT
+        # Dernier enregistrement par type autorisé (None = tous les types)
+        self._types = None if types is None or "*" in types else frozenset(t.upper() for t in types)
+        self._records: Dict[str, TelemetryRecord] = {}
+        # Historique (position/vitesse/batterie) ; history_size=0 le désactive
+        self.history: Optional[TelemetryHistory] = TelemetryHistory(history_size) if history_size > 0 else None
+
+    def update_from_msg(self, msg) -> None:
+        now = time.time()
+        t = msg.get_type()
+        with self._wlock:
+            if self._types is None or t in self._types:
+                self._records[t] = TelemetryRecord(msg, now)
+            if t not in ("HEARTBEAT", "GLOBAL_POSITION_INT", "BATTERY_STATUS"):
+                return
+            s = self._snap
+            if t == "HEARTBEAT":
+                snap = TelemetrySnapshot(msg, s.global_position, s.battery, now, s.gp_ts, s.batt_ts, s.version + 1)
+            elif t == "GLOBAL_POSITION_INT":
+                snap = TelemetrySnapshot(s.heartbeat, msg, s.battery, s.hb_ts, now, s.batt_ts, s.version + 1)
+                if self.history is not None:
+                    self.history.append(_history_row(now, msg, s.battery))
+            else:
+                snap = TelemetrySnapshot(s.heartbeat, s.global_position, msg, s.hb_ts, s.gp_ts, now, s.version + 1)
+            self._snap = snap
+
+    def snapshot(self) -> TelemetrySnapshot:
+        """Dernière vue publiée (référence, sans copie ni verrou)."""
+        return self._snap
+
+    def types(self) -> Dict[str, float]:
+        """Types disponibles dans le cache → timestamp de réception du dernier message."""
+        return {t: rec.ts for t, rec in self._records.copy().items()}
+
+    def record(self, msg_type: str) -> Optional[TelemetryRecord]:
+        """Dernier enregistrement brut de 'msg_type' (objet remplacé à chaque nouveau message)."""
+        return self._records.get(msg_type.upper())
+
+    def latest(self, msg_type: str) -> Optional[Dict[str, Any]]:
+        """
+        Derniers champs décodés pour 'msg_type' : {"type", "ts", "fields"},
+        ou None si ce type n'a pas été reçu (ou n'est pas autorisé).
+        La conversion en dict n'a lieu qu'à la lecture.
+        """
+        t = msg_type.upper()
+        rec = self._records.get(t)
+        if rec is None:
+            return None
+        return {"type": t, "ts": rec.ts, "fields": _msg_fields(rec.msg)}
+
+def _msg_fields(msg) -> Dict[str, Any]:
+    """Champs d'un message pymavlink, sérialisables en JSON."""
+    out = {}
+    for k, v in msg.to_dict().items():
+        if k == "mavpackettype":
+            continue
+        if isinstance(v, (bytes, bytearray)):
+            v = v.decode("utf-8", errors="replace").rstrip("\x00")
+        elif isinstance(v, float) and math.isnan(v):
+            v = None
+        out[k] = v
+    return out
+
+def _history_row(now: float, gp, battery) -> tuple:
+    hdg = getattr(gp, "hdg", 65535)
+    batt = getattr(battery, "battery_remaining", -1) if battery is not None else -1
+    return (
+        now,
+        gp.lat / 1e7, gp.lon / 1e7, gp.relative_alt / 1000.0,
+        gp.vx / 100.0, gp.vy / 100.0, gp.vz / 100.0,
+        hdg / 100.0 if hdg != 65535 else math.nan,
+        float(batt) if batt is not None and batt >= 0 else math.nan,
+    )
@@ -0,0 +1,77 @@
+import json, time
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+from telemetry import TelemetryCache
+
+# ─────────────────────────────────────────────
+# Flux Server-Sent Events depuis les caches télémétrie
+# ─────────────────────────────────────────────
+_MISSING = object()
+
+def sse_event(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def telemetry_events(
+    caches: Dict[Any, TelemetryCache],
+    rate_hz: float = 2.0,
+    fields: Optional[Iterable[str]] = None,
+    types: Optional[Iterable[str]] = None,
+    stale_after: float = 2.0,
+    keepalive: float = 15.0,
+) -> Iterator[str]:
+    """
+    Générateur SSE pour un client. À chaque tick (1/rate_hz) :
+      - event "flight_info" : champs flight_info modifiés depuis le dernier envoi
+        (premier envoi complet), plus "stale" quand il change
+      - event "telemetry"   : derniers champs des types demandés ('types'),
+        seulement si un nouveau message est arrivé
+    Le client ne lit que des snapshots : rien n'est mis en file côté ingestion,
+    les messages intermédiaires d'un client lent sont simplement fusionnés.
+    """
+    period = 1.0 / rate_hz
+    keep = set(fields) if fields else None
+    wanted = [t.upper() for t in types] if types else []
+    last_version: Dict[Any, int] = {}
+    last_doc: Dict[Any, Dict[str, Any]] = {}
+    last_stale: Dict[Any, bool] = {}
+    last_rec: Dict[Any, Any] = {}
+    last_sent = time.monotonic()
+
+    yield "retry: 2000\n\n"
+    while True:
+        tick = time.monotonic()
+        now = time.time()
+        out = []
+        for did, cache in caches.items():
+            snap = cache.snapshot()
+            doc = snap.flight_doc
+            if doc is not None:
+                delta = {}
+                if snap.version != last_version.get(did):
+                    last_version[did] = snap.version
+                    prev = last_doc.get(did, {})
+                    delta = {k: v for k, v in doc.items()
+                             if (keep is None or k in keep) and prev.get(k, _MISSING) != v}
+                    last_doc[did] = doc
+                stale = (now - snap.gp_ts > stale_after) or (now - snap.hb_ts > stale_after)
+                if stale != last_stale.get(did):
+                    last_stale[did] = stale
+                    delta["stale"] = stale
+                if delta:
+                    out.append(sse_event("flight_info", {"drone_id": str(did), **delta}))
+            for t in wanted:
+                rec = cache.record(t)
+                if rec is None or last_rec.get((did, t)) is rec:
+                    continue
+                last_rec[(did, t)] = rec
+                data = cache.latest(t)
+                out.append(sse_event("telemetry", {"drone_id": str(did), **data}))
+
+        if out:
+            last_sent = tick
+            yield "".join(out)
+        elif tick - last_sent >= keepalive:
+            last_sent = tick
+            yield ": keepalive\n\n"
+        time.sleep(max(0.0, period - (time.monotonic() - tick)))
@@ -0,0 +1,91 @@
+"""
+Benchmark flotte : N liens UDP simulés lus par
+  - "thread"  : un MavlinkDispatcher (thread) par drone
+  - "asyncio" : une seule boucle AsyncLinkEngine
+
+Un processus séparé émet HEARTBEAT + GLOBAL_POSITION_INT à RATE Hz vers
+chaque lien ; on mesure le CPU consommé par le processus lecteur.
+
+Usage : python test/bench_async_links.py [n_liens] [durée_s] [rate_hz]
+"""
+import os, sys, time, socket, multiprocessing
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from pymavlink import mavutil
+from telemetry import TelemetryCache
+from dispatcher import MavlinkDispatcher
+from async_link import AsyncLinkEngine
+
+BASE_PORT = 21000
+
+
+def _sender(n: int, rate: float, stop) -> None:
+    mav = mavutil.mavlink.MAVLink(None, srcSystem=1, srcComponent=1)
+    frames = [
+        mav.heartbeat_encode(2, 3, 0, 0, 4).pack(mav),
+        mav.global_position_int_encode(0, 488566000, 23522000, 35000, 10000, 100, 50, -10, 9000).pack(mav),
+    ]
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    period = 1.0 / rate
+    nxt = time.monotonic()
+    while not stop.is_set():
+        for i in range(n):
+            for f in frames:
+                sock.sendto(f, ("127.0.0.1", BASE_PORT + i))
+        nxt += period
+        time.sleep(max(0.0, nxt - time.monotonic()))
+
+
+def run(mode: str, n: int, duration: float, rate: float) -> dict:
+    masters = [mavutil.mavlink_connection(f"udpin:127.0.0.1:{BASE_PORT + i}") for i in range(n)]
+    caches = [TelemetryCache() for _ in range(n)]
+    count = [0]
+
+    def _count(msg) -> None:
+        count[0] += 1
+
+    engine = AsyncLinkEngine().start() if mode == "asyncio" else None
+    links = []
+    for i, (m, c) in enumerate(zip(masters, caches)):
+        if engine is not None:
+            links.append(engine.add_link(i, m, sinks=[c.update_from_msg, _count], request_stream=False))
+        else:
+            d = MavlinkDispatcher(m)
+            d.add_sink(c.update_from_msg)
+            d.add_sink(_count)
+            links.append(d.start(request_stream=False))
+
+    stop = multiprocessing.Event()
+    tx = multiprocessing.Process(target=_sender, args=(n, rate, stop), daemon=True)
+    tx.start()
+    time.sleep(1.0)  # chauffe
+
+    cpu0, wall0, frames0 = time.process_time(), time.monotonic(), count[0]
+    time.sleep(duration)
+    cpu = time.process_time() - cpu0
+    wall = time.monotonic() - wall0
+    frames = count[0] - frames0
+    live = sum(1 for c in caches if c.snapshot().global_position is not None)
+
+    stop.set()
+    tx.join(timeout=2.0)
+    if engine is not None:
+        engine.stop()
+    else:
+        for d in links:
+            d.stop_event.set()
+        for d in links:
+            d.stop(timeout=1.0)
+    for m in masters:
+        m.close()
+    return {"cpu_pct": 100.0 * cpu / wall, "live": live, "frames_per_s": frames / wall}
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    duration = float(sys.argv[2]) if len(sys.argv) > 2 else 5.0
+    rate = float(sys.argv[3]) if len(sys.argv) > 3 else 4.0
+    print(f"{n} liens, {rate:.0f} Hz x 2 messages, {duration:.0f} s")
+    for mode in ("thread", "asyncio"):
+        r = run(mode, n, duration, rate)
+        print(f"{mode:>8} : CPU {r['cpu_pct']:5.1f} %  ({r['live']}/{n} liens actifs, {r['frames_per_s']:.0f} trames/s)")
@@ -0,0 +1,106 @@
+"""
+Microbenchmark contention lecteurs/écrivain sur le cache télémétrie.
+
+  - "avant"  : cache à RLock (snapshot() prend le verrou et copie le dict ts)
+  - "après"  : TelemetryCache copy-on-write (snapshot() = lecture d'une référence)
+
+Un thread écrivain pousse des messages aussi vite que possible (comme le
+lecteur du lien) pendant que N threads "HTTP" appellent snapshot() en boucle.
+On mesure le débit d'ingestion, le débit de lecture et la latence p99
+d'un update_from_msg.
+
+Usage : python test/bench_cache_contention.py [n_lecteurs] [durée_s]
+"""
+import os, sys, time, threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from pymavlink import mavutil
+from telemetry import TelemetryCache
+
+
+class _LockedCache:
+    """Reproduction du cache d'origine (RLock partagé lecteur/écrivain)."""
+    def __init__(self) -> None:
+        self._lock = threading.RLock()
+        self._last_heartbeat = None
+        self._last_global_position = None
+        self._last_battery = None
+        self._ts = {}
+
+    def update_from_msg(self, msg) -> None:
+        with self._lock:
+            now = time.time()
+            t = msg.get_type()
+            self._ts[t] = now
+            if t == "HEARTBEAT":
+                self._last_heartbeat = msg
+            elif t == "GLOBAL_POSITION_INT":
+                self._last_global_position = msg
+            elif t == "BATTERY_STATUS":
+                self._last_battery = msg
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "heartbeat": self._last_heartbeat,
+                "global_position": self._last_global_position,
+                "battery": self._last_battery,
+                "ts": dict(self._ts),
+            }
+
+
+def _messages():
+    mav = mavutil.mavlink.MAVLink(None)
+    return [
+        mav.heartbeat_encode(2, 3, 0, 0, 4),
+        mav.global_position_int_encode(0, 488566000, 23522000, 35000, 10000, 100, 50, -10, 9000),
+        mav.vfr_hud_encode(5.0, 5.0, 90, 50, 35.0, -0.1),
+        mav.attitude_encode(0, 0.1, 0.0, 1.5, 0, 0, 0),
+    ]
+
+
+def run(cache, n_readers: int, duration: float) -> dict:
+    msgs = _messages()
+    stop = threading.Event()
+    reads = [0] * n_readers
+    lat = []
+
+    def writer() -> None:
+        i = 0
+        while not stop.is_set():
+            t0 = time.perf_counter()
+            cache.update_from_msg(msgs[i & 3])
+            lat.append(time.perf_counter() - t0)
+            i += 1
+
+    def reader(k: int) -> None:
+        n = 0
+        while not stop.is_set():
+            cache.snapshot()
+            n += 1
+        reads[k] = n
+
+    threads = [threading.Thread(target=writer)] + [threading.Thread(target=reader, args=(k,)) for k in range(n_readers)]
+    for t in threads:
+        t.start()
+    time.sleep(duration)
+    stop.set()
+    for t in threads:
+        t.join()
+    lat.sort()
+    return {
+        "writes_s": len(lat) / duration,
+        "reads_s": sum(reads) / duration,
+        "p99_us": lat[int(len(lat) * 0.99)] * 1e6 if lat else 0.0,
+        "max_us": lat[-1] * 1e6 if lat else 0.0,
+    }
+
+
+if __name__ == "__main__":
+    n_readers = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    duration = float(sys.argv[2]) if len(sys.argv) > 2 else 3.0
+    print(f"1 écrivain, {n_readers} lecteurs, {duration:.0f} s")
+    for name, cache in (("avant", _LockedCache()), ("après", TelemetryCache(history_size=0))):
+        r = run(cache, n_readers, duration)
+        print(f"{name:>6} : {r['writes_s']:>9.0f} écritures/s  {r['reads_s']:>10.0f} lectures/s"
+              f"  update p99 {r['p99_us']:7.1f} µs  max {r['max_us']:8.1f} µs")
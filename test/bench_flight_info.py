@@ -0,0 +1,42 @@
+"""
+Coût CPU par requête flight_info :
+  - "avant" : conversion depuis les messages bruts + sérialisation JSON à chaque appel
+  - "après" : build_flight_info_json (document pré-encodé par le cache)
+
+Usage : python test/bench_flight_info.py [n_requêtes]
+"""
+import os, sys, json, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from pymavlink import mavutil
+from telemetry import TelemetryCache, flight_doc
+from get_flight_info import build_flight_info_json
+
+
+def _legacy(drone_id, cache, stale_after=2.0):
+    """Chemin d'origine : tout est recalculé depuis les messages du snapshot."""
+    snap = cache.snapshot()
+    now = time.time()
+    age_pos = now - snap.gp_ts
+    age_hb = now - snap.hb_ts
+    out = {"drone_id": str(drone_id)}
+    out.update(flight_doc(snap.heartbeat, snap.global_position, snap.battery))
+    out["stale"] = (age_pos > stale_after) or (age_hb > stale_after)
+    out["age_sec"] = {"position": round(age_pos, 3), "heartbeat": round(age_hb, 3)}
+    return json.dumps(out, sort_keys=True).encode()
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    mav = mavutil.mavlink.MAVLink(None)
+    cache = TelemetryCache(history_size=0)
+    cache.update_from_msg(mav.heartbeat_encode(2, 3, 217, 3, 4))
+    cache.update_from_msg(mav.global_position_int_encode(0, 488566000, 23522000, 35000, 10000, 100, 50, -10, 9000))
+    cache.update_from_msg(mav.battery_status_encode(0, 0, 0, 2500, [3800] * 10, 1500, -1, -1, 76))
+
+    for name, fn in (("avant", _legacy), ("après", lambda d, c: build_flight_info_json(d, c)[0])):
+        t0 = time.process_time()
+        for _ in range(n):
+            fn(2, cache)
+        dt = time.process_time() - t0
+        print(f"{name:>6} : {dt / n * 1e6:6.2f} µs CPU / requête")
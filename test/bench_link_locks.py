@@ -0,0 +1,78 @@
+"""
+Benchmark débit télémétrie multi-drones : verrou global vs verrous par lien.
+
+Chaque "lien" simulé bloque ~2 ms par trame dans recv_match (comme un
+socket qui attend la trame suivante), en relâchant le GIL.
+Avec MAVLINK_IO_LOCK, les lecteurs passent à tour de rôle ; avec un
+verrou par drone, ils lisent en parallèle. Les lecteurs reproduisent
+l'ancienne boucle (recv_match sous io_lock) ; l'API lit désormais chaque
+lien sans verrou (dispatcher / engine asyncio).
+
+Usage : python test/bench_link_locks.py [durée_s]
+"""
+import os, sys, time, threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from telemetry import MAVLINK_IO_LOCK, get_io_lock, release_io_lock
+
+FRAME_DELAY = 0.002
+
+
+class _FakeMsg:
+    def __init__(self, t: str) -> None:
+        self._t = t
+
+    def get_type(self) -> str:
+        return self._t
+
+
+class _FakeMaster:
+    """Lien simulé : une trame GLOBAL_POSITION_INT toutes les FRAME_DELAY secondes."""
+    target_system = 1
+    target_component = 1
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.mav = self
+
+    def request_data_stream_send(self, *args) -> None:
+        pass
+
+    def recv_match(self, blocking=True, timeout=None):
+        time.sleep(FRAME_DELAY)
+        self.count += 1
+        return _FakeMsg("GLOBAL_POSITION_INT")
+
+
+def _locked_reader(master, stop: threading.Event, lock) -> None:
+    while not stop.is_set():
+        with lock:
+            master.recv_match(blocking=True, timeout=0.5)
+
+
+def run(n_drones: int, per_link: bool, duration: float) -> float:
+    masters = [_FakeMaster() for _ in range(n_drones)]
+    stop = threading.Event()
+    threads = []
+    for i, m in enumerate(masters):
+        lock = get_io_lock(("bench", i)) if per_link else MAVLINK_IO_LOCK
+        t = threading.Thread(target=_locked_reader, args=(m, stop, lock), daemon=True)
+        threads.append(t)
+    for t in threads:
+        t.start()
+    time.sleep(duration)
+    stop.set()
+    for t in threads:
+        t.join(timeout=2.0)
+    for i in range(n_drones):
+        release_io_lock(("bench", i))
+    return sum(m.count for m in masters) / duration
+
+
+if __name__ == "__main__":
+    duration = float(sys.argv[1]) if len(sys.argv) > 1 else 2.0
+    print(f"{'drones':>6} | {'global (msg/s)':>14} | {'par lien (msg/s)':>16} | gain")
+    for n in (1, 2, 4, 8, 16):
+        g = run(n, per_link=False, duration=duration)
+        p = run(n, per_link=True, duration=duration)
+        print(f"{n:>6} | {g:>14.0f} | {p:>16.0f} | x{p / g:.1f}")
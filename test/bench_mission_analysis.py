@@ -0,0 +1,46 @@
+"""
+Durée de analyze_mission (segments, durée, altitudes, geofence polygone + rayon)
+sur une grande mission, comparée à une boucle Python équivalente (haversine
+seul, sans geofence).
+
+Usage : python test/bench_mission_analysis.py [n_items] [n_sommets_polygone]
+"""
+import math, os, sys, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from mission import Mission
+from mission_geometry import EARTH_RADIUS_M, analyze_mission
+
+
+def _python_length(mission):
+    total = 0.0
+    lat, lon = mission.lat, mission.lon
+    for i in range(1, len(mission)):
+        p1, p2 = math.radians(lat[i - 1]), math.radians(lat[i])
+        a = math.sin((p2 - p1) / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(math.radians(lon[i] - lon[i - 1]) / 2) ** 2
+        total += 2 * EARTH_RADIUS_M * math.asin(math.sqrt(min(a, 1.0)))
+    return total
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    n_poly = int(sys.argv[2]) if len(sys.argv) > 2 else 32
+    mission = Mission.from_dicts(
+        {"frame": 3, "command": 16, "lat": 48.85 + (i // 100) * 1e-4, "lon": 2.35 + (i % 100) * 1e-4, "alt": 30 + i % 40}
+        for i in range(n)
+    )
+    polygon = [[48.85 + 0.2 * math.cos(2 * math.pi * k / n_poly), 2.35 + 0.2 * math.sin(2 * math.pi * k / n_poly)]
+               for k in range(n_poly)]
+    fence = {"polygon": polygon, "radius_m": 20000, "max_alt_m": 60}
+
+    for name, fn in (
+        ("boucle Python (longueur seule)", lambda: _python_length(mission)),
+        ("analyze_mission (sans geofence)", lambda: analyze_mission(mission)),
+        (f"analyze_mission (geofence {n_poly} sommets)", lambda: analyze_mission(mission, geofence=fence)),
+    ):
+        best = float("inf")
+        for _ in range(5):
+            t0 = time.perf_counter()
+            fn()
+            best = min(best, time.perf_counter() - t0)
+        print(f"{name:>40} : {best * 1000:7.2f} ms ({n} items)")
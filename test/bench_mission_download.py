@@ -0,0 +1,81 @@
+"""
+Durée de download d'une mission sur un lien dégradé (autopilote simulé) :
+  - "avant" : algorithme d'origine (une requête à la fois, timeout fixe de 2 s,
+    requête float de secours après chaque timeout INT)
+  - "après" : download_mission (fenêtre de requêtes, items hors ordre gardés,
+    INT/float appris par lien, RTO adaptatif)
+Mesuré avec un autopilote qui répond en INT et avec un autopilote ancien
+qui ignore MISSION_REQUEST_INT (--no-int).
+
+Usage : python test/bench_mission_download.py [n_items] [perte] [latence_s] [--no-int]
+"""
+import os, sys, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.dirname(__file__))
+from pymavlink import mavutil
+from sim_autopilot import SimAutopilot
+from dispatcher import MavlinkDispatcher
+from mission_tool import MISSION_MSG_TYPES, download_mission
+
+
+def _legacy_download(master, dispatcher, timeout=2.0, retries=3):
+    """Chemin d'origine, condensé (mêmes timeouts, même repli float)."""
+    ts, tc = master.target_system, master.target_component
+    with dispatcher.io_lock, dispatcher.subscribe(MISSION_MSG_TYPES, maxsize=512) as chan:
+        for _ in range(retries):
+            master.mav.mission_request_list_send(ts, tc)
+            count_msg = chan.recv_match(type='MISSION_COUNT', blocking=True, timeout=timeout)
+            if count_msg:
+                break
+        if not count_msg:
+            raise RuntimeError("MISSION_COUNT non reçu (timeout).")
+        items = []
+        for i in range(int(count_msg.count)):
+            for _ in range(retries):
+                master.mav.mission_request_int_send(ts, tc, i)
+                msg = chan.recv_match(type=['MISSION_ITEM_INT', 'MISSION_ITEM'], blocking=True, timeout=timeout)
+                if msg is None:
+                    master.mav.mission_request_send(ts, tc, i)
+                    msg = chan.recv_match(type=['MISSION_ITEM', 'MISSION_ITEM_INT'], blocking=True, timeout=timeout)
+                if msg is not None and int(msg.seq) == i:
+                    items.append(msg)
+                    break
+            else:
+                raise RuntimeError(f"Item {i}: pas de réponse MISSION_ITEM(_INT).")
+        master.mav.mission_ack_send(ts, tc, mavutil.mavlink.MAV_MISSION_ACCEPTED, 0)
+    return items
+
+
+if __name__ == "__main__":
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    n = int(args[0]) if len(args) > 0 else 100
+    loss = float(args[1]) if len(args) > 1 else 0.05
+    latency = float(args[2]) if len(args) > 2 else 0.02
+    mission_int = "--no-int" not in sys.argv
+
+    print(f"{n} items, perte {loss:.0%} (dans chaque sens), latence {latency * 1000:.0f} ms, "
+          f"autopilote {'INT' if mission_int else 'float uniquement'}")
+    port = 14900
+    for name, fn in (
+        ("avant", _legacy_download),
+        ("après", lambda m, d: download_mission(m, dispatcher=d)),
+    ):
+        port += 1
+        master = mavutil.mavlink_connection(f"udpin:127.0.0.1:{port}")
+        sim = SimAutopilot(port, loss=loss, latency=latency, mission_int=mission_int, seed=0)
+        sim.items = [sim.mav.mission_item_int_encode(255, 0, i, 3, 16, 0, 1, 0, 0, 0, 0,
+                                                     488500000 + i * 1000, 23500000 + i * 1000, 30.0)
+                     for i in range(n)]
+        master.wait_heartbeat(timeout=5)
+        disp = MavlinkDispatcher(master).start(request_stream=False)
+        t0 = time.monotonic()
+        try:
+            got = len(fn(master, disp))
+            ok = "ok" if got == n else f"{got}/{n} items"
+        except RuntimeError as e:
+            ok = f"échec ({e})"
+        print(f"{name:>6} : {time.monotonic() - t0:6.2f} s  {ok}")
+        sim.stop()
+        disp.stop()
+        master.close()
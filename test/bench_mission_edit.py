@@ -0,0 +1,75 @@
+"""
+Retouche en masse d'une mission (k waypoints modifiés) :
+  - "avant" : un modify_mission par waypoint (k lectures + k réécritures complètes)
+  - "lot"   : edit_mission, toutes les modifications en une passe, une écriture atomique
+Vérifie aussi qu'un lecteur concurrent ne voit jamais de fichier partiel.
+
+Usage : python test/bench_mission_edit.py [n_items] [k_modifs]
+"""
+import contextlib, io, os, sys, tempfile, threading, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from mission import Mission, WPL_HEADER
+from mission_tool import edit_mission, modify_mission
+
+
+def _legacy_modify(path, seq, fields):
+    """Chemin d'origine : lecture ligne à ligne, réécriture complète sur place."""
+    with open(path) as f:
+        lines = f.readlines()
+    for i, line in enumerate(lines[1:], start=1):
+        parts = line.strip().split("\t")
+        if int(parts[0]) == seq:
+            parts[8], parts[9] = f"{fields['lat']:.8f}", f"{fields['lon']:.8f}"
+            lines[i] = "\t".join(parts) + "\n"
+    with open(path, "w") as f:
+        f.writelines(lines)
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    k = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    updates = [{"seq": s, "fields": {"lat": 48.9 + s * 1e-6, "lon": 2.4}} for s in range(0, n, max(n // k, 1))][:k]
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, "edit.waypoints")
+        base = Mission.from_dicts({"frame": 3, "command": 16, "lat": 48.85 + i * 1e-5, "lon": 2.35, "alt": 30.0}
+                                  for i in range(n))
+        print(f"{n} items, {k} waypoints modifiés")
+
+        base.save(path)
+        t0 = time.perf_counter()
+        for u in updates:
+            _legacy_modify(path, u["seq"], u["fields"])
+        print(f"   avant : {(time.perf_counter() - t0) * 1000:8.1f} ms")
+
+        base.save(path)
+        t0 = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            for u in updates:
+                modify_mission(path, u["seq"], u["fields"])
+        print(f"  modify : {(time.perf_counter() - t0) * 1000:8.1f} ms  (un appel par waypoint)")
+
+        base.save(path)
+        t0 = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            edit_mission(path, updates=updates)
+        print(f"     lot : {(time.perf_counter() - t0) * 1000:8.1f} ms")
+
+        # Lecteur concurrent pendant des écritures en boucle
+        stop, partial = threading.Event(), [0]
+
+        def _reader():
+            while not stop.is_set():
+                with open(path) as f:
+                    text = f.read()
+                if not text.startswith(WPL_HEADER) or text.count("\n") != n + 1:
+                    partial[0] += 1
+
+        t = threading.Thread(target=_reader)
+        t.start()
+        with contextlib.redirect_stdout(io.StringIO()):
+            for _ in range(20):
+                edit_mission(path, updates=updates)
+        stop.set()
+        t.join()
+        print(f"  lectures partielles pendant 20 écritures : {partial[0]}")
@@ -0,0 +1,67 @@
+"""
+Coût de GET /missions sur un dossier de plusieurs milliers de fichiers :
+  - "avant"  : parcours du dossier, os.stat de chaque fichier, tri complet, limit
+  - "froid"  : premier list_missions_page (construction de l'index SQLite)
+  - "chaud"  : list_missions_page suivants (dossier inchangé : une requête indexée)
+  - "modif"  : après création d'un fichier (un dossier relu)
+Vérifie aussi que la pagination par curseur parcourt tous les fichiers.
+
+Usage : python test/bench_mission_index.py [n_fichiers] [limit]
+"""
+import contextlib, io, os, sys, tempfile, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from mission import Mission
+from mission_tool import list_missions_page
+
+
+def _legacy_list(root, limit):
+    """Chemin d'origine : scandir + stat + tri complet."""
+    files = []
+    for entry in os.scandir(root):
+        if entry.is_file() and entry.name.endswith(".waypoints") and not entry.name.upper().startswith("DEFAULT"):
+            st = os.stat(entry.path)
+            files.append({"name": entry.name, "size_bytes": st.st_size, "mtime": st.st_mtime})
+    files.sort(key=lambda x: x["mtime"], reverse=True)
+    return files[:limit]
+
+
+def _best(fn, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    limit = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    with tempfile.TemporaryDirectory() as root:
+        for i in range(n):
+            Mission.from_dicts(
+                {"frame": 3, "command": 16, "lat": 48.85 + i * 1e-4 + k * 1e-5, "lon": 2.35, "alt": 30.0}
+                for k in range(10)
+            ).save(os.path.join(root, f"m{i:05d}.waypoints"), sidecar=False)
+
+        page = lambda **kw: list_missions_page(base_dir=root, limit=limit, **kw)
+        print(f"{n} fichiers, limit={limit}")
+        print(f"  avant : {_best(lambda: _legacy_list(root, limit)) * 1000:8.1f} ms")
+        t0 = time.perf_counter()
+        page()
+        print(f"  froid : {(time.perf_counter() - t0) * 1000:8.1f} ms")
+        print(f"  chaud : {_best(page) * 1000:8.1f} ms")
+        with contextlib.redirect_stdout(io.StringIO()):
+            Mission.from_dicts([{"lat": 1.0, "lon": 1.0}]).save(os.path.join(root, "new.waypoints"))
+        t0 = time.perf_counter()
+        files, _ = page()
+        print(f"  modif : {(time.perf_counter() - t0) * 1000:8.1f} ms  (premier : {files[0]['name']})")
+
+        seen, cursor = [], None
+        while True:
+            files, cursor = list_missions_page(base_dir=root, sort="name", order="asc", limit=500, cursor=cursor)
+            seen += [f["name"] for f in files]
+            if cursor is None:
+                break
+        print(f"  pagination : {len(seen)} fichiers, {'ok' if seen == sorted(set(seen)) and len(seen) == n + 1 else 'ERREUR'}")
@@ -0,0 +1,91 @@
+"""
+Coût de chargement + encodage MAVLink d'une grande mission .waypoints :
+  - "avant"   : split("\\t") + un dict par item, puis un encode par dict
+  - "parse"   : Mission.parse (colonnes array) + int_fields
+  - "sidecar" : Mission.load depuis le sidecar binaire (cache mémoire vidé)
+  - "cache"   : Mission.load, fichier inchangé (cache par mtime et par cible)
+"encodage" : travail fait avant le transfert. Depuis int_fields, chaque
+MISSION_ITEM_INT est construit à l'envoi (~quelques µs par item, recouvert
+par le RTT du lien) : un message n'est jamais partagé entre deux liens.
+
+Usage : python test/bench_mission_parse.py [n_items]
+"""
+import os, sys, tempfile, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from pymavlink import mavutil
+import mission as mission_mod
+from mission import Mission
+
+
+def _legacy_parse(path):
+    """Chemin d'origine : parse ligne à ligne, un dict par item."""
+    with open(path, "r") as f:
+        lines = f.readlines()
+    waypoints = []
+    for line in lines[1:]:
+        parts = line.strip().split("\t")
+        if len(parts) != 12:
+            continue
+        waypoints.append({
+            "seq": int(parts[0]), "current": int(parts[1]), "frame": int(parts[2]), "command": int(parts[3]),
+            "param1": float(parts[4]), "param2": float(parts[5]), "param3": float(parts[6]), "param4": float(parts[7]),
+            "lat": float(parts[8]), "lon": float(parts[9]), "alt": float(parts[10]), "autoContinue": int(parts[11]),
+        })
+    return waypoints
+
+
+def _legacy_encode(waypoints, mav):
+    return [
+        mav.mission_item_int_encode(1, 1, wp["seq"], wp["frame"], wp["command"], wp["current"], wp["autoContinue"],
+                                    wp["param1"], wp["param2"], wp["param3"], wp["param4"],
+                                    int(wp["lat"] * 1e7), int(wp["lon"] * 1e7), wp["alt"])
+        for wp in waypoints
+    ]
+
+
+def _timed(load, encode, repeat=3):
+    """Meilleur temps (chargement, encodage) sur 'repeat' essais."""
+    best_load = best_enc = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        obj = load()
+        t1 = time.perf_counter()
+        encode(obj)
+        t2 = time.perf_counter()
+        best_load, best_enc = min(best_load, t1 - t0), min(best_enc, t2 - t1)
+    return best_load, best_enc
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    mav = mavutil.mavlink.MAVLink(None)
+    m = Mission.from_dicts(
+        {"frame": 3, "command": 16, "lat": 48.85 + i * 1e-5, "lon": 2.35 + i * 1e-5, "alt": 30.0} for i in range(n)
+    )
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, "bench.waypoints")
+        m.save(path)
+
+        def _parse():
+            with open(path) as f:
+                return Mission.parse(f.read())
+
+        def _sidecar():
+            mission_mod._LOAD_CACHE.clear()
+            return Mission.load(path)
+
+        def _encode(mission):
+            mission._touch()  # encodage refait à chaque essai
+            mission.int_fields(1, 1)
+
+        Mission.load(path)
+        print(f"{n} items            chargement   encodage")
+        for name, load, encode in (
+            ("avant", lambda: _legacy_parse(path), lambda wps: _legacy_encode(wps, mav)),
+            ("parse", _parse, _encode),
+            ("sidecar", _sidecar, _encode),
+            ("cache", lambda: Mission.load(path), lambda mission: mission.int_fields(1, 1)),
+        ):
+            t_load, t_enc = _timed(load, encode)
+            print(f"{name:>8} : {t_load * 1000:14.1f} ms {t_enc * 1000:8.1f} ms")
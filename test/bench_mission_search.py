@@ -0,0 +1,70 @@
+"""
+Recherche spatiale sur plusieurs milliers de missions (index R-tree de mission_index) :
+  - "avant" : chargement de chaque mission + test de tous ses segments
+  - "bbox"  : search_missions(bbox=...)
+  - "near"  : search_missions(near=[lat, lon, 2 km])
+Les deux chemins doivent trouver les mêmes missions ; objectif < 10 ms par requête.
+
+Usage : python test/bench_mission_search.py [n_fichiers] [items_par_mission]
+"""
+import os, random, sys, tempfile, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+import numpy as np
+from mission import Mission
+from mission_geometry import EARTH_RADIUS_M
+from mission_tool import list_missions, search_missions
+
+
+def _legacy_near(root, lat, lon, radius_m):
+    """Sans index : chaque mission est chargée et ses segments comparés au point."""
+    ky = EARTH_RADIUS_M * np.pi / 180.0
+    kx = ky * np.cos(np.radians(lat))
+    found = set()
+    for name in os.listdir(root):
+        if not name.endswith(".waypoints"):
+            continue
+        m = Mission.load(os.path.join(root, name), sidecar=False)
+        x = (np.frombuffer(m.lon, dtype=np.float64) - lon) * kx
+        y = (np.frombuffer(m.lat, dtype=np.float64) - lat) * ky
+        ax, ay, dx, dy = x[:-1], y[:-1], np.diff(x), np.diff(y)
+        t = np.clip(-(ax * dx + ay * dy) / np.maximum(dx * dx + dy * dy, 1e-12), 0.0, 1.0)
+        if np.hypot(ax + t * dx, ay + t * dy).min() <= radius_m:
+            found.add(name)
+    return found
+
+
+def _best(fn, repeat=5):
+    best, out = float("inf"), None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, out
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 3000
+    items = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as root:
+        # Missions : marches aléatoires dispersées sur ~1° autour de Paris
+        for i in range(n):
+            lat, lon, pts = 48.4 + rng.random(), 1.9 + rng.random(), []
+            for _ in range(items):
+                lat, lon = lat + rng.uniform(-5e-4, 5e-4), lon + rng.uniform(-5e-4, 5e-4)
+                pts.append({"frame": 3, "command": 16, "lat": lat, "lon": lon, "alt": 30.0})
+            Mission.from_dicts(pts).save(os.path.join(root, f"m{i:05d}.waypoints"), sidecar=False)
+
+        t0 = time.perf_counter()
+        list_missions(base_dir=root, limit=1)
+        print(f"{n} missions × {items} items, index construit en {time.perf_counter() - t0:.1f} s")
+
+        near = [48.9, 2.4, 2000.0]
+        t_old, old = _best(lambda: _legacy_near(root, *near), repeat=1)
+        t_near, res = _best(lambda: search_missions(base_dir=root, near=near))
+        t_bbox, box = _best(lambda: search_missions(base_dir=root, bbox=[48.88, 2.38, 48.92, 2.42]))
+        same = "ok" if {f["name"] for f in res} == old else "DIFFÉRENT"
+        print(f"  avant : {t_old * 1000:8.1f} ms  {len(old)} missions")
+        print(f"   near : {t_near * 1000:8.1f} ms  {len(res)} missions ({same})")
+        print(f"   bbox : {t_bbox * 1000:8.1f} ms  {len(box)} missions")
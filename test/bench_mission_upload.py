@@ -0,0 +1,95 @@
+"""
+Durée d'upload d'une mission sur un lien dégradé (autopilote simulé) :
+  - "avant" : algorithme d'origine (timeout fixe de 2 s, COUNT renvoyé sur
+    silence, pauses fixes, set_current envoyé deux fois)
+  - "après" : send_mission (items pré-encodés, RTO adaptatif, retransmission
+    du seul item perdu)
+
+Usage : python test/bench_mission_upload.py [n_items] [perte] [latence_s] [essais]
+"""
+import contextlib, io, os, sys, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.dirname(__file__))
+from pymavlink import mavutil
+from sim_autopilot import SimAutopilot
+from dispatcher import MavlinkDispatcher
+from mission_tool import MISSION_MSG_TYPES, send_mission
+
+
+def _legacy_send(waypoints, master, dispatcher, item_timeout=2.0, max_silence_retries=3):
+    """Chemin d'origine, condensé (mêmes timeouts, mêmes pauses)."""
+    ts, tc = master.target_system, master.target_component
+    n = len(waypoints)
+    with dispatcher.io_lock, dispatcher.subscribe(MISSION_MSG_TYPES, maxsize=512) as chan:
+        master.waypoint_clear_all_send()
+        time.sleep(0.1)
+        master.waypoint_count_send(n)
+        sent, silence = set(), 0
+        while len(sent) < n:
+            msg = chan.recv_match(type=['MISSION_REQUEST_INT', 'MISSION_REQUEST'], blocking=True, timeout=item_timeout)
+            if msg is None:
+                silence += 1
+                if silence > max_silence_retries:
+                    raise RuntimeError("Pas de MISSION_REQUEST reçu (timeout).")
+                master.waypoint_count_send(n)
+                continue
+            silence = 0
+            seq = int(msg.seq)
+            lat, lon, alt = waypoints[seq]
+            master.mav.mission_item_int_send(ts, tc, seq, 3, 16, 0, 1, 0, 0, 0, 0,
+                                             int(lat * 1e7), int(lon * 1e7), alt)
+            sent.add(seq)
+        if not chan.recv_match(type='MISSION_ACK', blocking=True, timeout=item_timeout):
+            raise RuntimeError("MISSION_ACK non reçu (timeout).")
+        master.mav.mission_set_current_send(ts, tc, 0)
+    with dispatcher.io_lock:
+        master.mav.mission_set_current_send(ts, tc, 0)
+    time.sleep(1)
+
+
+def _run(name, fn, port, loss, latency, seed):
+    master = mavutil.mavlink_connection(f"udpin:127.0.0.1:{port}")
+    sim = SimAutopilot(port, loss=loss, latency=latency, seed=seed)
+    master.wait_heartbeat(timeout=5)
+    disp = MavlinkDispatcher(master).start(request_stream=False)
+    t0 = time.monotonic()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            fn(master, disp)
+        ok = "ok"
+    except RuntimeError as e:
+        ok = f"échec ({e})"
+    dt = time.monotonic() - t0
+    sim.stop()
+    disp.stop()
+    master.close()
+    return dt, ok
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    loss = float(sys.argv[2]) if len(sys.argv) > 2 else 0.05
+    latency = float(sys.argv[3]) if len(sys.argv) > 3 else 0.02
+    runs = int(sys.argv[4]) if len(sys.argv) > 4 else 3
+
+    waypoints = [(48.85 + i * 1e-4, 2.35 + i * 1e-4, 30.0) for i in range(n)]
+    path = os.path.join(os.path.dirname(__file__), "_bench_upload.waypoints")
+    with open(path, "w") as f:
+        f.write("QGC WPL 110\n")
+        for i, (lat, lon, alt) in enumerate(waypoints):
+            f.write(f"{i}\t0\t3\t16\t0\t0\t0\t0\t{lat:.8f}\t{lon:.8f}\t{alt:.6f}\t1\n")
+
+    print(f"{n} items, perte {loss:.0%} (dans chaque sens), latence {latency * 1000:.0f} ms")
+    port = 14800
+    try:
+        for name, fn in (
+            ("avant", lambda m, d: _legacy_send(waypoints, m, d)),
+            ("après", lambda m, d: send_mission(path, m, dispatcher=d)),
+        ):
+            for seed in range(runs):
+                port += 1
+                dt, ok = _run(name, fn, port, loss, latency, seed)
+                print(f"{name:>6} #{seed} : {dt:6.2f} s  {ok}")
+    finally:
+        os.remove(path)
@@ -0,0 +1,50 @@
+"""
+Latence de démarrage (LOITER → armement → AUTO → MISSION_START) contre
+l'autopilote simulé :
+  - "avant"  : délais fixes de l'ancien start_mission (1 s + 1 s + 3 s), sans lire les ACK
+  - "après"  : start_mission.start, chaque étape confirmée par COMMAND_ACK / HEARTBEAT
+
+Usage : python test/bench_start.py [latence_s] [runs]
+"""
+import contextlib, io, os, sys, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.dirname(__file__))
+from pymavlink import mavutil
+from dispatcher import MavlinkDispatcher
+from sim_autopilot import SimAutopilot
+from start_mission import start
+from telemetry import TelemetryCache
+
+FIXED_DELAYS_S = 1.0 + 1.0 + 3.0
+
+if __name__ == "__main__":
+    latency = float(sys.argv[1]) if len(sys.argv) > 1 else 0.05
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    port = 15980
+    master = mavutil.mavlink_connection(f"udpin:127.0.0.1:{port}")
+    sim = SimAutopilot(port, latency=latency, rate_hz=1.0)
+    master.wait_heartbeat(timeout=5)
+    cache = TelemetryCache(history_size=0)
+    link = MavlinkDispatcher(master)
+    link.add_sink(cache.update_from_msg)
+    link.start(request_stream=False)
+    sim.items = [None]  # mission non vide : MISSION_START accepté
+
+    print(f"latence aller simple {latency * 1000:.0f} ms, {runs} démarrages")
+    print(f"avant : >= {FIXED_DELAYS_S:.1f} s (délais fixes, aucune confirmation vérifiée)")
+    times = []
+    for _ in range(runs):
+        sim.armed, sim.custom_mode = False, 0
+        time.sleep(1.5)  # le cache voit le drone désarmé
+        t0 = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = start(master, dispatcher=link, cache=cache)
+        times.append(time.perf_counter() - t0)
+        assert sim.mission_started is not None and [s["step"] for s in result["steps"]] == [
+            "mode_loiter", "arm", "mode_auto", "mission_start"]
+    times.sort()
+    print(f"après : médiane {times[len(times) // 2] * 1000:.0f} ms, max {times[-1] * 1000:.0f} ms "
+          f"(4 allers-retours ≈ {8 * latency * 1000:.0f} ms)")
+    link.stop()
+    sim.stop()
@@ -0,0 +1,43 @@
+"""
+Génération d'une mission de relevé (mode 'survey' de create_mission) :
+  - "grille"  : survey_grid seul (lignes × arêtes vectorisé, remplissage des points)
+  - "fichier" : create_mission complet, écriture en flux par blocs
+  - "simplif." : simplify_mission (RDP, 1 m) sur la mission générée
+Objectif : ~50 000 waypoints en moins d'une seconde.
+
+Usage : python test/bench_survey_grid.py [espacement_points_m]
+"""
+import contextlib, io, os, sys, tempfile, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from mission import Mission
+from mission_geometry import simplify_mission, survey_grid
+from mission_tool import create_mission
+
+# Polygone concave (~11 km × 11 km) autour de Paris
+POLYGON = [[48.80, 2.30], [48.90, 2.30], [48.90, 2.45], [48.86, 2.45],
+           [48.85, 2.38], [48.84, 2.45], [48.80, 2.45]]
+
+if __name__ == "__main__":
+    point_spacing = float(sys.argv[1]) if len(sys.argv) > 1 else 60.0
+    survey = {"polygon": POLYGON, "spacing_m": 40.0, "heading_deg": None,
+              "point_spacing_m": point_spacing, "speed_m_s": 12.0}
+
+    t0 = time.perf_counter()
+    lat, lon, heading = survey_grid(POLYGON, 40.0, point_spacing_m=point_spacing, start=(48.79, 2.29))
+    print(f"  grille : {(time.perf_counter() - t0) * 1000:8.1f} ms  {len(lat)} points, cap {heading:.1f}°")
+
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, "survey.waypoints")
+        t0 = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            create_mission(None, path, 30, mode="survey", startlat=48.79, startlon=2.29, survey=survey)
+        dt = time.perf_counter() - t0
+        with open(path) as f:
+            n = sum(1 for _ in f) - 1
+        print(f" fichier : {dt * 1000:8.1f} ms  {n} items, {os.path.getsize(path) / 1e6:.1f} Mo")
+
+        mission = Mission.load(path)
+        t0 = time.perf_counter()
+        _, stats = simplify_mission(mission, 1.0)
+        print(f"simplif. : {(time.perf_counter() - t0) * 1000:8.1f} ms  {stats['count']} items (-{stats['reduction_pct']}%)")
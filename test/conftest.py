@@ -0,0 +1,61 @@
+"""
+Fixtures pytest : autopilote simulé (sim_autopilot.py) relié à un
+dispatcher, sur un port UDP libre.
+
+Usage : python -m pytest -q test/
+"""
+import contextlib, io, os, socket, sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.dirname(__file__))
+from pymavlink import mavutil
+from dispatcher import MavlinkDispatcher
+from mission_tool import watch_onboard_mission
+from sim_autopilot import SimAutopilot
+
+# Scripts manuels (serveur / client réels), pas des tests
+collect_ignore = ["test_server_ws.py", "test_websocket_client.py"]
+
+
+def _free_udp_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture
+def sim_link():
+    """
+    Fabrique : sim_link(watch=True, **options_sim) -> (sim, master, dispatcher).
+    Le dispatcher surveille la mission à bord comme dans app.py (watch=False :
+    cache non fiable). Tout est arrêté en fin de test.
+    """
+    opened = []
+
+    def _open(watch=True, **sim_kwargs):
+        port = _free_udp_port()
+        master = mavutil.mavlink_connection(f"udpin:127.0.0.1:{port}")
+        sim = SimAutopilot(port, seed=1, **sim_kwargs)
+        opened.append((sim, master, None))
+        assert master.wait_heartbeat(timeout=5) is not None, "pas de heartbeat du simulateur"
+        disp = MavlinkDispatcher(master).start(request_stream=False)
+        if watch:
+            watch_onboard_mission(disp)
+        opened[-1] = (sim, master, disp)
+        return sim, master, disp
+
+    yield _open
+    for sim, master, disp in opened:
+        if disp is not None:
+            disp.stop()
+        sim.stop()
+        master.close()
+
+
+@pytest.fixture
+def quiet():
+    """Masque les print de progression des fonctions mission."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
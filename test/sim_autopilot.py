@@ -0,0 +1,249 @@
+"""
+Autopilote MAVLink simulé (façon ArduCopter) pour tests manuels et benchmarks.
+
+  - HEARTBEAT / GLOBAL_POSITION_INT / MISSION_CURRENT à 'rate_hz'
+  - protocole mission : CLEAR_ALL, upload (COUNT → REQUEST_INT → ITEM_INT → ACK),
+    écriture partielle (WRITE_PARTIAL_LIST, désactivable avec partial=False),
+    download (REQUEST_LIST → COUNT → REQUEST(_INT) → ITEM(_INT)), re-request
+    automatique de l'item attendu si le transfert stagne, ACK renvoyé si le
+    dernier item est répété
+  - commandes : COMMAND_LONG DO_SET_MODE / COMPONENT_ARM_DISARM / MISSION_START
+    et SET_MODE, acquittées par COMMAND_ACK (armement refusé en AUTO et
+    MISSION_START refusé hors AUTO armé, comme ArduCopter) ; l'état armé et le
+    mode sont reflétés dans le HEARTBEAT
+  - lien dégradé : perte de paquets ('loss', dans les deux sens) et latence
+    aller simple ('latency')
+
+Usage : python test/sim_autopilot.py [--port 14550] [--loss 0.1] [--latency 0.05]
+        (envoie vers udp:127.0.0.1:<port>, comme SITL --out)
+"""
+import argparse, heapq, itertools, random, threading, time
+from pymavlink import mavutil
+
+mavlink = mavutil.mavlink
+_AUTO = 3  # custom_mode ArduCopter
+
+
+class SimAutopilot:
+    def __init__(
+        self,
+        port: int,
+        loss: float = 0.0,
+        latency: float = 0.0,
+        rate_hz: float = 10.0,
+        mission_int: bool = True,
+        resend: float = 1.0,
+        partial: bool = True,
+        seed=None,
+    ) -> None:
+        self.conn = mavutil.mavlink_connection(f"udpout:127.0.0.1:{port}", source_system=1, source_component=1)
+        self.mav = self.conn.mav
+        self.loss = loss
+        self.latency = latency
+        self.rate_hz = rate_hz
+        self.mission_int = mission_int  # False : ignore MISSION_REQUEST_INT (autopilote ancien)
+        self.resend = resend
+        self.partial = partial      # False : refuse MISSION_WRITE_PARTIAL_LIST
+        self.rng = random.Random(seed)
+
+        self.items = []             # mission à bord (messages MISSION_ITEM_INT)
+        self.current_seq = 0
+        self.armed = False
+        self.custom_mode = 0        # STABILIZE
+        self.mission_started = None # time.time() du dernier MISSION_START accepté
+        self._rx = None             # upload en cours : {"items", "expected", "end", "last"}
+        self._last_seq = None       # dernier seq du dernier upload terminé (ACK renvoyé si répété)
+        self.stats = {"rx": 0, "tx": 0, "dropped": 0}
+        # MISSION_CURRENT.total n'existe qu'en MAVLink 2 (MAVLINK20=1)
+        self._mc_total = "total" in mavlink.MAVLink_mission_current_message.fieldnames
+
+        self._lock = threading.Lock()
+        self._tx_lock = threading.Lock()
+        self._timers = []
+        self._tick = itertools.count()
+        self._wake = threading.Condition(self._lock)
+        self.stop_event = threading.Event()
+        for fn in (self._telemetry_loop, self._recv_loop, self._timer_loop):
+            threading.Thread(target=fn, daemon=True).start()
+
+    def stop(self) -> None:
+        self.stop_event.set()
+        with self._wake:
+            self._wake.notify_all()
+
+    # ── Lien dégradé ──
+    def _later(self, delay: float, fn, *args) -> None:
+        with self._wake:
+            heapq.heappush(self._timers, (time.monotonic() + delay, next(self._tick), fn, args))
+            self._wake.notify()
+
+    def _timer_loop(self) -> None:
+        while not self.stop_event.is_set():
+            with self._wake:
+                while not self._timers and not self.stop_event.is_set():
+                    self._wake.wait()
+                if self.stop_event.is_set():
+                    return
+                due, _, fn, args = self._timers[0]
+                delay = due - time.monotonic()
+                if delay > 0:
+                    self._wake.wait(delay)
+                    continue
+                heapq.heappop(self._timers)
+            fn(*args)
+
+    def send(self, msg) -> None:
+        if self.rng.random() < self.loss:
+            self.stats["dropped"] += 1
+            return
+        with self._tx_lock:
+            buf = msg.pack(self.mav)
+            self.stats["tx"] += 1
+            if self.latency <= 0:
+                self.conn.write(buf)
+                return
+        self._later(self.latency, self.conn.write, buf)
+
+    def _recv_loop(self) -> None:
+        while not self.stop_event.is_set():
+            m = self.conn.recv_match(blocking=True, timeout=0.2)
+            if m is None or m.get_type() == "BAD_DATA":
+                continue
+            if self.rng.random() < self.loss:
+                self.stats["dropped"] += 1
+                continue
+            self.stats["rx"] += 1
+            if self.latency > 0:
+                self._later(self.latency, self.handle, m)
+            else:
+                self.handle(m)
+
+    def _telemetry_loop(self) -> None:
+        period = 1.0 / self.rate_hz
+        while not self.stop_event.is_set():
+            base = mavlink.MAV_MODE_FLAG_CUSTOM_MODE_ENABLED
+            if self.armed:
+                base |= mavlink.MAV_MODE_FLAG_SAFETY_ARMED
+            self.send(self.mav.heartbeat_encode(mavlink.MAV_TYPE_QUADROTOR, mavlink.MAV_AUTOPILOT_ARDUPILOTMEGA,
+                                                base, self.custom_mode, mavlink.MAV_STATE_ACTIVE))
+            self.send(self.mav.global_position_int_encode(0, 488566000, 23522000, 35000, 10000, 100, 50, -10, 9000))
+            if self._mc_total:
+                self.send(self.mav.mission_current_encode(self.current_seq, len(self.items)))
+            else:
+                self.send(self.mav.mission_current_encode(self.current_seq))
+            self._check_upload_stall()
+            time.sleep(period)
+
+    # ── Protocole mission ──
+    def _request(self, seq: int) -> None:
+        self.send(self.mav.mission_request_int_encode(255, 0, seq))
+
+    def _check_upload_stall(self) -> None:
+        rx = self._rx
+        if rx is not None and time.monotonic() - rx["last"] > self.resend:
+            rx["last"] = time.monotonic()
+            self._request(rx["expected"])
+
+    def handle(self, m) -> None:
+        t = m.get_type()
+        if t == "MISSION_CLEAR_ALL":
+            self.items = []
+            self._rx = None
+            self.send(self.mav.mission_ack_encode(255, 0, mavlink.MAV_MISSION_ACCEPTED))
+        elif t == "MISSION_COUNT":
+            # Un COUNT pendant un upload le redémarre (comme ArduPilot)
+            self._rx = {"items": [None] * m.count, "expected": 0, "end": m.count - 1, "last": time.monotonic()}
+            if m.count == 0:
+                self._finish_upload()
+            else:
+                self._request(0)
+        elif t == "MISSION_WRITE_PARTIAL_LIST":
+            if not self.partial or not 0 <= m.start_index <= m.end_index < len(self.items):
+                self.send(self.mav.mission_ack_encode(255, 0, mavlink.MAV_MISSION_UNSUPPORTED))
+                return
+            self._rx = {"items": list(self.items), "expected": m.start_index, "end": m.end_index,
+                        "last": time.monotonic()}
+            self._request(m.start_index)
+        elif t in ("MISSION_ITEM_INT", "MISSION_ITEM"):
+            rx = self._rx
+            if rx is None:
+                # Dernier item renvoyé par le GCS : l'ACK final a été perdu
+                if m.seq == self._last_seq:
+                    self.send(self.mav.mission_ack_encode(255, 0, mavlink.MAV_MISSION_ACCEPTED))
+                return
+            if m.seq != rx["expected"]:
+                self._request(rx["expected"])
+                return
+            if t == "MISSION_ITEM":
+                m = self.mav.mission_item_int_encode(255, 0, m.seq, m.frame, m.command, m.current, m.autocontinue,
+                                                     m.param1, m.param2, m.param3, m.param4,
+                                                     int(m.x * 1e7), int(m.y * 1e7), m.z)
+            rx["items"][m.seq] = m
+            rx["expected"] += 1
+            rx["last"] = time.monotonic()
+            if rx["expected"] > rx["end"]:
+                self._finish_upload()
+            else:
+                self._request(rx["expected"])
+        elif t == "MISSION_REQUEST_LIST":
+            self.send(self.mav.mission_count_encode(255, 0, len(self.items)))
+        elif t in ("MISSION_REQUEST_INT", "MISSION_REQUEST"):
+            if t == "MISSION_REQUEST_INT" and not self.mission_int:
+                return
+            if m.seq >= len(self.items):
+                return
+            it = self.items[m.seq]
+            if t == "MISSION_REQUEST_INT":
+                self.send(it)
+            else:
+                self.send(self.mav.mission_item_encode(255, 0, it.seq, it.frame, it.command, it.current, it.autocontinue,
+                                                       it.param1, it.param2, it.param3, it.param4,
+                                                       it.x / 1e7, it.y / 1e7, it.z))
+        elif t == "MISSION_SET_CURRENT":
+            self.current_seq = m.seq
+        elif t == "SET_MODE":
+            self.custom_mode = m.custom_mode
+            self.send(self.mav.command_ack_encode(mavlink.MAVLINK_MSG_ID_SET_MODE, mavlink.MAV_RESULT_ACCEPTED))
+        elif t == "COMMAND_LONG":
+            self.send(self.mav.command_ack_encode(m.command, self._command(m)))
+
+    # ── Commandes ──
+    def _command(self, m) -> int:
+        if m.command == mavlink.MAV_CMD_DO_SET_MODE:
+            self.custom_mode = int(m.param2)
+            return mavlink.MAV_RESULT_ACCEPTED
+        if m.command == mavlink.MAV_CMD_COMPONENT_ARM_DISARM:
+            if m.param1 == 1 and self.custom_mode == _AUTO:
+                return mavlink.MAV_RESULT_FAILED   # "Mode not armable"
+            self.armed = m.param1 == 1
+            return mavlink.MAV_RESULT_ACCEPTED
+        if m.command == mavlink.MAV_CMD_MISSION_START:
+            if not (self.armed and self.custom_mode == _AUTO and self.items):
+                return mavlink.MAV_RESULT_FAILED
+            self.mission_started = time.time()
+            self.current_seq = int(m.param1) or 1
+            return mavlink.MAV_RESULT_ACCEPTED
+        return mavlink.MAV_RESULT_UNSUPPORTED
+
+    def _finish_upload(self) -> None:
+        self.items = self._rx["items"]
+        self._last_seq = self._rx["end"]
+        self._rx = None
+        self.send(self.mav.mission_ack_encode(255, 0, mavlink.MAV_MISSION_ACCEPTED))
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--port", type=int, default=14550)
+    ap.add_argument("--loss", type=float, default=0.0)
+    ap.add_argument("--latency", type=float, default=0.0)
+    ap.add_argument("--rate", type=float, default=10.0)
+    args = ap.parse_args()
+    sim = SimAutopilot(args.port, loss=args.loss, latency=args.latency, rate_hz=args.rate)
+    print(f"Autopilote simulé → udp:127.0.0.1:{args.port} (perte {args.loss:.0%}, latence {args.latency * 1000:.0f} ms)")
+    try:
+        while True:
+            time.sleep(5)
+            print(f"mission: {len(sim.items)} items | armé: {sim.armed} | {sim.stats}")
+    except KeyboardInterrupt:
+        sim.stop()
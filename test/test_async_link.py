@@ -0,0 +1,115 @@
+"""AsyncLinkEngine : io_lock jamais pris en bloquant sur la boucle, descripteur cassé abandonné."""
+import asyncio, contextlib, threading, time
+
+import pytest
+from pymavlink import mavutil
+
+from async_link import AsyncLinkEngine
+from conftest import _free_udp_port
+from sim_autopilot import SimAutopilot
+
+
+@pytest.fixture
+def engine():
+    eng = AsyncLinkEngine().start()
+    sims = []
+
+    def _add(key, io_lock=None, **kwargs):
+        port = _free_udp_port()
+        master = mavutil.mavlink_connection(f"udpin:127.0.0.1:{port}")
+        sims.append(SimAutopilot(port, rate_hz=50.0, seed=1))
+        assert master.wait_heartbeat(timeout=5) is not None
+        return eng.add_link(key, master, io_lock=io_lock, **kwargs)
+
+    yield eng, _add
+    eng.stop()
+    for sim in sims:
+        sim.stop()
+
+
+def _frames_after(link, delay):
+    before = link.frames
+    time.sleep(delay)
+    return link.frames - before
+
+
+def test_held_io_lock_does_not_stall_other_links(engine):
+    eng, add = engine
+    lock = threading.RLock()
+    release = threading.Event()
+    held = threading.Event()
+
+    def _hold():  # upload en cours sur un autre thread
+        with lock:
+            held.set()
+            release.wait(5)
+
+    threading.Thread(target=_hold, daemon=True).start()
+    held.wait(1)
+    try:
+        busy = add("busy", io_lock=lock)          # request_stream attend le verrou hors boucle
+        other = add("other")
+        assert _frames_after(other, 0.5) > 5      # la boucle lit toujours les autres liens
+        fut = eng.run(_command_pending(busy), timeout=1)
+        assert fut == "pending"                   # la commande attend le verrou sans bloquer la boucle
+        assert _frames_after(other, 0.3) > 3
+    finally:
+        release.set()
+
+
+async def _command_pending(link):
+    task = asyncio.ensure_future(link.command(mavutil.mavlink.MAV_CMD_MISSION_START, timeout=0.5))
+    await asyncio.sleep(0.2)
+    state = "pending" if not task.done() else "done"
+    task.cancel()
+    with contextlib.suppress(asyncio.CancelledError):
+        await task
+    return state
+
+
+def test_broken_descriptor_is_dropped(engine):
+    eng, add = engine
+    link = add("broken")
+    calls = []
+
+    def _boom():
+        calls.append(1)
+        raise OSError("fd cassé")
+
+    link.master.recv_msg = _boom
+    deadline = time.time() + 2
+    while link.is_alive() and time.time() < deadline:
+        time.sleep(0.01)
+    assert not link.is_alive() and "fd cassé" in link.lost_reason
+    n = len(calls)
+    time.sleep(0.2)
+    assert len(calls) == n                        # plus de réveil sur ce descripteur
+
+
+def test_frames_beyond_the_wakeup_cap_are_not_stranded(engine):
+    eng, _ = engine
+    port = _free_udp_port()
+    master = mavutil.mavlink_connection(f"udpin:127.0.0.1:{port}")
+    peer = mavutil.mavlink_connection(f"udpout:127.0.0.1:{port}", source_system=1, source_component=1)
+    mav = peer.mav
+    hb = lambda: mav.heartbeat_encode(mavutil.mavlink.MAV_TYPE_QUADROTOR,
+                                      mavutil.mavlink.MAV_AUTOPILOT_ARDUPILOTMEGA, 0, 0, 0)
+    try:
+        peer.write(hb().pack(mav))
+        assert master.wait_heartbeat(timeout=2) is not None
+        link = eng.add_link("burst", master, request_stream=False)
+        # Un seul datagramme de 100 trames, dont l'ACK final, puis plus rien sur le lien
+        frames = [hb().pack(mav) for _ in range(99)]
+        frames.append(mav.command_ack_encode(mavutil.mavlink.MAV_CMD_MISSION_START,
+                                             mavutil.mavlink.MAV_RESULT_ACCEPTED).pack(mav))
+        ack = eng.run(_burst_then_ack(link, peer, b"".join(frames)), timeout=2)
+        assert ack is not None and link.frames == 100
+    finally:
+        peer.close()
+
+
+async def _burst_then_ack(link, peer, datagram):
+    waiting = asyncio.ensure_future(link.wait_message(["COMMAND_ACK"], timeout=0.5))
+    await asyncio.sleep(0)
+    peer.write(datagram)
+    return await waiting
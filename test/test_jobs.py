@@ -0,0 +1,103 @@
+"""JobExecutor : ordre par cible, parallélisme entre cibles, annulation, file bornée, jobs exclusifs."""
+import threading, time
+
+import pytest
+
+from jobs import JobExecutor, JobQueueFull, TargetsBusy
+
+
+def _blocker():
+    """Tâche qui tient son worker jusqu'à release.set()."""
+    started, release = threading.Event(), threading.Event()
+
+    def _work(report):
+        started.set()
+        release.wait(5)
+        return "ok"
+    return _work, started, release
+
+
+def test_same_target_runs_in_submission_order():
+    ex = JobExecutor(max_workers=4)
+    order, lock = [], threading.Lock()
+
+    def _work(i):
+        def _run(report):
+            time.sleep(0.01)
+            with lock:
+                order.append(i)
+            return i
+        return _run
+
+    jobs = [ex.submit("t", {"drone": _work(i)}) for i in range(6)]
+    assert all(j.wait(5) for j in jobs)
+    assert order == list(range(6))
+    assert [j.tasks["drone"]["result"] for j in jobs] == list(range(6))
+
+
+def test_different_targets_run_in_parallel():
+    ex = JobExecutor(max_workers=3)
+    barrier = threading.Barrier(3, timeout=2)
+    job = ex.submit("t", {d: (lambda report: barrier.wait()) for d in (1, 2, 3)})
+    assert job.wait(5) and job.state == "done"
+
+
+def test_cancel_pending_and_running():
+    ex = JobExecutor(max_workers=2)
+    stop_seen = threading.Event()
+
+    def _loop(report):
+        while True:
+            report({"tick": 1})   # lève JobCancelled après cancel()
+            time.sleep(0.01)
+
+    running = ex.submit("loop", {"drone": _loop})
+    queued = ex.submit("after", {"drone": lambda report: stop_seen.set()})
+    time.sleep(0.05)
+    assert queued.state == "queued" and running.state == "running"
+
+    assert queued.cancel()
+    assert running.cancel()
+    assert running.wait(2) and queued.wait(2)
+    assert running.state == "cancelled" and queued.state == "cancelled"
+    assert not stop_seen.is_set()             # la tâche en attente n'a jamais démarré
+    assert not running.cancel()               # déjà terminé
+    assert ex.stats()["pending"] == 0
+
+
+def test_failed_task_is_reported():
+    ex = JobExecutor(max_workers=1)
+
+    def _boom(report):
+        raise RuntimeError("lien perdu")
+
+    job = ex.submit("t", {"drone": _boom})
+    assert job.wait(2) and job.state == "failed"
+    assert job.tasks["drone"]["error"] == "RuntimeError: lien perdu"
+
+
+def test_queue_is_bounded():
+    ex = JobExecutor(max_workers=1, max_pending=2)
+    work, started, release = _blocker()
+    ex.submit("t", {"a": work, "b": work})
+    with pytest.raises(JobQueueFull):
+        ex.submit("t", {"c": work})
+    release.set()
+
+
+def test_exclusive_job_needs_idle_targets_and_free_workers():
+    ex = JobExecutor(max_workers=3)
+    work, started, release = _blocker()
+    busy = ex.submit("t", {1: work})
+    assert started.wait(2)
+    with pytest.raises(TargetsBusy) as exc:
+        ex.submit("fleet", {1: work, 2: work}, exclusive=True)
+    assert exc.value.targets == ["1"]
+    with pytest.raises(JobQueueFull):         # 2 workers libres pour 3 tâches
+        ex.submit("fleet", {2: work, 3: work, 4: work}, exclusive=True)
+    release.set()
+    assert busy.wait(2)
+
+    barrier = threading.Barrier(3, timeout=2)
+    fleet = ex.submit("fleet", {d: (lambda report: barrier.wait()) for d in (1, 2, 3)}, exclusive=True)
+    assert fleet.wait(5) and fleet.state == "done"
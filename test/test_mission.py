@@ -0,0 +1,158 @@
+"""Structure Mission : parse / écriture .waypoints, modifications par lot, bornes des champs."""
+import os
+
+import pytest
+
+from mission import Mission, WPL_HEADER
+from mission_tool import create_mission, edit_mission, modify_mission
+
+
+def _mission(n):
+    return Mission.from_dicts({"frame": 3, "command": 16, "lat": 48.85 + i * 1e-4, "lon": 2.35, "alt": 30.0 + i}
+                              for i in range(n))
+
+
+@pytest.mark.parametrize("fields", [{"command": 70000}, {"frame": -1}, {"current": 256}])
+def test_update_rejects_out_of_range_int_fields(fields):
+    m = _mission(3)
+    before = m.to_dicts()
+    with pytest.raises(ValueError):
+        m.update(1, dict(fields, alt=99.0))
+    assert m.to_dicts() == before  # rien d'appliqué
+
+
+def test_append_rejects_out_of_range_without_partial_row():
+    m = _mission(2)
+    with pytest.raises(ValueError):
+        m.append({"command": 1 << 16})
+    assert len(m.command) == len(m.alt) == 2
+
+
+def test_parse_out_of_range_is_invalid_format():
+    with pytest.raises(RuntimeError):
+        Mission.parse(f"{WPL_HEADER}\n0\t0\t3\t70000\t0\t0\t0\t0\t48\t2\t30\t1\n")
+
+
+def test_modify_mission_raises_instead_of_printing(tmp_path, quiet):
+    path = str(tmp_path / "m.waypoints")
+    _mission(3).save(path)
+    with pytest.raises(IndexError):
+        modify_mission(path, 7, {"alt": 1.0})
+    with pytest.raises(ValueError):
+        edit_mission(path, updates=[{"seq": 0, "fields": {"command": 70000}}])
+    modify_mission(path, 2, {"alt": 12.5})
+    assert Mission.load(path).alt[2] == 12.5
+
+
+def test_parse_dumps_round_trip():
+    m = _mission(5)
+    m.update(2, {"command": 177, "param1": 4, "param2": -1})
+    text = m.dumps()
+    assert text.startswith(WPL_HEADER + "\n")
+    again = Mission.parse(text)
+    assert again.keys() == m.keys()           # 8 décimales : précision du transport MAVLink
+    assert again.dumps() == text
+
+
+def test_parse_skips_malformed_lines():
+    text = _mission(3).dumps()
+    lines = text.splitlines()
+    lines.insert(2, "ligne\tincomplète")
+    assert len(Mission.parse("\n".join(lines) + "\n")) == 3
+
+
+@pytest.mark.parametrize("sidecar", [True, False])
+def test_save_load_round_trip(tmp_path, sidecar):
+    path = str(tmp_path / "rt.waypoints")
+    m = _mission(50)
+    m.save(path, sidecar=sidecar)
+    assert os.path.exists(Mission.sidecar_path(path)) == sidecar
+    assert Mission.load(path, sidecar=sidecar).keys() == m.keys()
+    # Le fichier texte fait foi : une réécriture externe invalide sidecar et cache
+    with open(path, "w") as f:
+        f.write(_mission(2).dumps())
+    assert len(Mission.load(path, sidecar=sidecar)) == 2
+
+
+def _jump_mission():
+    # 0 home, 1..5 waypoints (alt = 100 + seq), 6 DO_JUMP vers 3
+    m = _mission(6)
+    for i in range(6):
+        m.update(i, {"alt": 100.0 + i})
+    m.append({"command": 177, "param1": 3, "param2": 2})
+    return m
+
+
+def _alts(m):
+    return [m.alt[i] for i in range(len(m)) if m.command[i] != 177]
+
+
+def test_edit_delete_and_insert_renumbers_do_jump():
+    m = _jump_mission()
+    out = m.edit(delete=[1], insert=[{"before": 3, "items": [{"alt": 7.0}, {"alt": 8.0}]}])
+    assert _alts(out) == [100.0, 102.0, 7.0, 8.0, 103.0, 104.0, 105.0]
+    jump = [i for i in range(len(out)) if out.command[i] == 177]
+    assert jump == [7] and out.param1[7] == 4.0  # la cible (ancien seq 3) est maintenant en 4
+    assert len(m) == 7  # la mission d'origine n'est pas modifiée
+
+
+def test_edit_order_updates_and_append():
+    m = _jump_mission()
+    out = m.edit(updates=[{"seq": 5, "fields": {"alt": 55.0}}],
+                 order=[0, 3, 4, 5, 1, 2, 6],
+                 insert=[{"before": None, "items": [{"command": 20}]}])
+    assert _alts(out)[:6] == [100.0, 103.0, 104.0, 55.0, 101.0, 102.0]
+    assert out.param1[6] == 1.0 and out.command[7] == 20
+
+
+def test_edit_rejects_inconsistent_batches():
+    m = _jump_mission()
+    with pytest.raises(ValueError):
+        m.edit(delete=[3])                    # cible d'un DO_JUMP
+    with pytest.raises(ValueError):
+        m.edit(order=[0, 1, 2])               # pas une permutation complète
+    with pytest.raises(IndexError):
+        m.edit(insert=[{"before": 42, "items": [{}]}])
+
+
+def test_edit_mission_file_is_atomic(tmp_path, quiet):
+    path = str(tmp_path / "e.waypoints")
+    _jump_mission().save(path)
+    stats = edit_mission(path, delete=[2], updates=[{"seq": 1, "fields": {"alt": 1.5}}])
+    assert stats["count"] == 6 and stats["deleted"] == 1 and stats["updated"] == 1
+    m = Mission.load(path)
+    assert m.alt[1] == 1.5 and m.param1[5] == 2.0
+    assert sorted(os.listdir(tmp_path)) == sorted(["e.waypoints", os.path.basename(Mission.sidecar_path(path))])
+
+
+def test_create_mission_reports_simplification(tmp_path, quiet):
+    # Ligne droite échantillonnée finement : seuls départ, décollage et LAND restent utiles
+    wps = [{"lat": 48.85 + i * 1e-5, "lon": 2.35, "alt": 30.0} for i in range(40)]
+    path = str(tmp_path / "c.waypoints")
+    created = create_mission(None, path, 30, wps, startlat=48.85, startlon=2.35, simplify_tolerance_m=1.0)
+    simplified = created["simplified"]
+    assert created["path"] == path and created["count"] == len(Mission.load(path)) == simplified["count"]
+    assert simplified["original_count"] == 42 and simplified["count"] < 10
+    assert simplified["reduction_pct"] == round(100.0 * (42 - simplified["count"]) / 42, 1)
+    assert "simplified" not in create_mission(None, path, 30, wps, startlat=48.85, startlon=2.35)
+
+
+def test_load_is_read_only(tmp_path):
+    # Fichier écrit hors de save() (copie, upload temporaire…) : load() ne crée rien à côté
+    path = tmp_path / "ext.waypoints"
+    path.write_text(_mission(4).dumps())
+    for _ in range(2):
+        assert len(Mission.load(str(path))) == 4
+    assert os.listdir(tmp_path) == ["ext.waypoints"]
+    # Le sidecar vient de save() (ou write_sidecar) et sert aux chargements suivants
+    Mission.load(str(path)).write_sidecar(str(path))
+    assert os.path.exists(Mission.sidecar_path(str(path)))
+    assert Mission._read_sidecar(str(path), os.stat(path)).keys() == _mission(4).keys()
+
+
+def test_create_survey_writes_its_sidecar(tmp_path, quiet):
+    path = str(tmp_path / "s.waypoints")
+    create_mission(None, path, 30, mode="survey", startlat=48.85, startlon=2.35,
+                   survey={"polygon": [[48.85, 2.35], [48.851, 2.35], [48.851, 2.352]], "spacing_m": 20})
+    m = Mission._read_sidecar(path, os.stat(path))
+    assert m is not None and m.keys() == Mission.load(path).keys()
@@ -0,0 +1,138 @@
+"""Géométrie des missions : grilles de relevé (boustrophédon), simplification RDP."""
+import numpy as np
+import pytest
+
+from mission import Mission
+from mission_geometry import EARTH_RADIUS_M, _best_heading, _rdp_mask, haversine_m, simplify_mission, survey_grid
+from mission_tool import create_mission
+
+KY = EARTH_RADIUS_M * np.pi / 180.0
+LAT0, LON0 = 48.85, 2.35
+KX = KY * np.cos(np.radians(LAT0))
+
+
+def _rect(width_m, height_m):
+    """Rectangle [[lat, lon], ...] de width_m (est-ouest) × height_m (nord-sud), coin sud-ouest en LAT0/LON0."""
+    dlat, dlon = height_m / KY, width_m / KX
+    return [[LAT0, LON0], [LAT0, LON0 + dlon], [LAT0 + dlat, LON0 + dlon], [LAT0 + dlat, LON0]]
+
+
+def _xy(lat, lon):
+    return (np.asarray(lon) - LON0) * KX, (np.asarray(lat) - LAT0) * KY
+
+
+def test_best_heading_follows_the_long_side():
+    # Rectangle 100 m × 400 m : lignes nord-sud (cap 0) plutôt qu'est-ouest
+    x, y = _xy(*np.array(_rect(100, 400)).T)
+    assert _best_heading(x, y) == pytest.approx(0.0, abs=0.5)
+    x, y = _xy(*np.array(_rect(400, 100)).T)
+    assert _best_heading(x, y) == pytest.approx(90.0, abs=0.5)
+
+
+def test_survey_grid_lines_cover_the_polygon():
+    lat, lon, heading = survey_grid(_rect(100, 400), 20.0)
+    assert heading == pytest.approx(0.0, abs=0.5)
+    x, y = _xy(lat, lon)
+    # 5 lignes à 10, 30, …, 90 m du bord ouest, deux extrémités chacune
+    assert len(x) == 10
+    assert np.round(x[::2], 1).tolist() == [10.0, 30.0, 50.0, 70.0, 90.0]
+    assert np.allclose(x[0::2], x[1::2], atol=1e-6)
+    # Chaque ligne va d'un bord à l'autre, sens alterné (boustrophédon)
+    assert np.allclose(np.sort(np.abs(np.diff(y)[0::2])), 400.0, atol=1e-3)
+    assert np.all(np.sign(np.diff(y)[0::2]) == np.array([1, -1, 1, -1, 1]) * np.sign(y[1] - y[0]))
+
+
+def test_survey_grid_point_spacing_and_bounds():
+    poly = [[48.85, 2.35], [48.853, 2.355], [48.849, 2.358]]  # triangle quelconque
+    lat, lon, _ = survey_grid(poly, 25.0, heading_deg=30.0, point_spacing_m=10.0)
+    p = np.array(poly)
+    assert lat.min() >= p[:, 0].min() - 1e-9 and lat.max() <= p[:, 0].max() + 1e-9
+    assert lon.min() >= p[:, 1].min() - 1e-9 and lon.max() <= p[:, 1].max() + 1e-9
+    steps = haversine_m(lat[:-1], lon[:-1], lat[1:], lon[1:])
+    x, y = _xy(lat, lon)
+    h = np.radians(30.0)
+    v = x * np.cos(h) - y * np.sin(h)
+    same_line = np.isclose(v[:-1], v[1:], atol=1e-6)
+    assert same_line.sum() > 0 and steps[same_line].max() <= 10.0 + 1e-3
+
+
+def test_survey_grid_starts_at_the_nearest_corner():
+    poly = _rect(100, 400)
+    for corner in poly:
+        lat, lon, _ = survey_grid(poly, 20.0, start=corner)
+        first = haversine_m(lat[0], lon[0], corner[0], corner[1])
+        assert first <= np.min(haversine_m(lat, lon, corner[0], corner[1])) + 1e-6
+        assert first < 15.0  # demi-espacement (10 m) depuis le coin
+
+
+@pytest.mark.parametrize("poly, spacing, point_spacing", [
+    ([[48.85, 2.35], [48.86, 2.35]], 20.0, None),
+    (_rect(100, 100), 0.0, None),
+    (_rect(100, 100), 20.0, -1.0),
+])
+def test_survey_grid_rejects_invalid_input(poly, spacing, point_spacing):
+    with pytest.raises(ValueError):
+        survey_grid(poly, spacing, point_spacing_m=point_spacing)
+
+
+def test_create_mission_survey_file(tmp_path, quiet):
+    path = str(tmp_path / "survey.waypoints")
+    created = create_mission(None, path, 40, mode="survey", startlat=LAT0, startlon=LON0,
+                             survey={"polygon": _rect(100, 400), "spacing_m": 20.0})
+    m = Mission.load(path)
+    assert created["count"] == len(m) == 2 + 10 + 1
+    assert list(m.command[:2]) == [16, 22] and m.command[-1] == 20  # HOME, TAKEOFF, …, RTL
+    assert all(c == 16 for c in m.command[2:-1]) and set(m.alt[1:-1]) == {40.0}
+
+
+def _track(points_m, alt=30.0):
+    """Mission HOME + WAYPOINT sur des points (x, y) en mètres depuis LAT0/LON0."""
+    items = [{"current": 1, "frame": 0, "command": 16, "lat": LAT0, "lon": LON0, "alt": 0.0}]
+    items += [{"lat": LAT0 + y / KY, "lon": LON0 + x / KX, "alt": alt} for x, y in points_m]
+    return Mission.from_dicts(items)
+
+
+def test_rdp_mask_keeps_out_and_back():
+    # Aller-retour sur une même droite : la distance au segment (pas à la droite) garde le demi-tour
+    p = np.array([[0.0, 0, 0], [50, 0, 0], [100, 0, 0], [50, 0, 0], [0, 0, 0]])
+    assert _rdp_mask(p, 1.0).tolist() == [True, False, True, False, True]
+    zigzag = np.array([[0.0, 0, 0], [10, 5, 0], [20, 0, 0], [30, 5, 0], [40, 0, 0]])
+    assert _rdp_mask(zigzag, 1.0).all()
+    assert _rdp_mask(zigzag, 6.0).tolist() == [True, False, False, False, True]
+
+
+def test_simplify_straight_line():
+    m = _track([(0.0, i * 5.0) for i in range(41)])
+    out, stats = simplify_mission(m, 1.0)
+    assert len(out) == 3 and out.keys() == m.take([0, 1, 41]).keys()
+    assert stats == {"original_count": 42, "count": 3, "removed": 39,
+                     "reduction_pct": round(100.0 * 39 / 42, 1), "tolerance_m": 1.0}
+
+
+def test_simplify_counts_altitude():
+    m = _track([(0.0, i * 5.0) for i in range(11)])
+    m.update(6, {"alt": 45.0})  # bosse de 15 m au milieu de la ligne
+    assert 6 in [i for i in range(len(m)) if m.alt[i] == 45.0]
+    out, _ = simplify_mission(m, 1.0)
+    assert 45.0 in list(out.alt)
+    out, _ = simplify_mission(m, 1.0, alt_tolerance_m=20.0)
+    assert len(out) == 3
+
+
+def test_simplify_keeps_commands_params_and_renumbers_do_jump():
+    m = _track([(0.0, i * 5.0) for i in range(21)])        # 0 HOME, 1..21 waypoints alignés
+    m.update(6, {"param1": 3.0})                            # attente : point conservé
+    m.append({"command": 178, "param2": 5.0})               # 22 DO_CHANGE_SPEED
+    m.append({"command": 177, "param1": 14, "param2": 2})   # 23 DO_JUMP vers 14
+    out, stats = simplify_mission(m, 1.0)
+    # Les suites 1..5, 7..13 et 15..21 se réduisent à leurs extrémités
+    assert out.keys() == m.take([0, 1, 5, 6, 7, 13, 14, 15, 21, 22, 23]).keys()[:-1] + [out.keys()[-1]]
+    assert stats["count"] == 11 and stats["removed"] == 13
+    assert out.param1[3] == 3.0 and out.command[9] == 178
+    assert out.command[10] == 177 and out.param1[10] == 6.0  # ancien item 14, désormais en 6
+    assert len(m) == 24 and m.param1[23] == 14.0            # mission d'origine intacte
+
+
+def test_simplify_rejects_non_positive_tolerance():
+    with pytest.raises(ValueError):
+        simplify_mission(_track([(0.0, 0.0), (0.0, 5.0)]), 0.0)
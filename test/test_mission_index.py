@@ -0,0 +1,187 @@
+"""Index SQLite des missions : rafraîchissement incrémental, tri et pagination par curseur, recherche spatiale."""
+import os
+
+import numpy as np
+import pytest
+
+from mission import Mission
+from mission_geometry import EARTH_RADIUS_M
+from mission_index import CHUNK_LEGS, MissionIndex, _segments_hit_box
+
+
+def _write(root, rel, n=3, lat=48.85, lon=2.35, step=1e-3):
+    path = os.path.join(str(root), rel)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    Mission.from_dicts({"command": 16, "lat": lat + i * step, "lon": lon, "alt": 30.0}
+                       for i in range(n)).save(path)
+    return path
+
+
+@pytest.fixture
+def index(tmp_path):
+    idx = MissionIndex(str(tmp_path))
+    yield idx
+    idx.close()
+
+
+def _names(files):
+    return [f["name"] for f in files]
+
+
+def test_query_metadata_and_filters(tmp_path, index):
+    _write(tmp_path, "a.waypoints", n=4)
+    _write(tmp_path, "sub/b.waypoints")
+    _write(tmp_path, "DEFAULT_x.waypoints")
+    (tmp_path / "notes.txt").write_text("x")
+    files, cursor = index.query(sort="name", order="asc")
+    assert _names(files) == ["a.waypoints"] and cursor is None
+    assert files[0]["waypoints"] == 4
+    assert files[0]["bbox"] == pytest.approx([48.85, 2.35, 48.853, 2.35])
+    files, _ = index.query(sort="name", order="asc", recursive=True, exclude_prefixes=())
+    assert _names(files) == ["a.waypoints", "b.waypoints", "DEFAULT_x.waypoints"]  # tri insensible à la casse
+    assert files[1]["path"] == "sub/b.waypoints"
+    files, _ = index.query(exts=(".txt",))
+    assert _names(files) == ["notes.txt"] and files[0]["waypoints"] is None
+
+
+def test_cursor_pages_are_stable_across_inserts(tmp_path, index):
+    for name in "bdfhj":
+        _write(tmp_path, f"{name}.waypoints")
+    page1, cursor = index.query(sort="name", order="asc", limit=2)
+    assert _names(page1) == ["b.waypoints", "d.waypoints"] and cursor
+    # Insertions avant et après le curseur : ni doublon ni saut sur la suite
+    _write(tmp_path, "a.waypoints")
+    _write(tmp_path, "e.waypoints")
+    page2, cursor = index.query(sort="name", order="asc", limit=2, cursor=cursor)
+    assert _names(page2) == ["e.waypoints", "f.waypoints"]
+    page3, cursor = index.query(sort="name", order="asc", limit=2, cursor=cursor)
+    assert _names(page3) == ["h.waypoints", "j.waypoints"] and cursor is None
+
+
+def test_cursor_with_equal_sort_keys(tmp_path, index):
+    # Même taille pour tous : le chemin départage, chaque fichier sort une fois
+    for name in "abcde":
+        _write(tmp_path, f"{name}.waypoints")
+    seen, cursor = [], None
+    while True:
+        page, cursor = index.query(sort="size", order="desc", limit=2, cursor=cursor)
+        seen += _names(page)
+        if cursor is None:
+            break
+    assert seen == ["e.waypoints", "d.waypoints", "c.waypoints", "b.waypoints", "a.waypoints"]
+
+
+def test_invalid_cursor(index):
+    with pytest.raises(ValueError):
+        index.query(cursor="pas-un-curseur")
+
+
+def test_refresh_sees_external_changes(tmp_path, index):
+    a = _write(tmp_path, "a.waypoints", n=3)
+    _write(tmp_path, "sub/b.waypoints")
+    assert len(index.query(recursive=True)[0]) == 2
+    # Modification, suppression et nouveau dossier faits hors de l'API
+    _write(tmp_path, "a.waypoints", n=7)
+    os.remove(os.path.join(str(tmp_path), "sub", "b.waypoints"))
+    _write(tmp_path, "new/c.waypoints")
+    index.refresh(full=True)
+    files, _ = index.query(sort="name", order="asc", recursive=True, refresh=False)
+    assert _names(files) == ["a.waypoints", "c.waypoints"] and files[0]["waypoints"] == 7
+    os.remove(a)
+    index.notify(a)
+    assert _names(index.query(recursive=True, refresh=False)[0]) == ["c.waypoints"]
+
+
+def test_index_persists_between_instances(tmp_path):
+    _write(tmp_path, "a.waypoints")
+    first = MissionIndex(str(tmp_path))
+    first.refresh()
+    first.close()
+    second = MissionIndex(str(tmp_path))
+    try:
+        assert _names(second.query(refresh=False)[0]) == ["a.waypoints"]
+    finally:
+        second.close()
+
+
+KY = EARTH_RADIUS_M * np.pi / 180.0
+
+
+def _line(root, rel, points):
+    """Mission dont le trajet passe par 'points' [(lat, lon), ...] (plus un DO_CHANGE_SPEED sans position)."""
+    path = os.path.join(str(root), rel)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    items = [{"command": 16, "lat": lat, "lon": lon, "alt": 30.0} for lat, lon in points]
+    items.insert(1, {"command": 178, "param2": 5.0})
+    Mission.from_dicts(items).save(path)
+    return path
+
+
+def test_segments_hit_box_liang_barsky():
+    box = (0.0, 0.0, 1.0, 1.0)
+    pts = np.array([
+        [0, -1.0, -1.0], [1, 2.0, 2.0],   # diagonale qui traverse la boîte sans sommet dedans
+        [2, 2.0, 3.0],                    # segment hors boîte
+        [3, 1.5, 0.5],                    # au-dessus de la boîte : segment 2 hors boîte
+        [4, 0.5, 0.5],                    # se termine dans la boîte
+    ])
+    assert _segments_hit_box(pts, *box).tolist() == [0, 3]
+    assert _segments_hit_box(pts[1:3], *box).tolist() == []
+    # Segments parallèles à un bord : sur le bord (touché) et juste à côté (non)
+    edge = np.array([[0, 1.0, -1.0], [1, 1.0, 2.0]])
+    assert _segments_hit_box(edge, *box).tolist() == [0]
+    assert _segments_hit_box(edge + [0, 1e-9, 0], *box).tolist() == []
+    assert _segments_hit_box(np.array([[0, 0.5, 0.5]]), *box).tolist() == [0]
+
+
+def test_search_bbox_finds_crossing_segments(tmp_path, index):
+    # 'cross' traverse la zone sans aucun waypoint dedans ; 'far' passe à côté
+    _line(tmp_path, "cross.waypoints", [(48.80, 2.30), (48.90, 2.30), (48.90, 2.40), (48.80, 2.40)])
+    _line(tmp_path, "far.waypoints", [(48.80, 2.50), (48.90, 2.50)])
+    _line(tmp_path, "sub/inside.waypoints", [(48.85, 2.35), (48.851, 2.351)])
+    hits = index.search_bbox([48.84, 2.33, 48.86, 2.42])
+    assert [(h["path"], h["seq"]) for h in hits] == [("cross.waypoints", 3), ("sub/inside.waypoints", 0)]
+    assert index.search_bbox([48.84, 2.33, 48.86, 2.42], recursive=False)[0]["path"] == "cross.waypoints"
+    assert index.search_bbox([48.84, 2.33, 48.86, 2.42], limit=1)[0]["path"] == "cross.waypoints"
+    assert index.search_bbox([10.0, 10.0, 11.0, 11.0]) == []
+
+
+def test_search_bbox_across_chunks(tmp_path, index):
+    # Trajet long : découpé en plusieurs tronçons R-tree, le segment touché est dans le dernier
+    n = 3 * CHUNK_LEGS + 2
+    pts = [(48.0 + i * 0.01, 2.0) for i in range(n - 1)] + [(48.0 + (n - 2) * 0.01, 2.5)]
+    _line(tmp_path, "long.waypoints", pts)
+    hit = index.search_bbox([48.0, 2.2, 49.0, 2.3])
+    assert [(h["path"], h["seq"]) for h in hit] == [("long.waypoints", n - 1)]
+
+
+def test_search_near_radius_and_ranking(tmp_path, index):
+    lat0, lon0 = 48.85, 2.35
+    kx = KY * np.cos(np.radians(lat0))
+    # Segments est-ouest à 40 m et 120 m au nord du point : distance au segment, pas aux sommets
+    _line(tmp_path, "n40.waypoints", [(lat0 + 40 / KY, lon0 - 500 / kx), (lat0 + 40 / KY, lon0 + 500 / kx)])
+    _line(tmp_path, "n120.waypoints", [(lat0 + 120 / KY, lon0 - 500 / kx), (lat0 + 120 / KY, lon0 + 500 / kx)])
+    near = index.search_near(lat0, lon0, 150.0)
+    assert [h["path"] for h in near] == ["n40.waypoints", "n120.waypoints"]
+    assert near[0]["distance_m"] == pytest.approx(40.0, abs=0.5) and near[0]["seq"] == 0
+    assert near[1]["distance_m"] == pytest.approx(120.0, abs=0.5)
+    assert [h["path"] for h in index.search_near(lat0, lon0, 100.0)] == ["n40.waypoints"]
+    assert index.search_near(lat0, lon0, 30.0) == []
+    assert len(index.search_near(lat0, lon0, 150.0, limit=1)) == 1
+
+
+def test_scans_do_not_write_into_the_missions_tree(tmp_path):
+    # Fichiers déposés hors de l'API (sans sidecar) : l'index les lit sans rien créer à côté
+    sub = tmp_path / "sub"
+    sub.mkdir()
+    for d in (tmp_path, sub):
+        (d / "ext.waypoints").write_text(Mission.from_dicts([{"lat": 48.85, "lon": 2.35}]).dumps())
+    idx = MissionIndex(str(tmp_path), db_path=":memory:")
+    try:
+        idx.refresh(full=True)
+        assert len(idx.query(recursive=True, refresh=False)[0]) == 2
+        assert len(idx.search_near(48.85, 2.35, 10.0)) == 2
+    finally:
+        idx.close()
+    assert sorted(os.listdir(tmp_path)) == ["ext.waypoints", "sub"]
+    assert os.listdir(sub) == ["ext.waypoints"]
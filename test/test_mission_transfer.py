@@ -0,0 +1,136 @@
+"""Upload (COUNT → REQUEST_INT → ITEM_INT → ACK) et download fenêtré, contre l'autopilote simulé."""
+import threading
+
+import pytest
+from pymavlink import mavutil
+
+from jobs import JobCancelled
+from mission import Mission
+from mission_tool import download_mission, send_mission
+
+mavlink = mavutil.mavlink
+
+
+def _mission(n):
+    items = [{"frame": 3, "command": 16, "lat": 48.85 + i * 1e-4, "lon": 2.35 - i * 1e-4, "alt": 20.0 + i}
+             for i in range(n)]
+    items[n // 2].update(command=178, frame=2, param2=7.5, lat=0.0, lon=0.0, alt=0.0)  # DO_CHANGE_SPEED
+    return Mission.from_dicts(items)
+
+
+def _onboard(sim):
+    return Mission.from_messages(sim.items)
+
+
+def _upload(sim_link, tmp_path, n=60, **sim_kwargs):
+    sim, master, disp = sim_link(**sim_kwargs)
+    path = str(tmp_path / "up.waypoints")
+    _mission(n).save(path)
+    stats = send_mission(path, master, dispatcher=disp)
+    return sim, master, disp, path, stats
+
+
+def test_upload(sim_link, tmp_path, quiet):
+    sim, _, _, path, stats = _upload(sim_link, tmp_path)
+    assert stats["count"] == stats["sent"] == 60
+    assert stats["retransmits"] == 0
+    assert _onboard(sim).keys() == Mission.load(path).keys()
+    assert sim.current_seq == 0
+
+
+def test_upload_lossy_link_retransmits_only_what_is_lost(sim_link, tmp_path, quiet):
+    sim, _, _, path, stats = _upload(sim_link, tmp_path, n=80, loss=0.15, latency=0.005)
+    assert _onboard(sim).keys() == Mission.load(path).keys()
+    assert 0 < stats["retransmits"] < 80
+
+
+def test_upload_cancelled_by_progress(sim_link, tmp_path, quiet):
+    sim, master, disp = sim_link()
+    path = str(tmp_path / "up.waypoints")
+    _mission(30).save(path)
+
+    def _progress(info):
+        if info["sent"] >= 10:
+            raise JobCancelled("stop")
+
+    with pytest.raises(JobCancelled):
+        send_mission(path, master, dispatcher=disp, progress=_progress)
+    assert sim.items == []  # upload interrompu : rien de validé à bord
+
+
+def test_download(sim_link, tmp_path, quiet):
+    sim, master, disp, path, _ = _upload(sim_link, tmp_path)
+    disp.onboard_mission = None  # force un vrai download
+    assert download_mission(master, dispatcher=disp).keys() == Mission.load(path).keys()
+
+
+def test_download_float_only_autopilot(sim_link, tmp_path, quiet):
+    sim, master, disp, path, _ = _upload(sim_link, tmp_path, n=20, mission_int=False)
+    disp.onboard_mission, disp.mission_int = None, None
+    got, want = download_mission(master, dispatcher=disp), Mission.load(path)
+    assert disp.mission_int is False
+    assert list(got.command) == list(want.command)
+    # MISSION_ITEM : coordonnées en float32 (~1 m de précision)
+    assert max(abs(a - b) for a, b in zip(got.lat, want.lat)) < 1e-5
+    assert max(abs(a - b) for a, b in zip(got.lon, want.lon)) < 1e-5
+
+
+def test_download_rerequests_only_missing_items(sim_link, tmp_path, quiet):
+    sim, master, disp, path, _ = _upload(sim_link, tmp_path, n=40)
+    requests, dropped = [], set()
+    send, handle = sim.send, sim.handle
+
+    def _handle(m):
+        if m.get_type() == "MISSION_REQUEST_INT":
+            requests.append(m.seq)
+        handle(m)
+
+    def _send(msg):
+        # Première réponse des items 5 et 23 perdue
+        if msg.get_type() == "MISSION_ITEM_INT" and msg.seq in (5, 23) and msg.seq not in dropped:
+            dropped.add(msg.seq)
+            return
+        send(msg)
+
+    sim.handle, sim.send = _handle, _send
+    disp.onboard_mission = None
+    assert download_mission(master, dispatcher=disp, timeout=0.2).keys() == Mission.load(path).keys()
+    assert sorted(s for s in set(requests) if requests.count(s) > 1) == [5, 23]
+    assert sorted(set(requests)) == list(range(40))
+
+
+def test_download_progress(sim_link, tmp_path, quiet):
+    sim, master, disp, path, _ = _upload(sim_link, tmp_path, n=15)
+    disp.onboard_mission = None
+    seen = []
+    download_mission(master, dispatcher=disp, progress=seen.append)
+    assert seen[-1] == {"received": 15, "total": 15}
+    assert [p["received"] for p in seen] == list(range(1, 16))
+
+
+def test_concurrent_upload_of_a_shared_mission(sim_link, tmp_path, quiet):
+    # Même fichier vers trois drones 1/1 (cas /fleet/mission/send) : la Mission
+    # de load() est partagée, chaque envoi doit construire ses propres messages
+    path = str(tmp_path / "fleet.waypoints")
+    _mission(120).save(path)
+    links = [sim_link() for _ in range(3)]
+    m = Mission.load(path)
+    a, b = (m.encode_int(links[0][1].mav, 1, 1, 5) for _ in range(2))
+    assert a is not b and a.pack(links[0][1].mav) is not None
+
+    errors, stats = [], []
+
+    def _send(master, disp):
+        try:
+            stats.append(send_mission(path, master, dispatcher=disp))
+        except Exception as e:  # remonté dans le thread principal
+            errors.append(e)
+
+    threads = [threading.Thread(target=_send, args=(master, disp)) for _, master, disp in links]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(timeout=30)
+    assert errors == [] and len(stats) == 3
+    for sim, _, _ in links:
+        assert _onboard(sim).keys() == m.keys()
@@ -0,0 +1,207 @@
+"""Séquence de démarrage (LOITER → armement → AUTO → MISSION_START), contre l'autopilote simulé."""
+import threading, time
+
+import pytest
+from pymavlink import mavutil
+
+import start_mission
+from start_mission import FleetStart, StartError, prepare, start
+from telemetry import TelemetryCache
+
+mavlink = mavutil.mavlink
+STEPS = ["mode_loiter", "arm", "mode_auto", "mission_start"]
+
+
+@pytest.fixture
+def fast_resend(monkeypatch):
+    monkeypatch.setattr(start_mission, "RESEND_INTERVAL", 0.1)
+
+
+def _commands(sim, command):
+    """Enregistre la confirmation de chaque COMMAND_LONG 'command' reçu par le simulateur."""
+    seen, handle = [], sim.handle
+
+    def _handle(m):
+        if m.get_type() == "COMMAND_LONG" and m.command == command:
+            seen.append(m.confirmation)
+        handle(m)
+
+    sim.handle = _handle
+    return seen
+
+
+def _drop_acks(sim, command):
+    """Le simulateur n'envoie plus les COMMAND_ACK de 'command' (HEARTBEAT inchangés)."""
+    send = sim.send
+    sim.send = lambda msg: None if msg.get_type() == "COMMAND_ACK" and msg.command == command else send(msg)
+
+
+def test_start_confirmed_by_acks(sim_link, quiet):
+    sim, master, disp = sim_link()
+    sim.items = [None]  # mission non vide : MISSION_START accepté
+    result = start(master, dispatcher=disp)
+    assert [s["step"] for s in result["steps"]] == STEPS
+    assert {s["via"] for s in result["steps"]} == {"ack"}
+    assert sim.armed and sim.custom_mode == 3 and sim.mission_started is not None
+
+
+def test_lost_ack_confirmed_by_heartbeat(sim_link, quiet):
+    sim, master, disp = sim_link()
+    _drop_acks(sim, mavlink.MAV_CMD_DO_SET_MODE)
+    steps = prepare(master, dispatcher=disp)
+    assert [(s["step"], s["via"]) for s in steps] == [
+        ("mode_loiter", "heartbeat"), ("arm", "ack"), ("mode_auto", "heartbeat")]
+
+
+def test_command_resent_until_answered(sim_link, quiet, fast_resend):
+    sim, master, disp = sim_link()
+    seen, handle = [], sim.handle
+
+    def _deaf(m):
+        # Les deux premiers COMMAND_LONG d'armement sont perdus
+        if m.get_type() == "COMMAND_LONG" and m.command == mavlink.MAV_CMD_COMPONENT_ARM_DISARM:
+            seen.append(m.confirmation)
+            if len(seen) <= 2:
+                return
+        handle(m)
+
+    sim.handle = _deaf
+    steps = prepare(master, dispatcher=disp)
+    assert steps[1]["step"] == "arm" and sim.armed
+    assert seen == [0, 1, 2]  # champ 'confirmation' incrémenté à chaque renvoi
+
+
+def test_in_progress_suspends_resends(sim_link, quiet, fast_resend):
+    sim, master, disp = sim_link()
+    sim.items = [None]
+    seen = _commands(sim, mavlink.MAV_CMD_MISSION_START)
+    _drop_acks(sim, mavlink.MAV_CMD_MISSION_START)
+    handle = sim.handle
+
+    def _slow_start(m):
+        handle(m)
+        if m.get_type() == "COMMAND_LONG" and m.command == mavlink.MAV_CMD_MISSION_START:
+            ack = sim.mav.command_ack_encode
+            sim.conn.write(ack(m.command, mavlink.MAV_RESULT_IN_PROGRESS).pack(sim.mav))
+            threading.Timer(0.5, lambda: sim.conn.write(
+                ack(m.command, mavlink.MAV_RESULT_ACCEPTED).pack(sim.mav))).start()
+
+    sim.handle = _slow_start
+    result = start(master, dispatcher=disp)
+    done = result["steps"][-1]
+    assert done["step"] == "mission_start" and done["via"] == "ack" and done["elapsed_s"] >= 0.4
+    assert seen == [0]  # aucun renvoi pendant IN_PROGRESS, malgré RESEND_INTERVAL = 0.1 s
+
+
+def test_refused_step_names_the_result(sim_link, quiet):
+    sim, master, disp = sim_link()
+    # Mission vide : MISSION_START refusé, comme ArduCopter
+    with pytest.raises(StartError) as exc:
+        start(master, dispatcher=disp)
+    assert exc.value.step == "mission_start" and exc.value.result == "MAV_RESULT_FAILED"
+
+
+def test_step_timeout_without_any_answer(sim_link, quiet, fast_resend):
+    sim, master, disp = sim_link()
+    seen, handle = [], sim.handle
+
+    def _deaf(m):
+        if m.get_type() == "COMMAND_LONG":
+            seen.append(m.confirmation)
+        else:
+            handle(m)
+
+    sim.handle = _deaf
+    t0 = time.monotonic()
+    with pytest.raises(StartError) as exc:
+        prepare(master, dispatcher=disp, mode_timeout=0.5)
+    assert exc.value.step == "mode_loiter" and exc.value.result is None
+    assert 0.5 <= time.monotonic() - t0 < 2.0
+    assert sim.custom_mode == 0 and not sim.armed
+    assert len(seen) >= 4 and seen == list(range(len(seen)))  # renvoyé toutes les 0,1 s
+
+
+def test_steps_already_true_are_skipped(sim_link, quiet):
+    sim, master, disp = sim_link()
+    cache = TelemetryCache(history_size=0)
+    disp.add_sink(cache.update_from_msg)
+    sim.armed, sim.custom_mode = True, 3
+    time.sleep(0.3)  # le cache voit le drone armé en AUTO
+    seen = _commands(sim, mavlink.MAV_CMD_COMPONENT_ARM_DISARM)
+    steps = prepare(master, dispatcher=disp, cache=cache)
+    assert [(s["step"], s["via"]) for s in steps] == [("arm", "cache"), ("mode_auto", "cache")]
+    assert seen == []
+
+
+# ── Démarrage flotte ──
+def _fleet(sim_link, n):
+    links = [sim_link() for _ in range(n)]
+    for sim, _, _ in links:
+        sim.items = [None]
+    return links
+
+
+def _run_fleet(fleet, links, skip=()):
+    """Lance fleet.run pour chaque drone (sauf 'skip') en parallèle : {id: résultat ou exception}."""
+    out = {}
+
+    def _one(did, master, disp):
+        try:
+            out[did] = fleet.run(did, master, dispatcher=disp)
+        except Exception as e:
+            out[did] = e
+
+    threads = [threading.Thread(target=_one, args=(did, master, disp))
+               for did, (_, master, disp) in enumerate(links) if did not in skip]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(timeout=30)
+    return out
+
+
+def test_fleet_start_launches_all_together(sim_link, quiet):
+    links = _fleet(sim_link, 3)
+    fleet = FleetStart(range(3), ready_timeout=10.0)
+    out = _run_fleet(fleet, links)
+    assert all(isinstance(r, dict) for r in out.values()), out
+    assert sorted(r["skew_ms"] for r in out.values())[0] == 0.0
+    assert all(r["fleet"] == {"launched": [0, 1, 2], "failed": {}, "partial": False} for r in out.values())
+    started = [sim.mission_started for sim, _, _ in links]
+    assert None not in started and max(started) - min(started) < 0.5
+
+
+def test_fleet_start_aborts_everyone_when_one_drone_fails(sim_link, quiet):
+    links = _fleet(sim_link, 3)
+    refusing = links[1][0]
+    command = refusing._command
+    refusing._command = lambda m: (mavlink.MAV_RESULT_DENIED if m.command == mavlink.MAV_CMD_DO_SET_MODE
+                                   else command(m))
+    out = _run_fleet(FleetStart(range(3), ready_timeout=10.0), links)
+    assert all(isinstance(r, StartError) for r in out.values()), out
+    assert out[1].step == "mode_loiter" and out[1].result == "MAV_RESULT_DENIED"
+    assert {out[0].step, out[2].step} <= {"aborted", "barrier"}
+    time.sleep(0.3)  # désarmement envoyé sans attendre l'ACK
+    assert all(sim.mission_started is None and not sim.armed for sim, _, _ in links)
+
+
+def test_fleet_barrier_times_out_without_launching(sim_link, quiet):
+    links = _fleet(sim_link, 2)
+    out = _run_fleet(FleetStart(range(3), ready_timeout=0.5), links)  # le drone 2 ne démarre jamais
+    assert [r.step for r in out.values()] == ["barrier", "barrier"]
+    assert "2" in str(out[0])
+    time.sleep(0.3)
+    assert all(sim.mission_started is None and not sim.armed for sim, _, _ in links)
+
+
+def test_fleet_partial_launch_is_reported(sim_link, quiet):
+    links = _fleet(sim_link, 3)
+    links[2][0].items = []  # MISSION_START refusé pour le drone 2 seulement
+    fleet = FleetStart(range(3), ready_timeout=10.0)
+    out = _run_fleet(fleet, links)
+    assert isinstance(out[2], StartError) and out[2].step == "mission_start"
+    assert "lancement partiel" in str(out[2]) and "0, 1" in str(out[2])
+    summary = fleet.summary()
+    assert summary["launched"] == [0, 1] and list(summary["failed"]) == ["2"] and summary["partial"]
+    assert out[0]["fleet"] == out[1]["fleet"] == summary
+    assert [sim.mission_started is not None for sim, _, _ in links] == [True, True, False]
@@ -1,17 +1,35 @@
 import json
 import time
+import urllib.request
 import websocket
-from pymavlink import mavutil
 
-# Charger l'ID du drone
+# Charger l'ID du drone (premier drone de la config) et l'URL de l'API
 with open("../config.json") as f:
     config = json.load(f)
-    drone_id = config.get("drone_id", 1)
+    drones = config.get("drones", [])
+    drone_id = drones[0]["id"] if drones else config.get("drone_id", 1)
+API_URL = "http://localhost:5000"
 
-# Connexion MAVLink
-master = mavutil.mavlink_connection('udp:127.0.0.1:14550')
-master.wait_heartbeat()
-print("MAVLink connecté")
+# Pas de connexion MAVLink ici : on s'abonne au flux SSE de l'API
+STREAM_URL = (
+    f"{API_URL}/drones/{drone_id}/stream"
+    "?rate=20&fields=flight_mode,is_armed&types=GLOBAL_POSITION_INT,VFR_HUD"
+)
+
+def sse_messages(url):
+    """Itère sur les (event, data) d'un flux Server-Sent Events."""
+    with urllib.request.urlopen(url) as r:
+        event, data = None, []
+        for raw in r:
+            line = raw.decode("utf-8").rstrip("\n")
+            if not line:
+                if data:
+                    yield event, json.loads("\n".join(data))
+                event, data = None, []
+            elif line.startswith("event:"):
+                event = line[6:].strip()
+            elif line.startswith("data:"):
+                data.append(line[5:].strip())
 
 # Connexion WebSocket (client)
 ws = websocket.WebSocket()
@@ -20,30 +38,34 @@ try:
     time.sleep(1)
     print("Connecté au serveur WebSocket")
 
-    def process_msg(msg):
-        msg_type = msg.get_type()
+    state = {}
+
+    def process_msg(event, rec):
         data = {"drone_id": drone_id}
 
-        if msg_type == "HEARTBEAT":
+        if event == "flight_info":
+            state.update(rec)
             data.update({
                 "type": "HEARTBEAT",
-                "mode": mavutil.mode_string_v10(msg),
-                "armed": bool(msg.base_mode & mavutil.mavlink.MAV_MODE_FLAG_SAFETY_ARMED)
+                "mode": state.get("flight_mode"),
+                "armed": state.get("is_armed")
             })
-        elif msg_type == "GLOBAL_POSITION_INT":
+        elif event == "telemetry" and rec["type"] == "GLOBAL_POSITION_INT":
+            msg = rec["fields"]
             data.update({
                 "type": "POSITION",
-                "lat": msg.lat / 1e7,
-                "lon": msg.lon / 1e7,
-                "alt": msg.relative_alt / 1000.0,
-                "heading": msg.hdg / 100.0 if msg.hdg != 65535 else None
+                "lat": msg["lat"] / 1e7,
+                "lon": msg["lon"] / 1e7,
+                "alt": msg["relative_alt"] / 1000.0,
+                "heading": msg["hdg"] / 100.0 if msg["hdg"] != 65535 else None
             })
-        elif msg_type == "VFR_HUD":
+        elif event == "telemetry" and rec["type"] == "VFR_HUD":
+            msg = rec["fields"]
             data.update({
                 "type": "VFR_HUD",
-                "groundspeed": msg.groundspeed,
-                "vspeed": msg.climb,
-                "alt": msg.alt
+                "groundspeed": msg["groundspeed"],
+                "vspeed": msg["climb"],
+                "alt": msg["alt"]
             })
         else:
             return
@@ -53,12 +75,9 @@ try:
         except Exception as e:
             print("Erreur d’envoi WebSocket :", e)
 
-    # Boucle principale
-    while True:
-        msg = master.recv_match(blocking=True)
-        if msg:
-            process_msg(msg)
-        time.sleep(0.05)
+    # Boucle principale : l'API pousse les nouveautés (déjà limitées en fréquence)
+    for event, rec in sse_messages(STREAM_URL):
+        process_msg(event, rec)
 
 except KeyboardInterrupt:
     print("Interruption manuelle")